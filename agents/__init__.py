@@ -1,5 +1,13 @@
+from .base import SingleTurnAgent
 from .critic import CriticAgent
 from .fixer  import PromptFixerAgent
 from .comparator import ComparatorAgent
+from .generator import GeneratorAgent
 
-__all__ = ["CriticAgent", "PromptFixerAgent", "ComparatorAgent"]
+__all__ = [
+    "SingleTurnAgent",
+    "CriticAgent",
+    "PromptFixerAgent",
+    "ComparatorAgent",
+    "GeneratorAgent",
+]
@@ -0,0 +1,310 @@
+# agents/base.py  ─── shared single-turn call path for all evaluator agents
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from autogen import AssistantAgent
+from autogen.io.base import IOStream
+
+import metrics
+from clients import get_client_pool
+from context_budget import answer_budget, estimate_tokens
+from pipeline import StageCancelled, stage_cancelled
+from config import EARLY_STOP, llm_config_dict
+
+TokenCallback = Callable[[str], None]
+# text so far → end index of the expected structure once it is complete
+CompleteCheck = Callable[[str], Optional[int]]
+
+
+def reply_text(reply: Any) -> str:
+    """generate_reply / extract_* may hand back a str, a dict or a message."""
+    if isinstance(reply, str):
+        return reply
+    if isinstance(reply, dict):
+        return reply.get("content") or ""
+    return getattr(reply, "content", None) or ""
+
+
+class _EnoughOutput(Exception):
+    """Raised from the token tap to end a stream whose reply is complete."""
+
+
+class _TokenTap:
+    """
+    IOStream that forwards streamed content chunks to a callback and
+    swallows everything else autogen would print to the console. With
+    `complete`, it ends the stream (by raising _EnoughOutput) as soon as
+    the reply holds the expected structure; `text` is then cut there.
+    Once `cancel` is set the stream is abandoned (StageCancelled).
+    """
+
+    def __init__(
+        self,
+        on_token: Optional[TokenCallback],
+        complete: Optional[CompleteCheck] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> None:
+        self.on_token = on_token
+        self.complete = complete
+        self.cancel = cancel
+        self.emitted = False
+        self.text = ""
+
+    def _emit(self, text: Any) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise StageCancelled("stage skipped mid-stream")
+        if not (isinstance(text, str) and text):
+            return
+        cut = None
+        if self.complete is not None:
+            start = len(self.text)
+            self.text += text
+            cut = self.complete(self.text)
+            if cut is not None:
+                text, self.text = self.text[start:cut], self.text[:cut]
+        if text and self.on_token is not None:
+            self.emitted = True
+            self.on_token(text)
+        if cut is not None:
+            raise _EnoughOutput
+
+    # autogen 0.2 streams chunks as print(content, end="")
+    def print(self, *objects: Any, sep: str = " ", end: str = "\n", flush: bool = False) -> None:
+        if end == "":
+            self._emit(sep.join(str(o) for o in objects))
+
+    # ag2 streams chunks as a wrapped StreamEvent(content=...)
+    def send(self, message: Any) -> None:
+        if getattr(message, "type", None) == "stream":
+            inner = message.content
+            self._emit(getattr(inner, "content", inner))
+
+    def input(self, prompt: str = "", *, password: bool = False) -> str:
+        raise RuntimeError("single-turn agents never ask for input")
+
+
+class SingleTurnAgent(AssistantAgent):
+    """
+    One user message in, reply text out. Every helper (evaluate / fix /
+    compare / generate) goes through `ask`, so cross-cutting concerns such
+    as the reply cache, token streaming, rate limiting and endpoint
+    routing live in one place.
+    """
+
+    # cache.LLMCache / clients.ClientPool / ratelimit.RateLimiterRegistry /
+    # router.EndpointRouter / model_policy.ModelPolicy (or None);
+    # PromptEvaluator wires in the process-wide ones. Without a pool the
+    # process default is used.
+    cache = None
+    pool = None
+    limiter = None
+    router = None
+    policy = None
+    # stage name for config.STAGE_MODELS / OUTPUT_BUDGETS and the policy
+    role = ""
+    # config.OUTPUT_BUDGETS entry: {"max_tokens": int | None, "stop": [str]}
+    budget: Dict[str, Any] = {}
+
+    def _pool(self):
+        return self.pool if self.pool is not None else get_client_pool()
+
+    def set_llm_config(self, llm_config) -> None:
+        """
+        Switch to a new llm_config. Unlike assigning `.llm_config`, this
+        also replaces the client, taking the shared one from the pool.
+        """
+        self.llm_config, self.client = llm_config, self._pool().get(llm_config)
+
+    def ask(
+        self,
+        content: str,
+        use_cache: bool = True,
+        on_token: Optional[TokenCallback] = None,
+        complete: Optional[CompleteCheck] = None,
+        max_tokens: Optional[int] = None,
+        sample: int = 0,
+    ) -> str:
+        """
+        Single-turn reply. With `on_token`, the reply is streamed and each
+        chunk is passed to the callback as it arrives (a cache hit or a
+        provider that does not stream delivers the whole text at once).
+        `complete(text)` returns where the expected structure ends once
+        it has all arrived; with EARLY_STOP the reply is streamed and cut
+        off there instead of paying for whatever the model adds after.
+        `max_tokens` overrides the agent's budget for this call.
+        `sample` > 0 marks an extra self-consistency draw: the same request
+        with its own cache entry, so cached runs replay every sample.
+        """
+        messages = [{"role": "user", "content": content}]
+        params = self._budget_params(max_tokens)
+
+        key = None
+        if self.cache is not None and use_cache and not self.cache.bypassed:
+            key = self.cache.make_key(
+                self.llm_config, self.system_message, messages, **params,
+                **({"sample": sample} if sample else {}),
+            )
+            hit = self.cache.get(key)
+            if hit is not None:
+                metrics.record_llm_call(self._model_name(self.llm_config), cached=True)
+                if on_token is not None:
+                    on_token(hit)
+                return hit
+
+        text = self._call_routed(messages, on_token, complete if EARLY_STOP else None, params)
+
+        if key is not None and text:
+            self.cache.set(key, text)
+        return text
+
+    # ── routing / limiting ──────────────────────────────────────────────
+    def answer_budget(self, answers: int = 1) -> int:
+        """Tokens each of `answers` pasted answers may use in one call."""
+        reserved = (
+            estimate_tokens(self.system_message)
+            + (self.budget.get("max_tokens") or 1024)   # room for the reply
+            + 64                                        # wrapper text, chat framing
+        )
+        return answer_budget(self.llm_config, reserved) // answers
+
+    def _budget_params(self, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        params: Dict[str, Any] = {}
+        if max_tokens or self.budget.get("max_tokens"):
+            params["max_tokens"] = max_tokens or self.budget["max_tokens"]
+        if self.budget.get("stop"):
+            params["stop"] = list(self.budget["stop"])
+        return params
+
+    def _call_routed(
+        self, messages: list, on_token: Optional[TokenCallback],
+        complete: Optional[CompleteCheck] = None, params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Try the endpoints best-first (a single one without a router). The
+        limiter only retries on the last candidate; before that a failure
+        fails over straight away. A stream that already emitted tokens is
+        never replayed elsewhere.
+        """
+        targets = (
+            self.router.order(self.llm_config) if self.router is not None
+            else [self.llm_config]
+        )
+        # same estimate as the context budgets (context_budget.py)
+        prompt_tokens = (
+            estimate_tokens(self.system_message) + estimate_tokens(messages[-1]["content"])
+        )
+        streamed = []
+        sink = None
+        if on_token is not None:
+            def sink(chunk: str) -> None:
+                streamed.append(True)
+                on_token(chunk)
+
+        for i, target in enumerate(targets):
+            last = i == len(targets) - 1
+            attempt = lambda target=target: self._timed_complete(
+                target, messages, sink, complete, params
+            )
+            try:
+                if self.limiter is None:
+                    return attempt()
+                return self.limiter.for_config(target).call(
+                    attempt, prompt_tokens=prompt_tokens, retries=None if last else 0,
+                    completion_tokens=(params or {}).get("max_tokens"),
+                )
+            except StageCancelled:
+                raise
+            except Exception:
+                if last or streamed:
+                    raise
+        raise RuntimeError("no LLM endpoint configured")
+
+    def _timed_complete(
+        self, llm_config: Any, messages: list, on_token: Optional[TokenCallback],
+        complete: Optional[CompleteCheck] = None, params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        t0 = time.monotonic()
+        try:
+            text = self._complete(llm_config, messages, on_token, complete, params)
+        except StageCancelled:
+            raise                       # says nothing about the endpoint
+        except Exception:
+            if self.router is not None:
+                self.router.record(llm_config, time.monotonic() - t0, ok=False)
+            raise
+        if self.router is not None:
+            self.router.record(llm_config, time.monotonic() - t0, ok=True)
+        return text
+
+    # ── provider call ───────────────────────────────────────────────────
+    def _complete(
+        self, llm_config: Any, messages: list, on_token: Optional[TokenCallback],
+        complete: Optional[CompleteCheck] = None, params: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        full = self._oai_system_message + messages
+        params = self._budget_params() if params is None else params
+        # set when this call belongs to a stage that may be skipped
+        cancel = stage_cancelled.get()
+        if cancel is not None and cancel.is_set():
+            raise StageCancelled("stage skipped before the call")
+        t0 = time.monotonic()
+        if on_token is None and complete is None and cancel is None:
+            client = self._pool().get(llm_config)
+            response = client.create(messages=full, cache=None, **params)
+            text = reply_text(client.extract_text_or_completion_object(response)[0])
+        else:
+            # early stop and cancellation need the stream even when nobody
+            # watches the tokens
+            client = self._pool().get(llm_config, stream=True)
+            tap = _TokenTap(on_token, complete, cancel)
+            try:
+                with IOStream.set_default(tap):
+                    response = client.create(messages=full, cache=None, **params)
+            except _EnoughOutput:
+                # leaving the stream closes the response: generation stops
+                response, text = None, tap.text
+            else:
+                text = reply_text(client.extract_text_or_completion_object(response)[0])
+                if not tap.emitted and text and on_token is not None:
+                    on_token(text)
+        self._record_usage(
+            llm_config, response, full, text, time.monotonic() - t0, params.get("max_tokens")
+        )
+        return text
+
+    # ── instrumentation ─────────────────────────────────────────────────
+    @staticmethod
+    def _model_name(llm_config: Any) -> str:
+        entry = (llm_config_dict(llm_config).get("config_list") or [{}])[0]
+        return entry.get("model") or "unknown"
+
+    def _record_usage(
+        self, llm_config: Any, response: Any, full: list, text: str, seconds: float,
+        max_tokens: Optional[int] = None,
+    ) -> None:
+        entry = (llm_config_dict(llm_config).get("config_list") or [{}])[0]
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        # streamed replies often report no usage (or zeros); fall back to
+        # the estimate the budgets use
+        if not prompt_tokens:
+            prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in full)
+        if not completion_tokens:
+            completion_tokens = estimate_tokens(text)
+        # response is None when the stream was cut short by early stop
+        early_stop = response is None
+        if self.policy is not None:
+            # per-stage latency / cost, for the "auto" model choice
+            cost = metrics.call_cost(entry.get("price"), prompt_tokens, completion_tokens)
+            self.policy.record(self.role, entry, seconds, cost)
+        metrics.record_llm_call(
+            entry.get("model") or "unknown",
+            seconds=seconds,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            price=entry.get("price"),
+            early_stop=early_stop,
+            budget_unused=max(0, max_tokens - completion_tokens) if early_stop and max_tokens else 0,
+        )
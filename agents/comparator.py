@@ -1,11 +1,19 @@
-from autogen import AssistantAgent
+from config import OUTPUT_BUDGETS
+from context_budget import compact
+from .base import SingleTurnAgent
+
+
+class ComparatorAgent(SingleTurnAgent):
+    role = "comparator"
+    budget = OUTPUT_BUDGETS[role]
 
-class ComparatorAgent(AssistantAgent):
     def __init__(self, llm_config, name="ComparatorAgent",
                  system_message=None, **kwargs):
         if system_message is None:
             system_message = (
-                "Given answer A and answer B, decide which is better …"
+                "Given answer A and answer B, decide which is better. "
+                "Start with a line 'Winner: A' or 'Winner: B', then explain "
+                "why in one short paragraph."
             )
         super().__init__(
             name=name,
@@ -16,10 +24,12 @@ class ComparatorAgent(AssistantAgent):
         )
 
 
-    def compare(self, answer_a: str, answer_b: str) -> str:
+    def compare(self, answer_a: str, answer_b: str, use_cache: bool = True,
+                on_token=None, sample: int = 0) -> str:
+        # over-long answers are judged on a compacted view
+        per_answer = self.answer_budget(answers=2)
         prompt = (
-            "A:\n" + answer_a.strip() +
-            "\n\nB:\n" + answer_b.strip()
+            "A:\n" + compact(answer_a, per_answer) +
+            "\n\nB:\n" + compact(answer_b, per_answer)
         )
-        reply = self.generate_reply([{"role": "user", "content": prompt}])
-        return reply if isinstance(reply, str) else reply.get("content", "")
+        return self.ask(prompt, use_cache=use_cache, on_token=on_token, sample=sample)
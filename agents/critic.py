@@ -1,12 +1,79 @@
 # agents/critic.py
-from autogen import AssistantAgent
+import re
+from typing import List, Optional, Sequence, Tuple
 
+import metrics
+from config import OUTPUT_BUDGETS
+from context_budget import estimate_tokens
+from scores import CRITERIA, format_critique, parse_critique
+from .base import SingleTurnAgent
 
-class CriticAgent(AssistantAgent):
+_LABELLED = re.compile(r"^\W*(correctness|hallucination|tone|relevance)\b", re.I)
+# "ANSWER 3", "### Answer 3:", "**ANSWER 3**" – a section header in a batched reply
+_SECTION = re.compile(r"^\W*answer\s+(\d+)\W*$", re.I | re.M)
+
+BATCH_ITEMS = metrics.REGISTRY.counter(
+    "evaluator_critic_batch_items_total",
+    "Answers rated in batched Critic requests (fallback = re-rated on their own).",
+)
+
+
+def critique_complete(text: str) -> Optional[int]:
+    """End of the fourth distinct labelled line, once its newline is in."""
+    seen, pos = set(), 0
+    for line in text.splitlines(keepends=True):
+        pos += len(line)
+        if not line.endswith("\n"):
+            return None
+        m = _LABELLED.match(line)
+        if m:
+            seen.add(m.group(1).lower())
+            if len(seen) == 4:
+                return pos
+    return None
+
+
+def batch_complete(n: int):
+    """Early-stop check for a batched reply: answer n's four lines are in."""
+    def complete(text: str) -> Optional[int]:
+        last = None
+        for m in _SECTION.finditer(text):
+            if int(m.group(1)) == n:
+                last = m
+        if last is None:
+            return None
+        body = text[last.end():].lstrip("\n")
+        end = critique_complete(body)
+        return None if end is None else len(text) - len(body) + end
+    return complete
+
+
+def split_batch(reply: str, n: int) -> List[Optional[str]]:
+    """
+    Per-answer critiques from a batched reply, each normalised to the
+    four-line format; None where a section is missing or incomplete.
+    """
+    sections: List[Optional[str]] = [None] * n
+    heads = list(_SECTION.finditer(reply))
+    for h, nxt in zip(heads, heads[1:] + [None]):
+        k = int(h.group(1))
+        if not 1 <= k <= n or sections[k - 1] is not None:
+            continue
+        body = reply[h.end(): nxt.start() if nxt else len(reply)]
+        levels = parse_critique(body)
+        if len(levels) == len(CRITERIA):
+            sections[k - 1] = format_critique(levels)
+    return sections
+
+
+class CriticAgent(SingleTurnAgent):
     """
     Rates an ANSWER on Correctness, Hallucination, Tone, Relevance.
     """
 
+    role = "critic"
+    budget = OUTPUT_BUDGETS[role]
+
     def __init__(
         self,
         llm_config,
@@ -33,7 +100,82 @@ class CriticAgent(AssistantAgent):
         )
 
     # ---- single-turn helper --------------------------------------------------
-    def evaluate(self, answer: str) -> str:
-        prompt = f"Evaluate the following.\nANSWER: {answer.strip()}"
-        reply  = self.generate_reply([{"role": "user", "content": prompt}])
-        return reply if isinstance(reply, str) else reply.get("content", "")
+    def evaluate(self, answer: str, use_cache: bool = True, on_token=None,
+                 part: Optional[Tuple[int, int]] = None, sample: int = 0) -> str:
+        """
+        `part=(i, n)`: `answer` is chunk i of n of a longer answer.
+        `sample` > 0: an extra self-consistency draw (see SingleTurnAgent.ask).
+        """
+        prompt = "Evaluate the following.\n"
+        if part is not None:
+            prompt += (
+                f"This is part {part[0]} of {part[1]} of a longer answer; "
+                "rate this part only.\n"
+            )
+        prompt += f"ANSWER: {answer.strip()}"
+        return self.ask(prompt, use_cache=use_cache, on_token=on_token,
+                        complete=critique_complete, sample=sample)
+
+    # ---- batched ---------------------------------------------------------------
+    def pack(self, answers: Sequence[str], max_items: int) -> List[List[int]]:
+        """
+        Group answer indices into batches of at most `max_items` whose
+        answers fit one call's answer budget together. An answer over
+        the budget on its own gets a batch of one.
+        """
+        limit = self.answer_budget()
+        groups: List[List[int]] = []
+        cur: List[int] = []
+        size = 0
+        for i, answer in enumerate(answers):
+            n = estimate_tokens(answer) + 8          # + delimiter lines
+            if cur and (len(cur) >= max_items or size + n > limit):
+                groups.append(cur)
+                cur, size = [], 0
+            cur.append(i)
+            size += n
+        if cur:
+            groups.append(cur)
+        return groups
+
+    def evaluate_many(self, answers: Sequence[str], use_cache: bool = True,
+                      max_items: int = 8) -> List[str]:
+        """
+        Rate several answers with as few requests as the answer budget
+        allows: each batch is one request with every answer between
+        <answer id=k> delimiters, and the reply is split back into
+        four-line critiques. Items whose section is missing or malformed
+        are re-rated on their own with `evaluate`.
+        """
+        out: List[Optional[str]] = [None] * len(answers)
+        for group in self.pack(answers, max_items):
+            if len(group) == 1:
+                out[group[0]] = self.evaluate(answers[group[0]], use_cache=use_cache).strip()
+                continue
+            parts = self._ask_batch([answers[i] for i in group], use_cache)
+            for i, part in zip(group, parts):
+                if part is None:
+                    BATCH_ITEMS.inc(outcome="fallback")
+                    part = self.evaluate(answers[i], use_cache=use_cache).strip()
+                else:
+                    BATCH_ITEMS.inc(outcome="ok")
+                out[i] = part
+        return out
+
+    def _ask_batch(self, answers: Sequence[str], use_cache: bool) -> List[Optional[str]]:
+        n = len(answers)
+        prompt = (
+            f"Evaluate each of the {n} answers below on its own.\n"
+            f"For every answer k from 1 to {n}, write a line \"ANSWER k\" "
+            "followed by its four lines.\n"
+        )
+        for k, answer in enumerate(answers, 1):
+            # keep an answer from closing its own delimiter
+            body = answer.strip().replace("</answer>", "</ answer>")
+            prompt += f"\n<answer id={k}>\n{body}\n</answer>\n"
+        per_item = self.budget.get("max_tokens")
+        reply = self.ask(
+            prompt, use_cache=use_cache, complete=batch_complete(n),
+            max_tokens=per_item * n if per_item else None,
+        )
+        return split_batch(reply, n)
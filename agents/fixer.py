@@ -1,15 +1,19 @@
 # agents/fixer.py  ─── stricter prompt-rewriter
-from autogen import AssistantAgent
-from typing import List
+from .base import SingleTurnAgent
+from config import OUTPUT_BUDGETS
+from typing import List, Optional
 import re
 
 
-class PromptFixerAgent(AssistantAgent):
+class PromptFixerAgent(SingleTurnAgent):
     """
     Rewrites a PROMPT into two clearer bullet-line versions
     while preserving the original intent and keywords.
     """
 
+    role = "fixer"
+    budget = OUTPUT_BUDGETS[role]
+
     def __init__(
         self,
         llm_config,
@@ -36,27 +40,84 @@ class PromptFixerAgent(AssistantAgent):
             **kwargs,
         )
 
+    # prompt_index.PromptIndex (or None); PromptEvaluator wires in the
+    # process-wide one so near-duplicate prompts reuse earlier rewrites
+    index = None
+
     # ── public helper the app calls
-    def fix(self, original_prompt: str) -> List[str]:
+    def fix(self, original_prompt: str, use_cache: bool = True, on_token=None,
+            n: int = 2) -> List[str]:
+        use_index = (
+            self.index is not None and use_cache
+            and not (self.cache is not None and self.cache.bypassed)
+        )
+        if use_index:
+            hit = self.index.lookup(original_prompt)
+            if hit is not None:
+                # the stored rewrites belong to a neighbour – they must
+                # still mention this prompt's keywords, and follow it where
+                # the two prompts differ, to be reused
+                reused = self._keep(self._follow(hit[0], hit[2], original_prompt), original_prompt)
+                if len(reused) >= n:
+                    self.index.hit()
+                    if on_token is not None:
+                        on_token("\n".join(f"• {b}" for b in reused[:n]))
+                    return reused[:n]
+
         ask = (
             f"PROMPT:\n{original_prompt.strip()}\n\n"
             "Rewrite per your instructions above."
         )
-        reply = self.generate_reply([{"role": "user", "content": ask}])
-        txt = reply if isinstance(reply, str) else reply.get("content", "")
+        if n != 2:   # system message asks for two; override the count
+            ask += f" Return exactly {n} bullet lines instead of two."
+
+        def complete(text: str) -> Optional[int]:
+            # stop once n bullets that will survive the guard are in
+            pos, kept = 0, 0
+            for line in text.splitlines(keepends=True):
+                pos += len(line)
+                if not line.endswith("\n"):
+                    return None
+                kept += len(self._keep(self._bullets(line), original_prompt))
+                if kept >= n:
+                    return pos
+            return None
 
-        bullets = [
+        txt = self.ask(ask, use_cache=use_cache, on_token=on_token, complete=complete)
+
+        filtered = self._keep(self._bullets(txt), original_prompt)
+        if use_index and filtered:
+            self.index.add(original_prompt, filtered)
+
+        return filtered[:n]  # may return [] if model misbehaves
+
+    @staticmethod
+    def _bullets(txt: str) -> List[str]:
+        return [
             ln.lstrip("•- ").strip()
             for ln in txt.splitlines()
             if ln.lstrip().startswith(("•", "-"))
         ]
 
+    @staticmethod
+    def _follow(bullets: List[str], stored_prompt: str, original_prompt: str) -> List[str]:
+        # e.g. "Python" → "Java": the rewrites of a stored prompt that
+        # differs by a word must carry the new word, and not the old one
+        stored = set(re.findall(r"[a-z]{4,}", stored_prompt.lower()))
+        wanted = set(re.findall(r"[a-z]{4,}", original_prompt.lower()))
+        kept = []
+        for b in bullets:
+            words = set(re.findall(r"[a-z]+", b.lower()))
+            if wanted - stored <= words and not (stored - wanted) & words:
+                kept.append(b)
+        return kept
+
+    @staticmethod
+    def _keep(bullets: List[str], original_prompt: str) -> List[str]:
         # simple guard: keep only bullets that still mention at least
         # one word from original prompt (case-insensitive, ≥4 letters)
         keywords = [w.lower() for w in re.findall(r"[A-Za-z]{4,}", original_prompt)]
-        filtered = [
+        return [
             b for b in bullets
             if any(k in b.lower() for k in keywords)
         ]
-
-        return filtered[:2]  # may return [] if model misbehaves
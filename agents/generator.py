@@ -0,0 +1,33 @@
+# agents/generator.py
+from config import OUTPUT_BUDGETS
+from .base import SingleTurnAgent
+
+
+class GeneratorAgent(SingleTurnAgent):
+    """
+    Neutral answerer (no special evaluation role) that produces Answer B.
+    """
+
+    role = "generator"
+    budget = OUTPUT_BUDGETS[role]
+
+    def __init__(
+        self,
+        llm_config,
+        name: str = "GeneratorAgent",
+        system_message: str | None = None,
+        **kwargs,
+    ):
+        if system_message is None:
+            system_message = "Answer user prompts clearly, concisely, and accurately."
+
+        super().__init__(
+            name=name,
+            llm_config=llm_config,
+            code_execution_config=False,
+            system_message=system_message,
+            **kwargs,
+        )
+
+    def generate(self, prompt: str, use_cache: bool = True, on_token=None) -> str:
+        return self.ask(prompt, use_cache=use_cache, on_token=on_token).strip()
@@ -0,0 +1,163 @@
+"""
+aggregate.py – columnar statistics over many evaluations.
+
+`ScoreTable` keeps score records as NumPy columns (an n×4 int8 matrix of
+Critic levels and an int8 winner column) and `summary()` computes, in
+one vectorised pass, per-dimension level distributions, mean level and
+High-rate with confidence intervals, and the Answer B win rate.
+
+    python aggregate.py results.jsonl --confidence 0.95
+    python aggregate.py .history.sqlite --history --model llama2
+"""
+import argparse
+import json
+import sys
+from statistics import NormalDist
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from scores import CRITERIA, LEVELS, MISSING, ScoreRecord
+
+_WINNER_CODE = {"A": 0, "B": 1, None: MISSING}
+
+
+def wilson(successes: np.ndarray, n: np.ndarray, z: float) -> np.ndarray:
+    """Wilson score interval for each (successes, n) pair → (..., 2)."""
+    n = np.asarray(n, dtype=float)
+    safe = np.maximum(n, 1)
+    p = successes / safe
+    denom = 1 + z * z / safe
+    center = (p + z * z / (2 * safe)) / denom
+    half = z * np.sqrt(p * (1 - p) / safe + z * z / (4 * safe * safe)) / denom
+    ci = np.stack([center - half, center + half], axis=-1)
+    return np.where((n > 0)[..., None], ci, np.nan)
+
+
+class ScoreTable:
+    def __init__(
+        self, levels: np.ndarray, winner: np.ndarray, ids: Optional[List[Any]] = None
+    ) -> None:
+        self.levels = np.asarray(levels, dtype=np.int8).reshape(-1, len(CRITERIA))
+        self.winner = np.asarray(winner, dtype=np.int8)
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.winner)
+
+    # ── construction ────────────────────────────────────────────────────
+    @classmethod
+    def from_records(cls, records: Iterable[ScoreRecord]) -> "ScoreTable":
+        ids, levels, winner = [], [], []
+        for rec in records:
+            ids.append(rec.id)
+            levels.extend(rec.levels())
+            winner.append(_WINNER_CODE.get(rec.winner, MISSING))
+        return cls(np.array(levels, dtype=np.int8), np.array(winner, dtype=np.int8), ids)
+
+    @classmethod
+    def from_results(cls, results: Iterable[Dict[str, Any]]) -> "ScoreTable":
+        return cls.from_records(ScoreRecord.from_result(r) for r in results)
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "ScoreTable":
+        """From a batch.py output file; error rows are skipped."""
+        def rows():
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        row = json.loads(line)
+                        if "error" not in row:
+                            yield row
+        return cls.from_results(rows())
+
+    @classmethod
+    def from_history(cls, store: Any, chunk: int = 100_000, **filters: Any) -> "ScoreTable":
+        """From a history.HistoryStore: streams only the score columns."""
+        cols = ", ".join(c.lower() for c in CRITERIA) + ", winner"
+        levels, winner = [], []
+        rows = store.iter_rows(columns=cols, chunk=chunk, **filters)
+        while True:
+            block = [r for _, r in zip(range(chunk), rows)]
+            if not block:
+                break
+            arr = np.array([r[:-1] for r in block], dtype=np.int8).reshape(-1, len(CRITERIA))
+            levels.append(arr)
+            winner.append(np.array([_WINNER_CODE.get(r[-1], MISSING) for r in block], dtype=np.int8))
+        if not levels:
+            return cls(np.empty((0, len(CRITERIA)), np.int8), np.empty(0, np.int8))
+        return cls(np.concatenate(levels), np.concatenate(winner))
+
+    # ── statistics ──────────────────────────────────────────────────────
+    def summary(self, confidence: float = 0.95) -> Dict[str, Any]:
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        L = self.levels
+        valid = L >= 0                                           # (n, 4)
+        counts = (L[:, :, None] == np.arange(len(LEVELS))).sum(axis=0)   # (4, 3)
+        rated = valid.sum(axis=0)                                # (4,)
+        x = np.where(valid, L, 0).astype(float)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = x.sum(axis=0) / rated
+            var = ((x * x).sum(axis=0) - rated * mean * mean) / (rated - 1)
+            half = z * np.sqrt(np.maximum(var, 0) / rated)
+        high_ci = wilson(counts[:, -1], rated, z)
+
+        decided = self.winner >= 0
+        wins = np.array([(self.winner == 0).sum(), (self.winner == 1).sum()])
+        b_ci = wilson(wins[1], decided.sum(), z)
+
+        def num(v: float) -> Optional[float]:
+            return None if np.isnan(v) else round(float(v), 4)
+
+        dims = {}
+        for d, name in enumerate(CRITERIA):
+            n = int(rated[d])
+            dims[name.lower()] = {
+                "rated": n,
+                "distribution": {lv: int(c) for lv, c in zip(LEVELS, counts[d])},
+                "share": {lv: num(c / n) if n else None for lv, c in zip(LEVELS, counts[d])},
+                "mean": num(mean[d]),
+                "mean_ci": [num(mean[d] - half[d]), num(mean[d] + half[d])] if n > 1 else None,
+                "high_rate": num(counts[d, -1] / n) if n else None,
+                "high_ci": [num(v) for v in high_ci[d]] if n else None,
+            }
+        n_decided = int(decided.sum())
+        return {
+            "n": len(self),
+            "confidence": confidence,
+            "dimensions": dims,
+            "winner": {
+                "A": int(wins[0]),
+                "B": int(wins[1]),
+                "undecided": len(self) - n_decided,
+                "b_win_rate": num(wins[1] / n_decided) if n_decided else None,
+                "b_win_ci": [num(v) for v in b_ci] if n_decided else None,
+            },
+        }
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Summarise batch.py results.")
+    ap.add_argument("results", help="results JSONL written by batch.py")
+    ap.add_argument("--confidence", type=float, default=0.95)
+    ap.add_argument("--history", action="store_true",
+                    help="`results` is a history.py SQLite store")
+    ap.add_argument("--model", help="history rows for this model only")
+    ap.add_argument("--since", help="history rows from this epoch second / ISO date on")
+    args = ap.parse_args(argv)
+    if args.history:
+        from history import HistoryStore
+
+        store = HistoryStore(args.results)
+        try:
+            table = ScoreTable.from_history(store, model=args.model, since=args.since)
+        finally:
+            store.close()
+    else:
+        table = ScoreTable.from_jsonl(args.results)
+    print(json.dumps(table.summary(args.confidence), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,16 @@
 # app.py ────────────────────────────────────────────────────────────────────
 import streamlit as st
+import io
 import json
-from main import PromptEvaluator
-from config import SUPPORTED_MODELS, update_config_for_model
+import tempfile
+import time
+from jobs import ACTIVE, get_job_manager
+from main import get_evaluator
+from config import (
+    GATING_ENABLED, SELF_CONSISTENCY, STAGE_MODELS, SUPPORTED_MODELS, available_models, update_config_for_model,
+)
+from gating import get_gate_policy
+from scores import LEVELS
 
 # ── Basic page setup ───────────────────────────────────────────────────────
 st.set_page_config("AutoGen Prompt Evaluator", layout="wide")
@@ -30,20 +38,33 @@ def _rerun():
     except AttributeError:
         st.experimental_rerun()
 
-# ── initialise evaluator in session ────────────────────────────────────────
-if "evaluator" not in st.session_state:
-    st.session_state.evaluator = PromptEvaluator()
 st.session_state.setdefault("first_pass", None)
 st.session_state.setdefault("final_pass", None)
 
 # ── sidebar ────────────────────────────────────────────────────────────────
 model_choice = st.sidebar.selectbox("LLM backend", SUPPORTED_MODELS)
 
+# per-agent model: the backend above, "auto" (smallest model meeting the
+# stage's latency / cost target) or a fixed one
+_BACKEND = "backend"
+with st.sidebar.expander("Per-stage models"):
+    _options = [_BACKEND, "auto", *available_models()]
+    stage_models = {}
+    for role, default in STAGE_MODELS.items():
+        default = default or _BACKEND
+        choice = st.selectbox(
+            role.capitalize(), _options,
+            index=_options.index(default) if default in _options else 0,
+            key=f"model_{role}",
+        )
+        stage_models[role] = "" if choice == _BACKEND else choice
+
+# one evaluator per model config, shared by every session in this process;
+# its agents (and autogen) are only loaded on the first evaluation
+evaluator = get_evaluator(update_config_for_model(model_choice), stage_models)
+
 if st.session_state.get("last_model") != model_choice:
     st.session_state.last_model = model_choice
-    st.session_state.evaluator.update_llm_config(
-        update_config_for_model(model_choice)
-    )
     st.sidebar.success(f"Switched to {model_choice}")
 
 if st.sidebar.button("Clear session"):
@@ -51,6 +72,42 @@ if st.sidebar.button("Clear session"):
     st.session_state.final_pass = None
     _rerun()
 
+bypass_cache = st.sidebar.checkbox("Bypass LLM cache", value=False)
+fan_out = st.sidebar.checkbox(
+    "Rank all improved prompts", value=False,
+    help="Answer every candidate prompt and pick the best with a comparator tournament",
+)
+candidates = st.sidebar.slider("Candidate prompts", 2, 6, 3) if fan_out else 2
+gating = st.sidebar.checkbox(
+    "Skip rewrite when Answer A is good", value=GATING_ENABLED,
+    help=f"No Fixer / Generator / Comparator calls when the Critic's levels meet: {get_gate_policy()}",
+)
+consistency = st.sidebar.checkbox(
+    "Self-consistency votes", value=SELF_CONSISTENCY,
+    help="Critic and Comparator sample until their verdicts agree (majority is used)",
+)
+if evaluator.cache is not None:
+    cs = evaluator.cache.stats()
+    st.sidebar.caption(
+        f"LLM cache: {cs['hits']} hits / {cs['misses']} misses · {cs['entries']} entries"
+    )
+if evaluator.prompt_index is not None:
+    ps = evaluator.prompt_index.stats()
+    st.sidebar.caption(
+        f"Prompt index: {ps['hit_rate']:.0%} hit rate · {ps['entries']} prompts"
+    )
+for name, ms in evaluator.ollama_status().items():
+    # local models are preloaded and kept resident (ollama_warmup.py)
+    detail = {
+        "loading": "loading …",
+        "loaded": f"loaded in {ms['load_seconds']}s" if ms["load_seconds"] else "loaded",
+        "evicted": "evicted – reloading on the next refresh",
+        "error": f"unreachable ({ms['error']})",
+    }[ms["state"]]
+    if ms["state"] == "loaded" and ms["expires_at"]:
+        detail += f" · resident until {ms['expires_at'][:19].replace('T', ' ')}"
+    st.sidebar.caption(f"Ollama {name}: {detail}")
+
 # ── header & input ─────────────────────────────────────────────────────────
 st.title("AutoGen Prompt Evaluator")
 
@@ -71,52 +128,197 @@ with c1:
 with c2:
     answer_a_text = st.text_area("Answer A (existing LLM output)", height=160)
 
-# ── run button ─────────────────────────────────────────────────────────────
-if st.button("Run Evaluation", use_container_width=True):
+# ── run / cancel ───────────────────────────────────────────────────────────
+# evaluations run as background jobs, so a slow provider never blocks this
+# script run; the panel below polls the job and redraws as stages finish
+jobs = get_job_manager()
+job_id = st.session_state.get("job_id")
+job = jobs.poll(job_id) if job_id else None
+active = job is not None and job["status"] in ACTIVE
+
+c_run, c_cancel = st.columns([4, 1])
+if c_run.button("Run Evaluation", use_container_width=True):
     if not prompt_text.strip() or not answer_a_text.strip():
         st.error("Please fill in both the prompt and Answer A.")
         st.stop()
+    if active:                       # a new run replaces the one on screen
+        jobs.cancel(job_id)
+    st.session_state.job_id = jobs.submit(
+        evaluator, prompt_text, answer_a_text,
+        chosen_prompt=None,          # first bullet / best-ranked
+        use_cache=not bypass_cache,
+        fan_out=fan_out, candidates=candidates, gating=gating,
+        self_consistency=consistency,
+    )
+    _rerun()
 
-    with st.spinner("Running full evaluation …"):
-        res = st.session_state.evaluator.evaluate_prompt_response(
-            prompt_text, answer_a_text, chosen_prompt=None  # first bullet
-        )
-    st.session_state.final_pass = res  # save for download
+if c_cancel.button("Cancel", use_container_width=True, disabled=not active):
+    jobs.cancel(job_id)
+    _rerun()
+
+
+def _show(snap):
+    """Tabs for a job snapshot: finished stage values, else text streamed so far."""
+    stages, streamed = snap["stages"], snap["streamed"]
+    res = snap["result"]
+
+    def text(stage):
+        return stages.get(stage, streamed.get(stage, ""))
+
+    if res and res.get("consensus"):
+        st.caption(" · ".join(
+            f"{stage}: {c['agreement']:.0%} agreement over {c['samples']} samples"
+            for stage, c in res["consensus"].items()
+        ))
+
+    if stages.get("gate") is False:
+        st.success("The Critic rated Answer A good enough – rewrite, Answer B and comparison were skipped.")
 
-    # display results
     tab_critic, tab_fixer, tab_comp = st.tabs(
         ["Critic Analysis", "Improved Prompts", "Response Comparison"]
     )
 
     with tab_critic:
         st.subheader("Critic Analysis")
-        st.code(res["critic_analysis"], language="markdown")
+        st.code(text("critic"), language="markdown")
 
     with tab_fixer:
-        st.subheader("Improved Prompts (first one was used)")
-        for i, txt in enumerate(res["improved_prompts"], 1):
-            st.markdown(f"**Version {i}**")
-            st.code(txt, language="markdown")
+        st.subheader(
+            "Improved Prompts (best-ranked one was used)" if snap["inputs"].get("fan_out")
+            else "Improved Prompts (first one was used)"
+        )
+        if "improved" in stages:
+            for i, txt in enumerate(stages["improved"], 1):
+                st.markdown(f"**Version {i}**")
+                st.code(txt, language="markdown")
+        else:
+            st.code(streamed.get("improved", ""), language="markdown")
 
     with tab_comp:
         st.subheader("Comparator Verdict")
-        st.code(res["comparison_analysis"], language="markdown")
+        st.code(text("comparison"), language="markdown")
 
         st.markdown("**Answer A**")
-        st.code(res["original_response"], language="markdown")
+        st.code(snap["inputs"]["answer_a"], language="markdown")
 
         st.markdown("**Prompt used for Answer B**")
-        st.code(res["chosen_prompt"], language="markdown")
+        st.code(text("use_prompt") or "", language="markdown")
 
         st.markdown("**Answer B**")
-        st.code(res["new_response"], language="markdown")
-
-    # optional JSON
-    if st.sidebar.toggle("Export results as JSON", key="dl", value=False):
-        st.sidebar.download_button(
-            "Download results.json",
-            data=json.dumps(res, indent=2),
-            file_name="evaluation_results.json",
-            mime="application/json",
-            use_container_width=True,
+        st.code(text("answer_b"), language="markdown")
+
+        if res and "ranking" in res:
+            st.markdown(f"**Tournament ranking** ({res['comparisons']} comparisons)")
+            for row in res["ranking"]:
+                label = "Answer A (original prompt)" if row["prompt"] is None else row["prompt"]
+                st.markdown(f"{row['rank']}. {label}")
+
+    if res:
+        # per-stage wall time, tokens, cost (from config `price`) and models
+        with st.expander("Stage timings"):
+            st.dataframe(
+                [
+                    {**{k: s[k] for k in ("stage", "seconds", "calls", "prompt_tokens",
+                                          "completion_tokens", "cost")},
+                     "models": ", ".join(s["models"])}
+                    for s in res["spans"]
+                ],
+                use_container_width=True,
+            )
+
+
+def _job_panel():
+    snap = jobs.poll(st.session_state.job_id)
+    if snap is None:
+        st.info("This evaluation is no longer available.")
+        return
+    status = snap["status"]
+    if status in ACTIVE:
+        done = ", ".join(snap["stages"]) or "none yet"
+        st.progress(snap["progress"], text=f"{status.capitalize()} … stages done: {done}")
+    elif status == "failed":
+        st.error(f"Evaluation failed: {snap['error']}")
+    elif status == "cancelled":
+        st.warning("Evaluation cancelled.")
+    _show(snap)
+
+    if status == "done" and st.session_state.get("final_job") != snap["id"]:
+        st.session_state.final_job = snap["id"]
+        st.session_state.final_pass = snap["result"]  # save for download
+        _rerun()                     # stop polling, refresh the sidebar
+    elif status not in ACTIVE and active:
+        _rerun()
+
+
+if st.session_state.get("job_id"):
+    if hasattr(st, "fragment"):
+        # while a job is active only this panel re-runs, twice a second
+        st.fragment(run_every=0.5 if active else None)(_job_panel)()
+    else:                            # older Streamlit: poll with full reruns
+        _job_panel()
+        if active:
+            time.sleep(0.5)
+            _rerun()
+
+# optional JSON
+res = st.session_state.final_pass
+if res and st.sidebar.toggle("Export results as JSON", key="dl", value=False):
+    st.sidebar.download_button(
+        "Download results.json",
+        data=json.dumps(res, indent=2),
+        file_name="evaluation_results.json",
+        mime="application/json",
+        use_container_width=True,
+    )
+
+# ── history ────────────────────────────────────────────────────────────────
+# every finished evaluation is kept in history.py's SQLite store; page
+# through it newest first and export the filtered rows as JSONL
+store = evaluator.history
+if store is not None:
+    with st.expander("History"):
+        h1, h2, h3 = st.columns(3)
+        h_model = h1.selectbox("Model", ["any", *store.models()], key="h_model")
+        h_corr = h2.selectbox("Correctness", ["any", *LEVELS], key="h_corr")
+        h_winner = h3.selectbox("Winner", ["any", "A", "B"], key="h_winner")
+        h_prompt = st.text_input("Exact prompt", key="h_prompt").strip()
+        filters = {
+            "model": None if h_model == "any" else h_model,
+            "correctness": None if h_corr == "any" else h_corr,
+            "winner": None if h_winner == "any" else h_winner,
+            "prompt": h_prompt or None,
+        }
+        # keyset paging: a stack of `before` ids, one per page seen
+        if st.session_state.get("h_filters") != filters:
+            st.session_state.h_filters = filters
+            st.session_state.h_pages = [None]
+        pages = st.session_state.h_pages
+        rows = store.page(20, before=pages[-1], **filters)
+        st.dataframe(rows, use_container_width=True)
+
+        p1, p2, p3 = st.columns([1, 1, 3])
+        if p1.button("Newer", disabled=len(pages) == 1):
+            pages.pop()
+            _rerun()
+        if p2.button("Older", disabled=len(rows) < 20):
+            pages.append(rows[-1]["id"])
+            _rerun()
+        p3.caption(f"Matching evaluations: {store.count(**filters)}")
+
+        if rows:
+            pick = st.selectbox("Show result", [r["id"] for r in rows], key="h_pick")
+            st.json(store.get(pick), expanded=False)
+
+        def _export():
+            # streamed to a temp file on click, never built up in memory
+            text = io.TextIOWrapper(tempfile.TemporaryFile(), encoding="utf-8")
+            store.export(text, **filters)
+            text.flush()
+            fh = text.detach()
+            fh.seek(0)
+            return fh
+
+        st.download_button(
+            "Export matching history (JSONL)", data=_export,
+            file_name="evaluation_history.jsonl", mime="application/x-ndjson",
         )
@@ -0,0 +1,147 @@
+"""
+batch.py – run the evaluator over a JSONL dataset.
+
+Each input line is {"id"?, "prompt", "answer_a", "chosen_prompt"?}.
+Results are appended to the output JSONL as they finish, in the same
+shape `evaluate_prompt_response` returns plus "id". The output file is
+also the checkpoint: re-running the same command skips finished ids.
+Every result is also recorded, tagged with its id, in the evaluation
+history (history.py).
+
+    python batch.py data.jsonl -o results.jsonl -c 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional, Set
+
+
+def iter_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    """Stream records from a JSONL file; the line number is the default id."""
+    with open(path, encoding="utf-8") as fh:
+        for lineno, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            rec.setdefault("id", lineno)
+            yield rec
+
+
+class JsonlSink:
+    """
+    Append-only JSONL writer that doubles as a resume checkpoint.
+    A torn last line from a crashed run is truncated on open.
+    """
+
+    def __init__(self, path: str, resume: bool = True, fsync_every: int = 50) -> None:
+        self.path = path
+        self.fsync_every = fsync_every
+        self._done: Set[str] = set()
+        self._since_sync = 0
+        if resume and os.path.exists(path):
+            self._recover()
+        self._fh = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def _recover(self) -> None:
+        with open(self.path, "rb+") as fh:
+            data = fh.read()
+            keep = data.rfind(b"\n") + 1
+            if keep != len(data):           # crash mid-write → drop partial row
+                fh.truncate(keep)
+        for line in data[:keep].splitlines():
+            if line.strip():
+                self._done.add(str(json.loads(line)["id"]))
+
+    def done_ids(self) -> Set[str]:
+        return set(self._done)
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self._fh.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self._fh.flush()
+        self._done.add(str(row["id"]))
+        self._since_sync += 1
+        if self._since_sync >= self.fsync_every:
+            os.fsync(self._fh.fileno())
+            self._since_sync = 0
+
+    def close(self) -> None:
+        if not self._fh.closed:
+            self._fh.flush()
+            os.fsync(self._fh.fileno())
+            self._fh.close()
+
+    def __enter__(self) -> "JsonlSink":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def run_batch(
+    in_path: str,
+    out_path: str,
+    concurrency: int = 4,
+    resume: bool = True,
+    model: Optional[str] = None,
+    critic_batch: Optional[int] = None,
+) -> Dict[str, int]:
+    """Evaluate `in_path` into `out_path`; returns done/failed/skipped counts."""
+    from main import PromptEvaluator
+    from config import update_config_for_model
+
+    evaluator = PromptEvaluator()
+    if model:
+        evaluator.update_llm_config(update_config_for_model(model))
+
+    stats = {"done": 0, "failed": 0, "skipped": 0}
+    with JsonlSink(out_path, resume=resume) as sink:
+        finished = sink.done_ids()
+
+        def todo() -> Iterator[Dict[str, Any]]:
+            for rec in iter_jsonl(in_path):
+                if str(rec["id"]) in finished:
+                    stats["skipped"] += 1
+                    continue
+                yield rec
+
+        t0 = time.perf_counter()
+        rows = evaluator.evaluate_batch(todo(), concurrency=concurrency, critic_batch=critic_batch)
+        for row in rows:
+            if "error" in row:
+                # not checkpointed → retried on the next run
+                stats["failed"] += 1
+                print(f"[batch] id={row['id']} failed: {row['error']}", file=sys.stderr)
+                continue
+            sink.write(row)
+            stats["done"] += 1
+            if stats["done"] % 25 == 0:
+                rate = stats["done"] / (time.perf_counter() - t0)
+                print(f"[batch] {stats['done']} done ({rate:.2f}/s)", file=sys.stderr)
+    return stats
+
+
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Batch prompt evaluation over JSONL.")
+    ap.add_argument("input", help="input JSONL with prompt / answer_a per line")
+    ap.add_argument("-o", "--output", help="results JSONL (default: <input>.results.jsonl)")
+    ap.add_argument("-c", "--concurrency", type=int, default=4,
+                    help="max evaluations in flight (default 4)")
+    ap.add_argument("--model", help="one of config.SUPPORTED_MODELS")
+    ap.add_argument("--critic-batch", type=int, default=None,
+                    help="answers per Critic request (default CRITIC_BATCH_SIZE = 1, i.e. off)")
+    ap.add_argument("--no-resume", action="store_true",
+                    help="overwrite the output instead of resuming from it")
+    args = ap.parse_args(argv)
+
+    out = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    stats = run_batch(
+        args.input, out, args.concurrency, not args.no_resume, args.model, args.critic_batch
+    )
+    print(json.dumps(stats), file=sys.stderr)
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""
+benchmark.py – offline throughput / latency benchmark for PromptEvaluator.
+
+Starts a local MockLLMServer (or uses --base-url), points a fresh
+evaluator at it and drives the pipeline in three modes:
+
+• single      – one evaluation at a time
+• concurrent  – N evaluations at once (aevaluate_prompt_response)
+• batch       – the JSONL path (aevaluate_batch with N in flight)
+
+The report (throughput, p50/p95/p99 end-to-end latency, per-stage
+breakdown from the result spans) is written as JSON:
+
+    python benchmark.py --mode all -n 50 -c 8 --token-latency 0.005 -o bench.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from cache import LLMCache
+from clients import ClientPool
+from main import PromptEvaluator
+from mock_llm_server import MockLLMServer
+from prompt_index import PromptIndex
+from ratelimit import RateLimiterRegistry
+from router import EndpointRouter
+
+MODES = ("single", "concurrent", "batch")
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    vals = sorted(values)
+    if not vals:
+        return {"count": 0}
+
+    def pct(q: float) -> float:        # nearest rank
+        return round(vals[min(len(vals) - 1, int(q * len(vals)))], 4)
+
+    return {
+        "count": len(vals),
+        "mean": round(sum(vals) / len(vals), 4),
+        "min": round(vals[0], 4),
+        "p50": pct(0.50),
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "max": round(vals[-1], 4),
+    }
+
+
+def _records(n: int) -> List[Dict[str, Any]]:
+    # distinct prompts so nothing collapses onto one cache / router key
+    return [
+        {
+            "id": i,
+            "prompt": f"Explain topic number {i} of the Python standard library.",
+            "answer_a": f"Module {i} is part of Python and does useful things.",
+        }
+        for i in range(n)
+    ]
+
+
+class _Run:
+    """Latencies, stage spans and failures collected for one mode."""
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.stages: Dict[str, List[float]] = {}
+        self.tokens = 0
+        self.cost = 0.0
+        self.errors: List[str] = []
+
+    def add(self, res: Dict[str, Any], latency: Optional[float]) -> None:
+        if "error" in res:
+            self.errors.append(res["error"])
+            return
+        if latency is not None:
+            self.latencies.append(latency)
+        for span in res.get("spans", []):
+            self.stages.setdefault(span["stage"], []).append(span["seconds"])
+            self.tokens += span["prompt_tokens"] + span["completion_tokens"]
+            self.cost += span["cost"]
+
+    def report(self, mode: str, n: int, concurrency: int, wall: float) -> Dict[str, Any]:
+        ok = n - len(self.errors)
+        return {
+            "mode": mode,
+            "requests": n,
+            "concurrency": concurrency,
+            "ok": ok,
+            "errors": len(self.errors),
+            "error_samples": self.errors[:5],
+            "wall_seconds": round(wall, 4),
+            "throughput_rps": round(ok / wall, 4) if wall else 0.0,
+            "latency": _summary(self.latencies),
+            "stages": {name: _summary(v) for name, v in self.stages.items()},
+            "tokens": self.tokens,
+            "cost": round(self.cost, 6),
+        }
+
+
+async def _timed(ev: PromptEvaluator, rec: Dict[str, Any]) -> Dict[str, Any]:
+    t0 = time.perf_counter()
+    try:
+        # the full pipeline, whatever GATING says
+        res = await ev.aevaluate_prompt_response(rec["prompt"], rec["answer_a"], gating=False)
+    except Exception as exc:
+        return {"error": f"{type(exc).__name__}: {exc}", "latency": None}
+    return {**res, "latency": time.perf_counter() - t0}
+
+
+async def _run_mode(
+    mode: str, ev: PromptEvaluator, records: List[Dict[str, Any]], concurrency: int
+) -> Dict[str, Any]:
+    run = _Run()
+    t0 = time.perf_counter()
+    if mode == "single":
+        for rec in records:
+            res = await _timed(ev, rec)
+            run.add(res, res.pop("latency"))
+        concurrency = 1
+    elif mode == "concurrent":
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one(rec: Dict[str, Any]) -> None:
+            async with sem:
+                res = await _timed(ev, rec)
+            run.add(res, res.pop("latency"))
+
+        await asyncio.gather(*(one(r) for r in records))
+    elif mode == "batch":
+        # aevaluate_batch yields in completion order; latency is time since submit,
+        # which is what a batch caller sees
+        async for res in ev.aevaluate_batch(records, concurrency=concurrency):
+            run.add(res, None if "error" in res else time.perf_counter() - t0)
+    else:
+        raise ValueError(f"unknown mode '{mode}'")
+    return run.report(mode, len(records), concurrency, time.perf_counter() - t0)
+
+
+def run_benchmark(
+    base_url: Optional[str] = None,
+    modes: Sequence[str] = MODES,
+    requests: int = 20,
+    concurrency: int = 8,
+    server_opts: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Run the chosen modes and return the report dict. Without `base_url`
+    a MockLLMServer is started with `server_opts` for the duration.
+    """
+    server = None
+    if base_url is None:
+        server = MockLLMServer(**(server_opts or {})).start()
+        llm_config = server.llm_config()
+    else:
+        llm_config = {
+            "temperature": 0.0,
+            "timeout": 60,
+            "config_list": [{"model": "mock", "api_key": "mock", "base_url": base_url,
+                             "price": [0.0, 0.0]}],
+        }
+    base = llm_config["config_list"][0]["base_url"]
+    pool = ClientPool()
+    report: Dict[str, Any] = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "base_url": base,
+        "server": server_opts if server is not None else None,
+        "modes": {},
+    }
+    try:
+        for mode in modes:
+            # fresh limiter / router per mode so adaptive state doesn't leak
+            # across modes; start the limiter wide enough that it measures
+            # orchestration rather than its own ramp-up
+            ev = PromptEvaluator(
+                pool=pool,
+                limiter=RateLimiterRegistry({base: {"concurrency": 2 * concurrency}}),
+                router=EndpointRouter(),
+                # mock runs stay out of the user's history and prompt index
+                prompt_index=PromptIndex(),
+                history=None,
+            )
+            ev.update_llm_config(llm_config)
+            ev.agents   # build the (lazy) agents outside the timed region
+
+            async def go() -> Dict[str, Any]:
+                # each pipeline keeps up to two agent calls in flight
+                asyncio.get_running_loop().set_default_executor(
+                    ThreadPoolExecutor(max_workers=2 * concurrency)
+                )
+                with LLMCache.bypass():
+                    return await _run_mode(mode, ev, _records(requests), concurrency)
+
+            report["modes"][mode] = asyncio.run(go())
+    finally:
+        pool.close()
+        if server is not None:
+            report["server_stats"] = server.stats()
+            server.stop()
+    return report
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Offline PromptEvaluator benchmark.")
+    ap.add_argument("--mode", choices=(*MODES, "all"), default="all")
+    ap.add_argument("-n", "--requests", type=int, default=20)
+    ap.add_argument("-c", "--concurrency", type=int, default=8)
+    ap.add_argument("-o", "--output", default="benchmark.json")
+    ap.add_argument("--base-url", default=None,
+                    help="use an already running OpenAI-compatible server")
+    ap.add_argument("--token-latency", type=float, default=0.005)
+    ap.add_argument("--first-token-latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--ramble", type=int, default=0,
+                    help="filler words the stub appends to every reply (exercises output budgets)")
+    args = ap.parse_args()
+
+    report = run_benchmark(
+        base_url=args.base_url,
+        modes=list(MODES) if args.mode == "all" else [args.mode],
+        requests=args.requests,
+        concurrency=args.concurrency,
+        server_opts={
+            "token_latency": args.token_latency,
+            "first_token_latency": args.first_token_latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "ramble": args.ramble,
+            "seed": args.seed,
+        },
+    )
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+
+    for mode, r in report["modes"].items():
+        lat = r["latency"]
+        print(
+            f"{mode:<11} {r['ok']}/{r['requests']} ok  "
+            f"{r['throughput_rps']:.2f} req/s  "
+            f"p50 {lat.get('p50', 0):.3f}s  p95 {lat.get('p95', 0):.3f}s  "
+            f"p99 {lat.get('p99', 0):.3f}s",
+            file=sys.stderr,
+        )
+    print(f"report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+cache.py – persistent, content-addressed cache for single-turn agent calls.
+
+Replies are stored in SQLite keyed by a hash of the endpoints (model,
+base_url and temperature of every config_list entry, since the router may
+send a call to any of them), system_message and messages (plus any
+per-call overrides).
+Entries are evicted least-recently-used once the entry/byte bounds are
+exceeded and expire after an optional TTL.
+"""
+import contextlib
+import contextvars
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    CACHE_ENABLED, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES, CACHE_PATH, CACHE_TTL,
+    llm_config_dict,
+)
+
+# per-context bypass, so `with cache.bypass():` also covers worker threads
+# started through asyncio.to_thread (they inherit the context)
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+# writes between full recounts of the table (other processes may share it)
+_RECOUNT_EVERY = 1000
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 10_000,
+        max_bytes: Optional[int] = None,
+        ttl: Optional[float] = None,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_lru ON llm_cache(accessed)")
+        self.hits = self.misses = self.writes = self.evictions = self.expired = 0
+        # running totals, so a write doesn't scan the table
+        self._count, self._bytes = self._totals()
+
+    # ── keys ────────────────────────────────────────────────────────────
+    @staticmethod
+    def make_key(
+        llm_config: Any,
+        system_message: str,
+        messages: List[Dict[str, Any]],
+        **overrides: Any,
+    ) -> str:
+        cfg = llm_config_dict(llm_config)
+        # the whole set, sorted: a routed call may be answered by any entry,
+        # and the router's order changes from call to call
+        endpoints = sorted(
+            (
+                str(entry.get("model")),
+                str(entry.get("base_url")),
+                str(entry.get("temperature", cfg.get("temperature"))),
+            )
+            for entry in cfg.get("config_list") or [{}]
+        )
+        payload = {
+            "endpoints": endpoints,
+            "system_message": system_message,
+            "messages": messages,
+            "overrides": overrides,
+        }
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # ── get / set ───────────────────────────────────────────────────────
+    @staticmethod
+    @contextlib.contextmanager
+    def bypass() -> Iterator[None]:
+        """Skip cache reads and writes for calls made inside this block."""
+        token = _bypass.set(True)
+        try:
+            yield
+        finally:
+            _bypass.reset(token)
+
+    @property
+    def bypassed(self) -> bool:
+        return _bypass.get()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, created, size FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created, size = row
+            if self.ttl is not None and now - created > self.ttl:
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._count -= 1
+                self._bytes -= size
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed, size)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, size),
+            )
+            self._count += old is None
+            self._bytes += size - (old[0] if old else 0)
+            self.writes += 1
+            if self.writes % _RECOUNT_EVERY == 0:
+                self._count, self._bytes = self._totals()
+            self._evict()
+
+    def _totals(self) -> Tuple[int, int]:
+        return self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+
+    def _evict(self) -> None:
+        excess = max(0, self._count - self.max_entries)
+        over = self._bytes - self.max_bytes if self.max_bytes is not None else 0
+        if not excess and over <= 0:
+            return
+        # walk the LRU end until enough entries and bytes are freed
+        keys: List[str] = []
+        freed = 0
+        rows = self._db.execute("SELECT key, size FROM llm_cache ORDER BY accessed")
+        for key, size in rows:
+            if len(keys) >= excess and freed >= over:
+                break
+            keys.append(key)
+            freed += size
+        rows.close()
+        self._db.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in keys])
+        self._count -= len(keys)
+        self._bytes -= freed
+        self.evictions += len(keys)
+
+    # ── housekeeping ────────────────────────────────────────────────────
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM llm_cache")
+            self._count = self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count, total = self._totals()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_default: Optional[LLMCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> Optional[LLMCache]:
+    """Process-wide cache built from config.py, or None when disabled."""
+    global _default
+    if not CACHE_ENABLED:
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = LLMCache(CACHE_PATH, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL)
+        return _default
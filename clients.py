@@ -0,0 +1,100 @@
+"""
+clients.py – process-wide pool of LLM clients shared by all agents.
+
+One keep-alive HTTP connection pool per provider endpoint (base_url +
+api_key), and one autogen OpenAIWrapper per distinct llm_config on top
+of it. Agents built from the same config therefore share a client, and
+a model switch on the same endpoint reuses the warm connections.
+"""
+import hashlib
+import json
+import threading
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+from config import (
+    POOL_KEEPALIVE_EXPIRY, POOL_MAX_CONNECTIONS, POOL_MAX_KEEPALIVE,
+    llm_config_dict,
+)
+
+if TYPE_CHECKING:   # autogen / httpx load on the first client, not on import
+    import httpx
+    from autogen import OpenAIWrapper
+
+
+def _endpoint_key(entry: Dict[str, Any]) -> Tuple[str, str]:
+    # never keep raw keys around as dict keys
+    key_hash = hashlib.sha256(str(entry.get("api_key", "")).encode()).hexdigest()[:16]
+    return entry.get("base_url") or "", key_hash
+
+
+def _new_http_client() -> "httpx.Client":
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=POOL_MAX_KEEPALIVE,
+        keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+    )
+    try:   # same defaults (redirects, timeouts) the OpenAI SDK would use
+        from openai import DefaultHttpxClient
+        return DefaultHttpxClient(limits=limits)
+    except ImportError:
+        return httpx.Client(limits=limits, follow_redirects=True)
+
+
+class ClientPool:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._http: Dict[Tuple[str, str], "httpx.Client"] = {}
+        self._wrappers: Dict[str, "OpenAIWrapper"] = {}
+
+    def get(self, llm_config: Any, stream: bool = False) -> "OpenAIWrapper":
+        """Shared OpenAIWrapper for `llm_config` (built once per config)."""
+        from autogen import OpenAIWrapper
+
+        cfg = llm_config_dict(llm_config)
+        entries = [
+            {k: v for k, v in e.items() if k != "http_client"}
+            for e in cfg.get("config_list", [])
+        ]
+        if stream:
+            entries = [{**e, "stream": True} for e in entries]
+        ident = json.dumps({**cfg, "config_list": entries}, sort_keys=True, default=str)
+
+        with self._lock:
+            wrapper = self._wrappers.get(ident)
+            if wrapper is None:
+                pooled = []
+                for e in entries:
+                    ep = _endpoint_key(e)
+                    if ep not in self._http:
+                        self._http[ep] = _new_http_client()
+                    # retries/backoff are owned by ratelimit.ProviderLimiter,
+                    # so the SDK must not retry 429s behind its back
+                    pooled.append({"max_retries": 0, **e, "http_client": self._http[ep]})
+                wrapper = OpenAIWrapper(**{**cfg, "config_list": pooled})
+                self._wrappers[ident] = wrapper
+            return wrapper
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"endpoints": len(self._http), "clients": len(self._wrappers)}
+
+    def close(self) -> None:
+        with self._lock:
+            for http in self._http.values():
+                http.close()
+            self._http.clear()
+            self._wrappers.clear()
+
+
+_default: Optional[ClientPool] = None
+_default_lock = threading.Lock()
+
+
+def get_client_pool() -> ClientPool:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ClientPool()
+        return _default
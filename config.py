@@ -1,4 +1,5 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Sequence
+import json
 import os
 from dotenv import load_dotenv
 
@@ -7,106 +8,289 @@ load_dotenv()
 DEFAULT_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1")
 DEFAULT_TEMPERATURE = float(os.getenv("TEMPERATURE", "0.7"))
 DEFAULT_TIMEOUT = int(os.getenv("TIMEOUT", "600"))
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama2")
+
+# Ollama warm-up (ollama_warmup.py): preload the local models an evaluator
+# uses and keep them resident for OLLAMA_KEEP_ALIVE (Ollama duration, "-1"
+# = forever), re-sent every OLLAMA_KEEPALIVE_INTERVAL seconds
+OLLAMA_WARMUP = os.getenv("OLLAMA_WARMUP", "1") != "0"
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+OLLAMA_KEEPALIVE_INTERVAL = float(os.getenv("OLLAMA_KEEPALIVE_INTERVAL", "60"))
+
+# LLM_ROUTING=1: the default backend holds every available endpoint and
+# router.py sends each call to the fastest healthy one
+ROUTING_ENABLED = os.getenv("LLM_ROUTING", "0") == "1"
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "50"))                  # samples kept per endpoint
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.3"))
+ROUTER_COOLDOWN = float(os.getenv("ROUTER_COOLDOWN", "30"))            # seconds an ejected endpoint rests
+
+# shared keep-alive HTTP pool per provider endpoint (clients.py)
+POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_POOL_KEEPALIVE_EXPIRY", "60"))
+
+# client-side rate limiting (ratelimit.py), per provider base_url.
+# Defaults follow the providers' entry tiers; raise them for paid plans.
+RATE_LIMIT_DEFAULTS = {
+    "concurrency": float(os.getenv("RATE_LIMIT_CONCURRENCY", "4")),
+    "max_concurrency": float(os.getenv("RATE_LIMIT_MAX_CONCURRENCY", "64")),
+    "latency_target": float(os.getenv("RATE_LIMIT_LATENCY_TARGET", "0")) or None,
+    "max_retries": int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5")),
+}
+RATE_LIMITS = {
+    "https://api.groq.com/openai/v1": {"rpm": 30, "tpm": 6000},
+    "https://api.openai.com/v1": {"rpm": 500, "tpm": 10000},
+    "https://api.anthropic.com/v1": {"rpm": 50, "tpm": 20000},
+}
+if os.getenv("RATE_LIMIT_RPM") or os.getenv("RATE_LIMIT_TPM"):
+    # one override for whichever provider is in use
+    for _limits in RATE_LIMITS.values():
+        _limits["rpm"] = float(os.getenv("RATE_LIMIT_RPM") or _limits["rpm"])
+        _limits["tpm"] = float(os.getenv("RATE_LIMIT_TPM") or _limits["tpm"])
+# share of those budgets this process may use; worker.py runs each of its
+# N processes at 1/N so that together they stay within the provider limits
+RATE_LIMIT_SHARE = float(os.getenv("RATE_LIMIT_SHARE", "1"))
+if RATE_LIMIT_SHARE != 1:
+    for _limits in RATE_LIMITS.values():
+        _limits["rpm"] *= RATE_LIMIT_SHARE
+        _limits["tpm"] *= RATE_LIMIT_SHARE
+
+# background evaluation jobs (jobs.py): pipelines run at once / finished jobs kept
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "200"))
+
+# HTTP API (server.py)
+SERVER_HOST = os.getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8080"))
+SERVER_MAX_CONCURRENCY = int(os.getenv("SERVER_MAX_CONCURRENCY", "8"))    # pipelines at once
+SERVER_MAX_BODY = int(os.getenv("SERVER_MAX_BODY", str(8 * 1024 * 1024)))  # bytes
+
+# per-agent output budgets (agents/base.py): max_tokens and stop sequences
+# go to the provider (0 / [] = none); stop is a JSON list, e.g. '["\\n\\n"]'.
+# EARLY_STOP=1 also ends a reply, streamed, as soon as its expected shape
+# (Critic: four labelled lines, Fixer: n bullets) is complete.
+def _budget(agent: str, max_tokens: int) -> Dict[str, Any]:
+    return {
+        "max_tokens": int(os.getenv(f"{agent}_MAX_TOKENS", str(max_tokens))) or None,
+        "stop": json.loads(os.getenv(f"{agent}_STOP", "[]")),
+    }
+
+OUTPUT_BUDGETS = {
+    "critic": _budget("CRITIC", 300),
+    "fixer": _budget("FIXER", 400),
+    "comparator": _budget("COMPARATOR", 0),
+    "generator": _budget("GENERATOR", 0),
+}
+EARLY_STOP = os.getenv("EARLY_STOP", "1") != "0"
+
+# batched critique (CriticAgent.evaluate_many): batch runs rate every
+# CRITIC_BATCH_SIZE consecutive records' answers in one Critic request.
+# Opt-in (default 1 = one request per answer): it saves requests but each
+# record waits for its batch, so it only pays off when requests/min bind
+CRITIC_BATCH_SIZE = int(os.getenv("CRITIC_BATCH_SIZE", "1"))
+
+# long answers (context_budget.py): context window by model-name prefix
+# (first match wins, so specific prefixes go first). An answer that does
+# not fit – or is longer than ANSWER_TOKEN_BUDGET tokens (0 = window only) –
+# is critiqued in chunks and compacted for the Comparator.
+CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "claude": 200000,
+    "llama3-70b-8192": 8192,
+    "llama3": 8192,
+    "llama2": 4096,
+    "mixtral": 32768,
+}
+DEFAULT_CONTEXT_WINDOW = int(os.getenv("DEFAULT_CONTEXT_WINDOW", "4096"))
+ANSWER_TOKEN_BUDGET = int(os.getenv("ANSWER_TOKEN_BUDGET", "3000"))
+
+# gating (gating.py, opt-in with GATING=1): skip Fixer → Generator →
+# Comparator when the Critic's levels meet every rule. GATE_SPECULATIVE=1 starts that chain alongside
+# the Critic anyway (no added latency) and cancels it if the gate closes;
+# 0 waits for the Critic and never spends a call on a skipped run.
+GATING_ENABLED = os.getenv("GATING", "0") == "1"
+GATE_RULES = os.getenv(
+    "GATE_RULES", "correctness>=High, hallucination<=Low, tone>=High, relevance>=High"
+)
+GATE_SPECULATIVE = os.getenv("GATE_SPECULATIVE", "1") != "0"
+
+# self-consistency (consensus.py): the Critic and Comparator draw
+# CONSENSUS_MIN samples at once and stop if they agree, else draw more –
+# up to CONSENSUS_MAX – only while that could still change the majority.
+# Needs a temperature above 0 to be worth anything.
+SELF_CONSISTENCY = os.getenv("SELF_CONSISTENCY", "0") == "1"
+CONSENSUS_MIN = int(os.getenv("CONSENSUS_MIN", "2"))
+CONSENSUS_MAX = int(os.getenv("CONSENSUS_MAX", "5"))
+
+# near-duplicate prompt index (prompt_index.py): reuses Fixer rewrites for
+# prompts whose estimated Jaccard similarity is at least the threshold
+PROMPT_INDEX_ENABLED = os.getenv("PROMPT_INDEX", "1") != "0"
+PROMPT_INDEX_PATH = os.getenv("PROMPT_INDEX_PATH", ".prompt_index.npz")
+PROMPT_INDEX_THRESHOLD = float(os.getenv("PROMPT_INDEX_THRESHOLD", "0.7"))
+PROMPT_INDEX_MAX_ENTRIES = int(os.getenv("PROMPT_INDEX_MAX_ENTRIES", "5000"))
+
+# evaluation history (history.py): every result is appended to SQLite in
+# batches of HISTORY_BATCH rows or every HISTORY_FLUSH_INTERVAL seconds
+HISTORY_ENABLED = os.getenv("HISTORY", "1") != "0"
+HISTORY_PATH = os.getenv("HISTORY_PATH", ".history.sqlite")
+HISTORY_BATCH = int(os.getenv("HISTORY_BATCH", "100"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+
+# durable job queue (jobqueue.py) for worker.py: a lease lasts
+# QUEUE_LEASE_SECONDS unless its worker heartbeats; a failed job is retried
+# QUEUE_RETRY_DELAY·2^n seconds later, up to QUEUE_MAX_ATTEMPTS attempts.
+# QUEUE_WAL=0 for hosts sharing the file over a network filesystem.
+QUEUE_PATH = os.getenv("QUEUE_PATH", ".queue.sqlite")
+QUEUE_LEASE_SECONDS = float(os.getenv("QUEUE_LEASE_SECONDS", "60"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))
+QUEUE_RETRY_DELAY = float(os.getenv("QUEUE_RETRY_DELAY", "5"))
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "0.5"))
+QUEUE_WAL = os.getenv("QUEUE_WAL", "1") != "0"
+
+# persistent reply cache (cache.py); LLM_CACHE=0 disables it
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", "0")) or None    # 0 = unbounded
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "0")) or None              # seconds, 0 = never
+
+def llm_config_dict(llm_config: Any) -> Dict[str, Any]:
+    """Agents may hold a plain dict or an autogen LLMConfig model."""
+    if hasattr(llm_config, "model_dump"):
+        return llm_config.model_dump()
+    return dict(llm_config or {})
+
+# ── provider entries ──────────────────────────────────────────────────────
+def _groq_entry(model: str = "llama3-70b-8192", price: Sequence[float] = (0.0, 0.0)) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "api_key": os.getenv("GROQ_API_KEY"),
+        "base_url": "https://api.groq.com/openai/v1",
+        "price": list(price),
+    }
+
+def _openai_entry(model: str = "gpt-4", price: Sequence[float] = (0.03, 0.06)) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "api_key": os.getenv("OPENAI_API_KEY"),
+        "base_url": "https://api.openai.com/v1",
+        "price": list(price),
+    }
+
+def _anthropic_entry(
+    model: str = "claude-3-opus-20240229", price: Sequence[float] = (0.015, 0.015)
+) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "api_key": os.getenv("ANTHROPIC_API_KEY"),
+        "base_url": "https://api.anthropic.com/v1",
+        "price": list(price),
+    }
+
+def _ollama_entry(model: str = OLLAMA_MODEL) -> Dict[str, Any]:
+    return {
+        "model": model,
+        "api_key": "ollama",
+        "base_url": DEFAULT_BASE_URL,
+        "price": [0.0, 0.0],
+    }
+
+def _llm_config(*entries: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "temperature": DEFAULT_TEMPERATURE,
+        "timeout": DEFAULT_TIMEOUT,
+        "config_list": list(entries),
+    }
+
+def available_endpoints() -> List[Dict[str, Any]]:
+    """Every provider we hold credentials for, plus the local Ollama."""
+    entries = []
+    if os.getenv("GROQ_API_KEY"):
+        entries.append(_groq_entry())
+    if os.getenv("OPENAI_API_KEY"):
+        entries.append(_openai_entry())
+    if os.getenv("ANTHROPIC_API_KEY"):
+        entries.append(_anthropic_entry())
+    entries.append(_ollama_entry())
+    return entries
 
 def get_llm_config() -> Dict[str, Any]:
+    if ROUTING_ENABLED:
+        # several endpoints at once; router.EndpointRouter picks per call
+        return _llm_config(*available_endpoints())
+
     if os.getenv("GROQ_API_KEY"):
-        return {
-            "temperature": DEFAULT_TEMPERATURE,
-            "timeout": DEFAULT_TIMEOUT,
-            "config_list": [
-                {
-                    "model": "llama3-70b-8192",
-                    "api_key": os.getenv("GROQ_API_KEY"),
-                    "base_url": "https://api.groq.com/openai/v1",
-                    "price": [0.0, 0.0],
-                }
-            ],
-        }
+        return _llm_config(_groq_entry())
 
     if os.getenv("OPENAI_API_KEY"):
-        return {
-            "temperature": DEFAULT_TEMPERATURE,
-            "timeout": DEFAULT_TIMEOUT,
-            "config_list": [
-                {
-                    "model": "gpt-4",
-                    "api_key": os.getenv("OPENAI_API_KEY"),
-                    "base_url": "https://api.openai.com/v1",
-                    "price": [0.03, 0.06],
-                }
-            ],
-        }
+        return _llm_config(_openai_entry())
 
     if os.getenv("ANTHROPIC_API_KEY"):
-        return {
-            "temperature": DEFAULT_TEMPERATURE,
-            "timeout": DEFAULT_TIMEOUT,
-            "config_list": [
-                {
-                    "model": "claude-3-opus-20240229",
-                    "api_key": os.getenv("ANTHROPIC_API_KEY"),
-                    "base_url": "https://api.anthropic.com/v1",
-                    "price": [0.015, 0.015],
-                }
-            ],
-        }
+        return _llm_config(_anthropic_entry())
 
     # fallback to local Ollama
-    return {
-        "temperature": DEFAULT_TEMPERATURE,
-        "timeout": DEFAULT_TIMEOUT,
-        "config_list": [
-            {
-                "model": "llama2",
-                "api_key": "ollama",
-                "base_url": DEFAULT_BASE_URL,
-                "price": [0.0, 0.0],
-            }
-        ],
-    }
+    return _llm_config(_ollama_entry())
 
 def update_config_for_model(selected: str) -> Dict[str, Any]:
     if selected.startswith("GPT-4") and os.getenv("OPENAI_API_KEY"):
-        return {
-            "temperature": DEFAULT_TEMPERATURE,
-            "timeout": DEFAULT_TIMEOUT,
-            "config_list": [
-                {
-                    "model": "gpt-4",
-                    "api_key": os.getenv("OPENAI_API_KEY"),
-                    "base_url": "https://api.openai.com/v1",
-                    "price": [0.03, 0.06],
-                }
-            ],
-        }
+        return _llm_config(_openai_entry())
     if selected.startswith("Claude") and os.getenv("ANTHROPIC_API_KEY"):
-        return {
-            "temperature": DEFAULT_TEMPERATURE,
-            "timeout": DEFAULT_TIMEOUT,
-            "config_list": [
-                {
-                    "model": "claude-3-opus-20240229",
-                    "api_key": os.getenv("ANTHROPIC_API_KEY"),
-                    "base_url": "https://api.anthropic.com/v1",
-                    "price": [0.015, 0.015],
-                }
-            ],
-        }
+        return _llm_config(_anthropic_entry())
     if selected == "Other Ollama Model":
-        return {
-            "temperature": DEFAULT_TEMPERATURE,
-            "timeout": DEFAULT_TIMEOUT,
-            "config_list": [
-                {
-                    "model": "llama2",
-                    "api_key": "ollama",
-                    "base_url": DEFAULT_BASE_URL,
-                    "price": [0.0, 0.0],
-                }
-            ],
-        }
+        return _llm_config(_ollama_entry())
     return get_llm_config()
 
+# ── per-stage models ──────────────────────────────────────────────────────
+# id → (provider key env var or None, size tier, entry factory). The tier
+# (1 small … 3 large) orders models for the "auto" policy in
+# model_policy.py; price breaks ties within a tier.
+_CATALOG = {
+    "groq:llama3-8b-8192": ("GROQ_API_KEY", 1, lambda: _groq_entry("llama3-8b-8192")),
+    "groq:llama3-70b-8192": ("GROQ_API_KEY", 2, _groq_entry),
+    "openai:gpt-3.5-turbo": (
+        "OPENAI_API_KEY", 1, lambda: _openai_entry("gpt-3.5-turbo", [0.0005, 0.0015])
+    ),
+    "openai:gpt-4": ("OPENAI_API_KEY", 3, _openai_entry),
+    "anthropic:claude-3-haiku-20240307": (
+        "ANTHROPIC_API_KEY", 1,
+        lambda: _anthropic_entry("claude-3-haiku-20240307", [0.00025, 0.00125]),
+    ),
+    "anthropic:claude-3-opus-20240229": ("ANTHROPIC_API_KEY", 3, _anthropic_entry),
+    f"ollama:{OLLAMA_MODEL}": (None, int(os.getenv("OLLAMA_MODEL_TIER", "1")), _ollama_entry),
+}
+
+def available_models() -> Dict[str, Dict[str, Any]]:
+    """Catalog models we hold credentials for: id → {"tier", "entry"}."""
+    return {
+        mid: {"tier": tier, "entry": factory()}
+        for mid, (key_var, tier, factory) in _CATALOG.items()
+        if key_var is None or os.getenv(key_var)
+    }
+
+def model_config(model_id: str) -> Dict[str, Any]:
+    """Single-endpoint llm_config for a catalog id (KeyError if unavailable)."""
+    return _llm_config(available_models()[model_id]["entry"])
+
+# which model each agent uses: "" = the selected backend (default), a
+# catalog id (e.g. CRITIC_MODEL=groq:llama3-8b-8192), or "auto" = the
+# smallest available model meeting the stage's targets. {AGENT}_MAX_LATENCY is a
+# p95 in seconds and {AGENT}_MAX_COST USD per call; 0 = no target.
+STAGE_MODELS = {
+    "critic": os.getenv("CRITIC_MODEL", ""),
+    "fixer": os.getenv("FIXER_MODEL", ""),
+    "comparator": os.getenv("COMPARATOR_MODEL", ""),
+    "generator": os.getenv("GENERATOR_MODEL", ""),
+}
+STAGE_TARGETS = {
+    agent: {
+        "latency": float(os.getenv(f"{agent.upper()}_MAX_LATENCY", "0")) or None,
+        "cost": float(os.getenv(f"{agent.upper()}_MAX_COST", "0")) or None,
+    }
+    for agent in STAGE_MODELS
+}
+
 SUPPORTED_MODELS = [
     "Mixtral (Groq/Ollama - Default)",
     "GPT-4 (OpenAI)",
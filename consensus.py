@@ -0,0 +1,139 @@
+"""
+consensus.py – adaptive self-consistency for Critic and Comparator verdicts.
+
+At temperature > 0 a single verdict is noisy, and a fixed k samples cost
+k calls every time. `sample` draws CONSENSUS_MIN replies at once and
+stops there when they agree. Otherwise it draws only as many more as
+could settle the vote, until further samples can no longer change the
+majority or CONSENSUS_MAX replies are in. Each reply is a ballot of votes
+(one per Critic criterion, a single "winner" for the Comparator), and
+every question is tallied separately.
+
+No autogen import here.
+"""
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import metrics
+from config import CONSENSUS_MAX, CONSENSUS_MIN
+from scores import CRITERIA, LEVELS, format_critique, parse_critique, parse_winner
+
+Votes = Dict[str, str]          # question → answer, e.g. "Tone" → "High"
+
+SAMPLES = metrics.REGISTRY.counter(
+    "evaluator_consensus_samples_total", "Replies drawn for self-consistency votes."
+)
+AGREEMENT = metrics.REGISTRY.histogram(
+    "evaluator_consensus_agreement", "Share of samples agreeing with the majority.",
+    buckets=(0.34, 0.5, 0.6, 0.67, 0.75, 0.8, 1.0),
+)
+
+
+def critique_votes(text: str) -> Votes:
+    return {name: LEVELS[level] for name, (level, _) in parse_critique(text).items()}
+
+
+def winner_votes(text: str) -> Votes:
+    return {"winner": parse_winner(text) or "unclear"}
+
+
+class Consensus:
+    """Tally of one adaptive vote."""
+
+    def __init__(self, ballots: List[Votes]) -> None:
+        self.ballots = ballots
+        self.tally: Dict[str, Counter] = {}
+        for ballot in ballots:
+            for question, answer in ballot.items():
+                self.tally.setdefault(question, Counter())[answer] += 1
+
+    @property
+    def majority(self) -> Votes:
+        # ties go to the answer seen first
+        return {q: c.most_common(1)[0][0] for q, c in self.tally.items()}
+
+    @property
+    def agreement(self) -> float:
+        """Mean over questions of the majority answer's share of the votes."""
+        if not self.tally:
+            return 1.0
+        shares = [c.most_common(1)[0][1] / sum(c.values()) for c in self.tally.values()]
+        return sum(shares) / len(shares)
+
+    def unanimous(self) -> bool:
+        return all(len(c) == 1 for c in self.tally.values())
+
+    def needed(self, cap: int) -> int:
+        """Fewest extra samples that could settle every question (0 = settled)."""
+        left = cap - len(self.ballots)
+        need = 0
+        for counts in self.tally.values():
+            top = [n for _, n in counts.most_common(2)] + [0]
+            lead = top[0] - top[1]
+            if lead <= left:
+                # settled once lead + m > left - m, if all m go to the leader
+                need = max(need, (left - lead) // 2 + 1)
+        return min(need, left)
+
+    def representative(self) -> Optional[int]:
+        """Index of the first ballot that matches the majority on every question."""
+        majority = self.majority
+        for i, ballot in enumerate(self.ballots):
+            if all(ballot.get(q) == a for q, a in majority.items()):
+                return i
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": len(self.ballots),
+            "agreement": round(self.agreement, 3),
+            "majority": self.majority,
+            "votes": {q: dict(c) for q, c in self.tally.items()},
+        }
+
+
+async def sample(
+    stage: str,
+    draw: Callable[[int], Awaitable[str]],
+    vote: Callable[[str], Votes],
+    first: int = CONSENSUS_MIN,
+    cap: int = CONSENSUS_MAX,
+) -> Tuple[List[str], Consensus]:
+    """
+    Replies and their tally. `draw(i)` produces sample i; each round's
+    samples are drawn concurrently.
+    """
+    cap = max(cap, 1)
+    replies: List[str] = []
+    n = max(1, min(first, cap))
+    while n:
+        start = len(replies)
+        replies += await asyncio.gather(*(draw(i) for i in range(start, start + n)))
+        con = Consensus([vote(r) for r in replies])
+        if start == 0 and con.unanimous():
+            break
+        n = con.needed(cap)
+    SAMPLES.inc(len(replies), stage=stage)
+    AGREEMENT.observe(con.agreement, stage=stage)
+    return replies, con
+
+
+def majority_critique(replies: List[str], con: Consensus) -> str:
+    """
+    The first reply matching the majority on every criterion, else the
+    majority levels rebuilt into the four-line format, each with the
+    reason from the first reply that gave that level.
+    """
+    i = con.representative()
+    if i is not None:
+        return replies[i]
+    majority = con.majority
+    levels: Dict[str, Tuple[int, str]] = {}
+    for name in CRITERIA:
+        for reply in replies:
+            parsed = parse_critique(reply).get(name)
+            if parsed is not None and LEVELS[parsed[0]] == majority.get(name):
+                levels[name] = parsed
+                break
+    return format_critique(levels)
@@ -0,0 +1,150 @@
+"""
+context_budget.py – local token estimates and long-answer handling.
+
+Nothing here calls a tokenizer service: `estimate_tokens` approximates
+BPE counts from word pieces, which is close enough to decide whether an
+answer fits. Answers over budget are split with `chunk_text` (paragraph,
+then sentence, then word boundaries) for map-reduce critique, whose
+four-line verdicts `reduce_critiques` merges back into one; the
+Comparator gets a `compact` view instead.
+"""
+import re
+from typing import Any, List, Optional, Sequence
+
+from config import ANSWER_TOKEN_BUDGET, CONTEXT_WINDOWS, DEFAULT_CONTEXT_WINDOW, llm_config_dict
+from scores import CRITERIA, LEVELS, parse_critique
+
+_PIECE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+_PARAGRAPH = re.compile(r"\n\s*\n")
+
+
+def estimate_tokens(text: str) -> int:
+    """~BPE token count: one per word piece, plus one per 4 more letters."""
+    return sum(1 + (len(p) - 1) // 4 for p in _PIECE.findall(text))
+
+
+def context_window(llm_config: Any) -> int:
+    """Smallest context window among the config's endpoints."""
+    entries = llm_config_dict(llm_config).get("config_list") or [{}]
+    windows = []
+    for entry in entries:
+        model = (entry.get("model") or "").lower()
+        match = [w for prefix, w in CONTEXT_WINDOWS.items() if model.startswith(prefix)]
+        windows.append(match[0] if match else DEFAULT_CONTEXT_WINDOW)
+    return min(windows)
+
+
+def answer_budget(llm_config: Any, reserved: int) -> int:
+    """
+    Tokens one call may spend on answer text: what the model's window
+    leaves after `reserved` (instructions + output), capped by
+    ANSWER_TOKEN_BUDGET.
+    """
+    fit = max(256, context_window(llm_config) - reserved)
+    return min(fit, ANSWER_TOKEN_BUDGET) if ANSWER_TOKEN_BUDGET else fit
+
+
+# ── splitting ───────────────────────────────────────────────────────────
+def _pieces(text: str, max_tokens: int) -> List[str]:
+    # paragraphs, then sentences, then word runs – each ≤ max_tokens
+    out: List[str] = []
+    for para in _PARAGRAPH.split(text.strip()):
+        if estimate_tokens(para) <= max_tokens:
+            out.append(para)
+            continue
+        for sent in _SENTENCE.split(para):
+            if estimate_tokens(sent) <= max_tokens:
+                out.append(sent)
+                continue
+            run, size = [], 0
+            for w in sent.split(" "):
+                n = estimate_tokens(w)
+                if run and size + n > max_tokens:
+                    out.append(" ".join(run))
+                    run, size = [], 0
+                run.append(w)
+                size += n
+            if run:
+                out.append(" ".join(run))
+    return [p for p in out if p.strip()]
+
+
+def chunk_text(text: str, max_tokens: int) -> List[str]:
+    """Greedily pack `text` into chunks of at most ~max_tokens."""
+    chunks: List[str] = []
+    cur: List[str] = []
+    size = 0
+    for piece in _pieces(text, max_tokens):
+        n = estimate_tokens(piece)
+        if cur and size + n > max_tokens:
+            chunks.append("\n\n".join(cur))
+            cur, size = [], 0
+        cur.append(piece)
+        size += n
+    if cur:
+        chunks.append("\n\n".join(cur))
+    return chunks
+
+
+def compact(text: str, max_tokens: int) -> str:
+    """
+    A view of `text` within ~max_tokens: first and last paragraph, the
+    lead sentence of each paragraph in between, and head/tail only if
+    that is still too long.
+    """
+    text = text.strip()
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    paras = _PARAGRAPH.split(text)
+    if len(paras) > 2:
+        leads = [_SENTENCE.split(p.strip(), 1)[0] for p in paras[1:-1]]
+        view = "\n\n".join([paras[0], *leads, paras[-1]])
+        if estimate_tokens(view) <= max_tokens:
+            return view
+    words = text.split()
+    sizes = [estimate_tokens(w) for w in words]
+    head = _fits(sizes, max_tokens // 2)
+    tail = _fits(sizes[head:][::-1], max_tokens // 2)
+    omitted = len(words) - head - tail
+    return f"{' '.join(words[:head])}\n[… {omitted} words omitted …]\n{' '.join(words[len(words) - tail:])}"
+
+
+def _fits(sizes: List[int], budget: int) -> int:
+    # how many leading items fit in `budget`
+    total = 0
+    for i, n in enumerate(sizes):
+        total += n
+        if total > budget:
+            return i
+    return len(sizes)
+
+
+# ── reduce ──────────────────────────────────────────────────────────────
+def reduce_critiques(critiques: Sequence[str], weights: Optional[Sequence[int]] = None) -> str:
+    """
+    Merge per-chunk critiques into one four-line critique. Correctness
+    is the worst chunk's, Hallucination the highest risk any chunk
+    shows; Tone and Relevance are the size-weighted average. The reason
+    comes from the chunk that set the level.
+    """
+    parsed = [parse_critique(c) for c in critiques]
+    weights = list(weights or [1] * len(parsed))
+    n = len(parsed)
+    lines = []
+    for name in CRITERIA:
+        rated = [(i, p[name]) for i, p in enumerate(parsed) if name in p]
+        if not rated:
+            lines.append(f"{name}: Medium – no chunk rated this")
+            continue
+        if name == "Correctness":
+            i, (level, reason) = min(rated, key=lambda r: r[1][0])
+        elif name == "Hallucination":
+            i, (level, reason) = max(rated, key=lambda r: r[1][0])
+        else:
+            total = sum(weights[i] for i, _ in rated)
+            level = round(sum(weights[i] * lv for i, (lv, _) in rated) / total)
+            # reason from the largest chunk rated at that level (else the closest)
+            i, (_, reason) = min(rated, key=lambda r: (abs(r[1][0] - level), -weights[r[0]]))
+        lines.append(f"{name}: {LEVELS[level]} – {reason} (part {i + 1}/{n})")
+    return "\n".join(lines)
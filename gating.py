@@ -0,0 +1,65 @@
+"""
+gating.py – decide from the Critic's scores whether a run needs the
+rewrite / regenerate / compare chain at all.
+
+A policy is a list of rules over the parsed Critic levels, e.g.
+
+    correctness>=High, hallucination<=Low, tone>=High, relevance>=High
+
+The chain is skipped only when every rule holds (Hallucination is a risk
+scale, so "good" is Low there). A dimension the Critic did not rate
+never satisfies a rule, so malformed critiques always get the full run.
+"""
+import re
+import threading
+from typing import List, Optional, Tuple
+
+from config import GATE_RULES
+from scores import CRITERIA, LEVELS, MISSING, ScoreRecord
+
+_RULE = re.compile(r"^\s*(\w+)\s*(>=|<=|==)\s*(\w+)\s*$")
+
+
+class GatePolicy:
+    def __init__(self, rules: List[Tuple[str, str, int]]) -> None:
+        self.rules = rules
+
+    @classmethod
+    def parse(cls, spec: str) -> "GatePolicy":
+        """'correctness>=High, hallucination<=Low' → GatePolicy."""
+        names = [c.lower() for c in CRITERIA]
+        levels = [lv.lower() for lv in LEVELS]
+        rules = []
+        for part in filter(str.strip, spec.split(",")):
+            m = _RULE.match(part)
+            if not m or m.group(1).lower() not in names or m.group(3).lower() not in levels:
+                raise ValueError(f"bad gate rule {part!r}")
+            rules.append((m.group(1).lower(), m.group(2), levels.index(m.group(3).lower())))
+        return cls(rules)
+
+    def passes(self, record: ScoreRecord) -> bool:
+        """True when the answer is good enough to skip the chain."""
+        if not self.rules:
+            return False
+        for name, op, level in self.rules:
+            value = getattr(record, name)
+            if value == MISSING:
+                return False
+            if not {">=": value >= level, "<=": value <= level, "==": value == level}[op]:
+                return False
+        return True
+
+    def __str__(self) -> str:
+        return ", ".join(f"{n}{op}{LEVELS[lv]}" for n, op, lv in self.rules)
+
+
+_default: Optional[GatePolicy] = None
+_default_lock = threading.Lock()
+
+
+def get_gate_policy() -> GatePolicy:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = GatePolicy.parse(GATE_RULES)
+        return _default
@@ -0,0 +1,415 @@
+"""
+history.py – append-only, indexed store of every evaluation result.
+
+Results go to SQLite (WAL) with the columns worth filtering on pulled out
+and indexed: timestamp, prompt hash, model (the one that wrote Answer
+B), the four Critic levels and the Comparator's winner. Every stage's
+model (from the result's spans) is kept in `stage_models`, and the full
+result dict as JSON. `append`
+only queues the row – a writer thread commits queued rows in batches, so
+the pipeline never waits on disk. Reads use their own connections and
+keyset paging (newest first, `before` the last id seen), and `iter_rows`
+streams with a cursor, so neither ever loads the whole table.
+
+    python history.py list --model llama2 --correctness Low --limit 20
+    python history.py export -o history.jsonl --since 2024-06-01
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config import (
+    HISTORY_BATCH, HISTORY_ENABLED, HISTORY_FLUSH_INTERVAL, HISTORY_PATH, llm_config_dict,
+)
+from scores import CRITERIA, LEVELS, ScoreRecord
+
+_COLUMNS = (
+    "ts", "prompt_hash", "model", "record_id",
+    "correctness", "hallucination", "tone", "relevance", "winner",
+    "seconds", "cost", "stage_models", "result",
+)
+# filter → indexed column. Every SQLite index ends in the rowid, so an
+# equality filter already yields rows in page (id) order. Ids follow commit
+# order, not `ts` (rows wait in the writer's queue, and several processes
+# may share the file), so time ranges filter on `ts` itself.
+_INDEXES = {
+    "ts": "ts",
+    "prompt": "prompt_hash",
+    "model": "model",
+    "correctness": "correctness",
+    "hallucination": "hallucination",
+    "tone": "tone",
+    "relevance": "relevance",
+    "winner": "winner",
+}
+_SUMMARY = "id, ts, prompt_hash, model, record_id, " + ", ".join(
+    c.lower() for c in CRITERIA
+) + ", winner, seconds, cost, stage_models"
+
+
+def prompt_hash(prompt: str) -> str:
+    """Whitespace-insensitive hash of a prompt (the index key)."""
+    return hashlib.sha256(" ".join(prompt.split()).encode("utf-8")).hexdigest()[:32]
+
+
+def model_of(llm_config: Any) -> str:
+    entry = (llm_config_dict(llm_config).get("config_list") or [{}])[0]
+    return entry.get("model") or "unknown"
+
+
+def stage_models(result: Dict[str, Any]) -> Dict[str, str]:
+    """stage → model that served it (comma-joined after a failover), from the spans."""
+    return {
+        s["stage"]: ",".join(s["models"]) for s in result.get("spans") or [] if s.get("models")
+    }
+
+
+def _level(value: Any) -> int:
+    # "High" / "high" / 2 → 2
+    if isinstance(value, int):
+        return value
+    return [lv.lower() for lv in LEVELS].index(str(value).lower())
+
+
+def _timestamp(value: Any) -> float:
+    # epoch seconds or an ISO date / datetime
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def _summary(names: List[str], row: Tuple[Any, ...]) -> Dict[str, Any]:
+    out = dict(zip(names, row))
+    if out.get("stage_models"):
+        out["stage_models"] = json.loads(out["stage_models"])
+    return out
+
+
+class HistoryStore:
+    def __init__(
+        self,
+        path: str,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._db = self._connect()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS evaluations ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL,"
+            " prompt_hash TEXT NOT NULL, model TEXT, record_id TEXT,"
+            " correctness INTEGER, hallucination INTEGER, tone INTEGER, relevance INTEGER,"
+            " winner TEXT, seconds REAL, cost REAL, stage_models TEXT, result TEXT NOT NULL)"
+        )
+        if "stage_models" not in {r[1] for r in self._db.execute("PRAGMA table_info(evaluations)")}:
+            # stores from before per-stage models
+            self._db.execute("ALTER TABLE evaluations ADD COLUMN stage_models TEXT")
+        for name, cols in _INDEXES.items():
+            self._db.execute(
+                f"CREATE INDEX IF NOT EXISTS evaluations_{name} ON evaluations({cols})"
+            )
+        self._queue: "queue.Queue[Optional[Tuple[Any, ...]]]" = queue.Queue()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self.written = 0
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # generous lock wait: worker processes may share the file
+        db = sqlite3.connect(
+            self.path, timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    # ── writes ──────────────────────────────────────────────────────────
+    def append(
+        self,
+        result: Dict[str, Any],
+        model: Optional[str] = None,
+        record_id: Any = None,
+    ) -> None:
+        """
+        Queue one `evaluate_prompt_response` result; written in the
+        background. `model` is used only when no span says which model
+        wrote Answer B (e.g. a gated run).
+        """
+        rec = ScoreRecord.from_result(result)
+        spans = result.get("spans") or []
+        models = stage_models(result)
+        row = (
+            time.time(),
+            prompt_hash(result.get("original_prompt") or ""),
+            models.get("answer_b", model),
+            None if record_id is None else str(record_id),
+            *rec.levels(),
+            rec.winner,
+            round(sum(s.get("seconds", 0.0) for s in spans), 4),
+            round(sum(s.get("cost", 0.0) for s in spans), 6),
+            json.dumps(models) if models else None,
+            json.dumps(result, ensure_ascii=False, default=str),
+        )
+        with self._flushed:
+            self._pending += 1
+        self._queue.put(row)
+
+    def _write_loop(self) -> None:
+        while True:
+            row = self._queue.get()
+            if row is None:
+                return
+            rows = [row]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            # gather a batch: up to batch_size rows or flush_interval seconds
+            while len(rows) < self.batch_size:
+                try:
+                    nxt = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stop = True
+                    break
+                rows.append(nxt)
+            self._commit(rows)
+            if stop:
+                return
+
+    def _commit(self, rows: List[Tuple[Any, ...]], retries: int = 5) -> None:
+        for attempt in range(retries + 1):
+            try:
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany(
+                    f"INSERT INTO evaluations ({', '.join(_COLUMNS)})"
+                    f" VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    rows,
+                )
+                self._db.execute("COMMIT")
+                self.written += len(rows)
+                break
+            except sqlite3.Error as exc:   # history must never take a run down
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                # still locked after the connection's timeout: back off and retry
+                if isinstance(exc, sqlite3.OperationalError) and attempt < retries and (
+                    "locked" in str(exc) or "busy" in str(exc)
+                ):
+                    time.sleep(0.5 * 2 ** attempt)
+                    continue
+                print(f"[history] dropped {len(rows)} rows: {exc}", file=sys.stderr)
+                break
+        with self._flushed:
+            self._pending -= len(rows)
+            self._flushed.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued row is committed (False on timeout)."""
+        with self._flushed:
+            return self._flushed.wait_for(lambda: self._pending == 0, timeout)
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._db.close()
+
+    # ── reads ───────────────────────────────────────────────────────────
+    @staticmethod
+    def _where(
+        since: Any = None,
+        until: Any = None,
+        prompt: Optional[str] = None,
+        model: Optional[str] = None,
+        winner: Optional[str] = None,
+        before: Optional[int] = None,
+        **levels: Any,
+    ) -> Tuple[str, List[Any]]:
+        """
+        SQL filter. Levels take a level ("High"), or a bound like "<=Low"
+        / ">=Medium"; since / until take epoch seconds or ISO dates.
+        """
+        sql, params = [], []
+        if since is not None:
+            sql.append("ts >= ?")
+            params.append(_timestamp(since))
+        if until is not None:
+            sql.append("ts < ?")
+            params.append(_timestamp(until))
+        if prompt is not None:
+            sql.append("prompt_hash = ?")
+            params.append(prompt_hash(prompt))
+        if model is not None:
+            sql.append("model = ?")
+            params.append(model)
+        if winner is not None:
+            sql.append("winner = ?")
+            params.append(winner.upper())
+        if before is not None:
+            sql.append("id < ?")
+            params.append(int(before))
+        for name, value in levels.items():
+            if name not in _INDEXES or name in ("ts", "prompt", "model", "winner"):
+                raise TypeError(f"unknown history filter {name!r}")
+            if value is None:
+                continue
+            text = str(value)
+            op = text[:2] if text[:2] in ("<=", ">=") else "="
+            sql.append(f"{name} {op} ?")
+            params.append(_level(text[2:].strip() if op != "=" else value))
+        return (" WHERE " + " AND ".join(sql)) if sql else "", params
+
+    def page(self, limit: int = 50, **filters: Any) -> List[Dict[str, Any]]:
+        """
+        Newest-first page of summary rows (no result body). For the next
+        page pass before=<id of the last row>.
+        """
+        where, params = self._where(**filters)
+        db = self._connect()
+        try:
+            cur = db.execute(
+                f"SELECT {_SUMMARY} FROM evaluations{where} ORDER BY id DESC LIMIT ?",
+                [*params, limit],
+            )
+            names = [d[0] for d in cur.description]
+            return [_summary(names, row) for row in cur]
+        finally:
+            db.close()
+
+    def count(self, **filters: Any) -> int:
+        where, params = self._where(**filters)
+        db = self._connect()
+        try:
+            return db.execute(f"SELECT COUNT(*) FROM evaluations{where}", params).fetchone()[0]
+        finally:
+            db.close()
+
+    def get(self, id: int) -> Optional[Dict[str, Any]]:
+        """Full result dict of one row (plus "history_id" and "ts")."""
+        db = self._connect()
+        try:
+            row = db.execute("SELECT ts, result FROM evaluations WHERE id = ?", (id,)).fetchone()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        return {"history_id": id, "ts": row[0], **json.loads(row[1])}
+
+    def iter_rows(
+        self, columns: str = "full", chunk: int = 1000, **filters: Any
+    ) -> Iterator[Any]:
+        """
+        Stream matching rows oldest first, `chunk` at a time from one read
+        cursor: full result dicts (columns="full"), summary dicts
+        ("summary") or raw tuples of the given comma-separated columns.
+        """
+        where, params = self._where(**filters)
+        select = {"full": "id, ts, result", "summary": _SUMMARY}.get(columns, columns)
+        db = self._connect()
+        try:
+            cur = db.execute(f"SELECT {select} FROM evaluations{where} ORDER BY id", params)
+            names = [d[0] for d in cur.description]
+            while True:
+                rows = cur.fetchmany(chunk)
+                if not rows:
+                    return
+                for row in rows:
+                    if columns == "full":
+                        yield {"history_id": row[0], "ts": row[1], **json.loads(row[2])}
+                    elif columns == "summary":
+                        yield _summary(names, row)
+                    else:
+                        yield row
+        finally:
+            db.close()
+
+    def export(self, fh: Any, **filters: Any) -> int:
+        """Write matching results to `fh` as JSONL; returns the row count."""
+        n = 0
+        for row in self.iter_rows(**filters):
+            fh.write(json.dumps(row, ensure_ascii=False) + "\n")
+            n += 1
+        return n
+
+    def models(self) -> List[str]:
+        """Distinct models seen (walks the model index)."""
+        db = self._connect()
+        try:
+            return [m for (m,) in db.execute(
+                "SELECT DISTINCT model FROM evaluations WHERE model IS NOT NULL ORDER BY model"
+            )]
+        finally:
+            db.close()
+
+
+_default: Optional[HistoryStore] = None
+_default_lock = threading.Lock()
+
+
+def get_history_store() -> Optional[HistoryStore]:
+    """Process-wide store built from config.py, or None when disabled."""
+    global _default
+    if not HISTORY_ENABLED:
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = HistoryStore(HISTORY_PATH, HISTORY_BATCH, HISTORY_FLUSH_INTERVAL)
+            atexit.register(_default.close)   # commit whatever is still queued
+        return _default
+
+
+# ── CLI ─────────────────────────────────────────────────────────────────────
+def main(argv: Optional[list] = None) -> int:
+    ap = argparse.ArgumentParser(description="Browse or export the evaluation history.")
+    ap.add_argument("command", choices=("list", "export", "count"))
+    ap.add_argument("--path", default=HISTORY_PATH)
+    ap.add_argument("-o", "--output", help="export file (default: stdout)")
+    ap.add_argument("--since", help="epoch seconds or ISO date")
+    ap.add_argument("--until", help="epoch seconds or ISO date")
+    ap.add_argument("--prompt", help="exact prompt (whitespace-insensitive)")
+    ap.add_argument("--model")
+    ap.add_argument("--winner", choices=("A", "B"))
+    for name in CRITERIA:
+        ap.add_argument(f"--{name.lower()}", help='a level, or "<=Low" / ">=Medium"')
+    ap.add_argument("--limit", type=int, default=20, help="rows per page (list)")
+    ap.add_argument("--before", type=int, help="page below this id (list)")
+    args = ap.parse_args(argv)
+
+    store = HistoryStore(args.path)
+    filters = {
+        k: getattr(args, k) for k in ("since", "until", "prompt", "model", "winner")
+        if getattr(args, k) is not None
+    }
+    filters.update({n.lower(): getattr(args, n.lower()) for n in CRITERIA})
+    try:
+        if args.command == "count":
+            print(store.count(**filters))
+        elif args.command == "list":
+            for row in store.page(args.limit, before=args.before, **filters):
+                print(json.dumps(row))
+        else:
+            out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                n = store.export(out, **filters)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"[history] exported {n} rows", file=sys.stderr)
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
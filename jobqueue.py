@@ -0,0 +1,258 @@
+"""
+jobqueue.py – durable SQLite job queue shared by worker processes.
+
+Jobs are batch records keyed by their id, so enqueueing a dataset twice
+adds nothing. A worker leases jobs. Every lease gets a new token from a
+queue-wide counter that only ever grows (the fencing token; the attempt
+count is just the retry budget) and expires after QUEUE_LEASE_SECONDS
+unless the worker heartbeats. A job whose lease lapsed
+(its worker crashed or hung) goes to whoever leases next. A failed job is
+retried after a backoff, and after QUEUE_MAX_ATTEMPTS attempts it is
+marked failed instead. `complete` stores the result and marks the job done
+in one transaction, and only while the caller still holds the lease. A
+result is therefore written exactly once, even when a stalled worker and
+its replacement both finish the same job.
+
+Every process opens its own connection (shared by its threads under a
+lock). SQLite's file lock serialises the writes, which are a few short
+transactions per job.
+"""
+import contextlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, TextIO
+
+from config import (
+    QUEUE_LEASE_SECONDS, QUEUE_MAX_ATTEMPTS, QUEUE_RETRY_DELAY, QUEUE_WAL,
+)
+
+# state → meaning of `due`:
+#   queued  not leased before `due` (0 = now; later after a failure)
+#   leased  lease expires at `due`
+#   done / failed  final; `retry` puts failed jobs back
+STATES = ("queued", "leased", "done", "failed")
+
+
+class Lease(NamedTuple):
+    job_id: int
+    key: str
+    record: Dict[str, Any]
+    attempt: int
+    token: int              # fencing token: only this lease may finish the job
+
+
+class JobQueue:
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = QUEUE_LEASE_SECONDS,
+        max_attempts: int = QUEUE_MAX_ATTEMPTS,
+        retry_delay: float = QUEUE_RETRY_DELAY,
+    ) -> None:
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(
+            path, timeout=60.0, isolation_level=None, check_same_thread=False
+        )
+        if QUEUE_WAL:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL UNIQUE,"
+            " record TEXT NOT NULL, state TEXT NOT NULL DEFAULT 'queued',"
+            " due REAL NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT, error TEXT, enqueued REAL NOT NULL, finished REAL,"
+            " lease INTEGER NOT NULL DEFAULT 0)"
+        )
+        if "lease" not in {r[1] for r in self._db.execute("PRAGMA table_info(jobs)")}:
+            # queue files from before lease tokens
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease INTEGER NOT NULL DEFAULT 0")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_lease ON jobs(lease)")
+        # one index serves both lease scans: state = ? AND due <= ? ORDER BY due
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_state_due ON jobs(state, due)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, job_id INTEGER NOT NULL, worker TEXT,"
+            " attempt INTEGER NOT NULL, finished REAL NOT NULL, result TEXT NOT NULL)"
+        )
+
+    @contextlib.contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        # take the write lock up front, so a read-then-update can't race
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    # ── producers ───────────────────────────────────────────────────────
+    def enqueue(self, records: Iterable[Dict[str, Any]], chunk: int = 1000) -> int:
+        """Add records (keyed by their "id"); returns how many were new."""
+        added = 0
+        rows: List[tuple] = []
+
+        def flush() -> int:
+            with self._write() as db:
+                before = db.total_changes
+                db.executemany(
+                    "INSERT OR IGNORE INTO jobs (key, record, enqueued) VALUES (?, ?, ?)", rows
+                )
+                return db.total_changes - before
+
+        for rec in records:
+            rows.append((str(rec["id"]), json.dumps(rec, ensure_ascii=False), time.time()))
+            if len(rows) >= chunk:
+                added += flush()
+                rows = []
+        if rows:
+            added += flush()
+        return added
+
+    def retry_failed(self) -> int:
+        """Put failed jobs back in the queue with a fresh attempt budget."""
+        with self._write() as db:
+            return db.execute(
+                "UPDATE jobs SET state = 'queued', due = 0, attempts = 0, worker = NULL"
+                " WHERE state = 'failed'"
+            ).rowcount
+
+    # ── workers ─────────────────────────────────────────────────────────
+    def lease(self, worker: str, n: int) -> List[Lease]:
+        """Up to `n` jobs for `worker`: lapsed leases first, then queued jobs."""
+        now = time.time()
+        with self._write() as db:
+            # a job that used up its attempts without finishing is given up on
+            db.execute(
+                "UPDATE jobs SET state = 'failed', finished = ?,"
+                " error = 'lease expired on attempt ' || attempts"
+                " WHERE state = 'leased' AND due <= ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            ids: List[int] = []
+            for state in ("leased", "queued"):
+                if len(ids) < n:
+                    ids += [r[0] for r in db.execute(
+                        "SELECT id FROM jobs WHERE state = ? AND due <= ? ORDER BY due LIMIT ?",
+                        (state, now, n - len(ids)),
+                    )]
+            token = db.execute("SELECT COALESCE(MAX(lease), 0) FROM jobs").fetchone()[0]
+            leases = []
+            for job_id in ids:
+                token += 1
+                db.execute(
+                    "UPDATE jobs SET state = 'leased', worker = ?, due = ?, lease = ?,"
+                    " attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + self.lease_seconds, token, job_id),
+                )
+                key, record, attempt = db.execute(
+                    "SELECT key, record, attempts FROM jobs WHERE id = ?", (job_id,)
+                ).fetchone()
+                leases.append(Lease(job_id, key, json.loads(record), attempt, token))
+        return leases
+
+    def heartbeat(self, worker: str, leases: Iterable[Lease]) -> Set[int]:
+        """Extend `worker`'s leases; returns the job ids it no longer holds."""
+        lost: Set[int] = set()
+        due = time.time() + self.lease_seconds
+        with self._write() as db:
+            for lease in leases:
+                if not db.execute(
+                    "UPDATE jobs SET due = ? WHERE id = ? AND worker = ? AND lease = ?"
+                    " AND state = 'leased'",
+                    (due, lease.job_id, worker, lease.token),
+                ).rowcount:
+                    lost.add(lease.job_id)
+        return lost
+
+    def complete(self, lease: Lease, worker: str, result: Dict[str, Any]) -> bool:
+        """Store the result and finish the job; False if the lease was lost."""
+        now = time.time()
+        with self._write() as db:
+            if not db.execute(
+                "UPDATE jobs SET state = 'done', finished = ?, error = NULL"
+                " WHERE id = ? AND worker = ? AND lease = ? AND state = 'leased'",
+                (now, lease.job_id, worker, lease.token),
+            ).rowcount:
+                return False
+            db.execute(
+                "INSERT INTO results (key, job_id, worker, attempt, finished, result)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (lease.key, lease.job_id, worker, lease.attempt, now,
+                 json.dumps(result, ensure_ascii=False, default=str)),
+            )
+        return True
+
+    def fail(self, lease: Lease, worker: str, error: str) -> Optional[str]:
+        """Record a failed attempt: "queued" (retried later), "failed", or None if not held."""
+        now = time.time()
+        final = lease.attempt >= self.max_attempts
+        delay = self.retry_delay * 2 ** (lease.attempt - 1)
+        with self._write() as db:
+            if not db.execute(
+                "UPDATE jobs SET state = ?, due = ?, error = ?, worker = NULL, finished = ?"
+                " WHERE id = ? AND worker = ? AND lease = ? AND state = 'leased'",
+                ("failed" if final else "queued", 0 if final else now + delay, error,
+                 now if final else None, lease.job_id, worker, lease.token),
+            ).rowcount:
+                return None
+        return "failed" if final else "queued"
+
+    def release(self, worker: str, leases: Iterable[Lease]) -> int:
+        """Hand unfinished jobs back (clean shutdown); the attempt isn't counted."""
+        with self._write() as db:
+            return sum(db.execute(
+                "UPDATE jobs SET state = 'queued', due = 0, worker = NULL, attempts = attempts - 1"
+                " WHERE id = ? AND worker = ? AND lease = ? AND state = 'leased'",
+                (lease.job_id, worker, lease.token),
+            ).rowcount for lease in leases)
+
+    # ── inspection ──────────────────────────────────────────────────────
+    def stats(self) -> Dict[str, int]:
+        """Jobs per state, plus stored results."""
+        out = dict.fromkeys(STATES, 0)
+        with self._lock:
+            out.update(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            out["results"] = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return out
+
+    def unfinished(self) -> int:
+        """Jobs still queued or leased (including ones waiting on a retry)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN ('queued', 'leased')"
+            ).fetchone()[0]
+
+    def failures(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"id": key, "attempts": attempts, "error": error}
+                for key, attempts, error in self._db.execute(
+                    "SELECT key, attempts, error FROM jobs WHERE state = 'failed' ORDER BY id"
+                )
+            ]
+
+    def export(self, fh: TextIO) -> int:
+        """Write every result as one JSON line, in job order; returns the count."""
+        # a connection of its own, so a long export doesn't hold the lock
+        db = sqlite3.connect(self.path, timeout=60.0)
+        n = 0
+        try:
+            for (result,) in db.execute("SELECT result FROM results ORDER BY job_id"):
+                fh.write(result + "\n")
+                n += 1
+        finally:
+            db.close()
+        return n
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,194 @@
+"""
+jobs.py – background evaluation jobs with a submit / poll / cancel API.
+
+A JobManager owns one event loop on a daemon thread and runs at most
+`workers` pipelines at a time; the rest wait in FIFO order. Callers (the
+Streamlit app, scripts) never block: they submit, then poll a snapshot
+with the stages finished so far, the text streamed so far per stage,
+and finally the result or error.
+
+    jobs = get_job_manager()
+    job_id = jobs.submit(evaluator, prompt, answer_a)
+    jobs.poll(job_id)["status"]      # queued → running → done / failed / cancelled
+    jobs.cancel(job_id)
+"""
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from config import JOB_HISTORY, JOB_WORKERS
+
+ACTIVE = ("queued", "running")
+
+
+@dataclass
+class Job:
+    id: str
+    inputs: Dict[str, Any]
+    stage_names: List[str]
+    status: str = "queued"
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    stages: Dict[str, Any] = field(default_factory=dict)     # finished stage → value
+    streamed: Dict[str, str] = field(default_factory=dict)   # stage → text so far
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class JobManager:
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY) -> None:
+        self.workers = workers
+        self.history = history
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+        self._loop = asyncio.new_event_loop()
+        # each pipeline keeps up to two blocking agent calls in flight
+        self._loop.set_default_executor(ThreadPoolExecutor(max_workers=2 * workers))
+        self._slots = asyncio.Semaphore(workers)
+        self._thread = threading.Thread(target=self._loop.run_forever, name="jobs", daemon=True)
+        self._thread.start()
+
+    # ── public API ──────────────────────────────────────────────────────
+    def submit(self, evaluator: Any, prompt: str, answer_a: str, **kwargs: Any) -> str:
+        """
+        Queue `evaluator.aevaluate_prompt_response(prompt, answer_a, **kwargs)`
+        and return the job id straight away.
+        """
+        job = Job(
+            id=uuid.uuid4().hex[:12],
+            inputs={"prompt": prompt, "answer_a": answer_a, **kwargs},
+            stage_names=evaluator.stage_names(kwargs.get("fan_out", False), kwargs.get("gating")),
+        )
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        fut = asyncio.run_coroutine_threadsafe(
+            self._run(job, evaluator, prompt, answer_a, kwargs), self._loop
+        )
+        with self._lock:
+            self._futures[job.id] = fut
+        fut.add_done_callback(lambda _f, jid=job.id: self._forget(jid))
+        return job.id
+
+    def poll(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Snapshot of the job (None if unknown or pruned)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                "id": job.id,
+                "status": job.status,
+                "inputs": dict(job.inputs),
+                "created": job.created,
+                "started": job.started,
+                "finished": job.finished,
+                "stage_names": list(job.stage_names),
+                "stages": dict(job.stages),
+                "streamed": dict(job.streamed),
+                "progress": len(job.stages) / max(1, len(job.stage_names)),
+                "result": job.result,
+                "error": job.error,
+            }
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job. Agent calls already on the wire
+        finish in the background, but their results are dropped.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            fut = self._futures.get(job_id)
+            if job is None or job.status not in ACTIVE:
+                return False
+            self._finish(job, "cancelled")
+        if fut is not None:
+            fut.cancel()
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {"workers": self.workers}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def shutdown(self) -> None:
+        with self._lock:
+            ids = [jid for jid, job in self._jobs.items() if job.status in ACTIVE]
+        for jid in ids:
+            self.cancel(jid)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    # ── internals ───────────────────────────────────────────────────────
+    def _finish(self, job: Job, status: str) -> None:
+        # caller holds self._lock; the first final status wins
+        if job.status in ACTIVE:
+            job.status = status
+            job.finished = time.time()
+
+    def _forget(self, job_id: str) -> None:
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _prune(self) -> None:
+        # drop the oldest finished jobs beyond `history`
+        finished = [jid for jid, job in self._jobs.items() if job.status not in ACTIVE]
+        for jid in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[jid]
+
+    async def _run(
+        self, job: Job, evaluator: Any, prompt: str, answer_a: str, kwargs: Dict[str, Any]
+    ) -> None:
+        def on_token(stage: str, chunk: str) -> None:       # worker threads
+            with self._lock:
+                job.streamed[stage] = job.streamed.get(stage, "") + chunk
+
+        def on_stage_done(stage: str, value: Any) -> None:  # job loop
+            with self._lock:
+                job.stages[stage] = value
+
+        try:
+            async with self._slots:
+                with self._lock:
+                    if job.status != "queued":               # cancelled while waiting
+                        return
+                    job.status, job.started = "running", time.time()
+                result = await evaluator.aevaluate_prompt_response(
+                    prompt, answer_a,
+                    on_token=on_token, on_stage_done=on_stage_done, **kwargs,
+                )
+        except asyncio.CancelledError:
+            with self._lock:
+                self._finish(job, "cancelled")
+            raise
+        except Exception as exc:
+            with self._lock:
+                job.error = f"{type(exc).__name__}: {exc}"
+                self._finish(job, "failed")
+        else:
+            with self._lock:
+                if job.status == "running":
+                    job.result = result
+                    self._finish(job, "done")
+
+
+_default: Optional[JobManager] = None
+_default_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = JobManager()
+        return _default
@@ -1,86 +1,737 @@
 """
-main.py – orchestrates Critic → Fixer → Generator → Comparator
-Uses the first improved prompt automatically.
+main.py – orchestrates Critic ‖ (Fixer → Generator → Comparator)
+Uses the first improved prompt automatically. The Critic runs
+concurrently with the rewrite chain, since neither needs the other.
+With fan_out=True every improved prompt gets an answer and the
+Comparator ranks them (plus Answer A) in a merge-sort tournament.
 """
-from typing import Dict, Any, Optional
-from autogen import AssistantAgent
-from agents import CriticAgent, PromptFixerAgent, ComparatorAgent
-from config import get_llm_config
+import asyncio
+import contextlib
+import contextvars
+import functools
+import hashlib
+import itertools
+import json
+import threading
+import time
+from typing import (
+    Dict, Any, AsyncIterator, Callable, Iterable, Iterator, List, NamedTuple, Optional,
+    Tuple,
+)
+import metrics
+from cache import LLMCache, get_default_cache
+from clients import ClientPool, get_client_pool
+from ratelimit import RateLimiterRegistry, get_rate_limiter
+from router import EndpointRouter, get_router
+from config import (
+    CRITIC_BATCH_SIZE, GATE_SPECULATIVE, GATING_ENABLED, SELF_CONSISTENCY, STAGE_MODELS,
+    get_llm_config,
+)
+from consensus import critique_votes, majority_critique, sample, winner_votes
+from context_budget import chunk_text, estimate_tokens, reduce_critiques
+from gating import get_gate_policy
+from history import HistoryStore, get_history_store, model_of
+from model_policy import AUTO, ModelPolicy, get_model_policy
+from ollama_warmup import OllamaWarmer, warm_configs
+from prompt_index import PromptIndex, get_prompt_index
+from pipeline import Stage, StageScheduler, current_stage, iter_sync, run_sync
+from scores import ScoreRecord, parse_winner
+from tournament import merge_rank
+
+# (stage, chunk) callback for the run in progress; per-context so that
+# concurrent evaluations on one PromptEvaluator don't see each other
+_token_sink: contextvars.ContextVar[Optional[Callable[[str, str], None]]] = (
+    contextvars.ContextVar("token_sink", default=None)
+)
+# per-run dict that the Critic / Comparator stages fill with their
+# self-consistency tallies; None when the run samples once
+_consensus: contextvars.ContextVar[Optional[Dict[str, Any]]] = (
+    contextvars.ContextVar("consensus", default=None)
+)
+# set per record by aevaluate_batch: where this record's critique comes
+# from when it shares a batched Critic request with its neighbours
+_shared_critique: contextvars.ContextVar[Optional[Tuple["_SharedCritique", int]]] = (
+    contextvars.ContextVar("shared_critique", default=None)
+)
+
+
+class EvalEvent(NamedTuple):
+    """
+    Streaming progress item:
+    ("token", stage, chunk) · ("stage", stage, value) · ("result", None, dict)
+    """
+    kind: str
+    stage: Optional[str]
+    data: Any
+
+
+# default for the optional stores: the process-wide one (None = none)
+_SHARED: Any = object()
+
+_GATED_COMPARISON = "Comparison skipped – the Critic rated Answer A good enough."
+
+
+class _SharedCritique:
+    """
+    Critiques for a group of batch records, fetched with one batched
+    Critic call by whichever record asks first (so the call lands in
+    that record's span); the others await the same call.
+    """
+
+    def __init__(self, fn: Callable[[List[str]], List[str]], answers: List[str]) -> None:
+        self.fn = fn
+        self.answers = answers
+        self._task: Optional[asyncio.Future] = None
+
+    async def get(self, i: int) -> str:
+        if self._task is None:
+            self._task = asyncio.ensure_future(asyncio.to_thread(self.fn, self.answers))
+        # one record being cancelled must not cancel the call for the rest
+        return (await asyncio.shield(self._task))[i]
 
 
 class PromptEvaluator:
-    def __init__(self) -> None:
-        # shared LLM config from config.py
-        self.llm_config = get_llm_config()
-
-        self.critic = CriticAgent(llm_config=self.llm_config)
-        self.fixer = PromptFixerAgent(llm_config=self.llm_config)
-        self.comp = ComparatorAgent(llm_config=self.llm_config)
-
-        # neutral generator (no special evaluation role)
-        self.generator = AssistantAgent(
-            "GeneratorAgent",
-            llm_config=self.llm_config,
-            code_execution_config=False,
-            system_message="Answer user prompts clearly, concisely, and accurately.",
-        )
+    # attribute → agents/ class; each agent is built on first use, so
+    # neither construction nor `import main` pays for autogen up front
+    _AGENT_CLASSES = {
+        "critic": "CriticAgent",
+        "fixer": "PromptFixerAgent",
+        "comp": "ComparatorAgent",
+        "generator": "GeneratorAgent",   # neutral (no special evaluation role)
+    }
+
+    def __init__(
+        self,
+        cache: Optional[LLMCache] = None,
+        pool: Optional[ClientPool] = None,
+        limiter: Optional[RateLimiterRegistry] = None,
+        router: Optional[EndpointRouter] = None,
+        llm_config: Optional[Dict[str, Any]] = None,
+        prompt_index: Optional[PromptIndex] = _SHARED,
+        stage_models: Optional[Dict[str, str]] = None,
+        model_policy: Optional[ModelPolicy] = None,
+        history: Optional[HistoryStore] = _SHARED,
+        warm: bool = True,
+    ) -> None:
+        # shared LLM config from config.py unless one is given
+        self.llm_config = llm_config if llm_config is not None else get_llm_config()
+        # per-agent overrides of that backend ("" / catalog id / "auto"),
+        # keyed by agent role; see model_policy.py
+        self.stage_models = {**STAGE_MODELS, **(stage_models or {})}
+        self.model_policy = model_policy if model_policy is not None else get_model_policy()
+
+        # persistent reply cache, pooled keep-alive clients, provider rate
+        # limits and endpoint latency stats shared by all four agents (and
+        # by every other evaluator in the process)
+        self.cache = cache if cache is not None else get_default_cache()
+        self.pool = pool if pool is not None else get_client_pool()
+        self.limiter = limiter if limiter is not None else get_rate_limiter()
+        self.router = router if router is not None else get_router()
+        # near-duplicate prompts reuse the Fixer's earlier rewrites; like the
+        # history below, pass None to run without one
+        self.prompt_index = get_prompt_index() if prompt_index is _SHARED else prompt_index
+        # every finished result is appended here (batched, off the hot path)
+        self.history = get_history_store() if history is _SHARED else history
+        self._config_lock = threading.Lock()
+        self._agents: Dict[str, Any] = {}
+        # local Ollama models start loading now (in the background), so
+        # the first evaluation doesn't pay for the model load (warm=False
+        # leaves that to another evaluator / process)
+        self.warm = warm
+        self.ollama: List[OllamaWarmer] = []
+        self._warm()
+
+    def _warm(self) -> None:
+        if not self.warm:
+            return
+        configs = [self.llm_config, *(self._stage_config(r) for r in self.stage_models)]
+        for warmer in warm_configs(*configs):
+            if warmer not in self.ollama:
+                self.ollama.append(warmer)
+
+    def ollama_status(self) -> Dict[str, Dict[str, Any]]:
+        """Local model → load / eviction status (empty without Ollama)."""
+        return {model: st for w in self.ollama for model, st in w.status().items()}
+
+    def _agent(self, attr: str):
+        agent = self._agents.get(attr)
+        if agent is not None:
+            return agent
+        with self._config_lock:
+            agent = self._agents.get(attr)
+            if agent is None:
+                import agents   # heavy (autogen); first use pays for it
+
+                cls = getattr(agents, self._AGENT_CLASSES[attr])
+                cfg = self._stage_config(cls.role)
+                agent = cls(llm_config=cfg)
+                agent.cache = self.cache
+                agent.pool = self.pool
+                agent.limiter = self.limiter
+                agent.router = self.router
+                agent.policy = self.model_policy
+                if attr == "fixer":
+                    agent.index = self.prompt_index
+                agent.set_llm_config(cfg)
+                self._agents[attr] = agent
+            return agent
+
+    def _stage_config(self, role: str) -> Any:
+        return self.model_policy.resolve(role, self.stage_models.get(role, ""), self.llm_config)
+
+    def _refresh_models(self) -> None:
+        # re-run the "auto" choices against the latest per-stage measurements;
+        # calls already in flight keep the model they started on
+        with self._config_lock:
+            for agent in self._agents.values():
+                if self.stage_models.get(agent.role) == AUTO:
+                    cfg = self._stage_config(agent.role)
+                    if cfg != agent.llm_config:
+                        agent.set_llm_config(cfg)
+
+    @property
+    def critic(self):
+        return self._agent("critic")
+
+    @property
+    def fixer(self):
+        return self._agent("fixer")
+
+    @property
+    def comp(self):
+        return self._agent("comp")
+
+    @property
+    def generator(self):
+        return self._agent("generator")
+
+    @property
+    def agents(self):
+        return (self.critic, self.fixer, self.comp, self.generator)
+
+    async def _abuild_agents(self) -> None:
+        # the first build imports autogen: off the loop, so other runs on
+        # it don't stall (the Critic / Comparator stages use the agents there)
+        if len(self._agents) < len(self._AGENT_CLASSES):
+            await asyncio.to_thread(lambda: self.agents)
 
     # ────────────────────────────────────────────────────────────────── #
-    def evaluate_prompt_response(
+    @staticmethod
+    def _tokens() -> Optional[Callable[[str], None]]:
+        # per-chunk callback for the agent call of the current stage
+        sink = _token_sink.get()
+        if sink is None:
+            return None
+        stage = current_stage.get()
+        return lambda chunk: sink(stage, chunk)
+
+    async def _critique(self, answer_a: str) -> str:
+        critic = self.critic
+        budget = critic.answer_budget()
+        shared = _shared_critique.get()
+        if shared is not None:
+            return (await shared[0].get(shared[1])).strip()
+        if estimate_tokens(answer_a) <= budget:
+            tokens = self._tokens()
+            if _consensus.get() is None:
+                return (await asyncio.to_thread(critic.evaluate, answer_a, on_token=tokens)).strip()
+
+            async def draw(i: int) -> str:
+                # only the first sample streams
+                return (await asyncio.to_thread(
+                    critic.evaluate, answer_a, on_token=tokens if i == 0 else None, sample=i
+                )).strip()
+
+            replies, con = await sample("critic", draw, critique_votes)
+            self._note_consensus("critic", con.to_dict())
+            return majority_critique(replies, con)
+        # map-reduce: rate every chunk at once (no token streaming: it
+        # would interleave), then merge back into the four-line format
+        chunks = chunk_text(answer_a, budget)
+        parts = await asyncio.gather(*(
+            asyncio.to_thread(critic.evaluate, chunk, part=(i, len(chunks)))
+            for i, chunk in enumerate(chunks, 1)
+        ))
+        merged = reduce_critiques(parts, [estimate_tokens(c) for c in chunks])
+        tokens = self._tokens()
+        if tokens is not None:
+            tokens(merged)
+        return merged
+
+    def _fix(self, prompt: str, candidates: int = 2) -> List[str]:
+        return self.fixer.fix(prompt, on_token=self._tokens(), n=candidates)
+
+    def _choose_prompt(
+        self,
+        prompt: str,
+        improved: List[str],
+        chosen_prompt: Optional[str],
+    ) -> str:
+        if chosen_prompt and chosen_prompt in improved:
+            return chosen_prompt
+        return (improved or [prompt])[0]   # first bullet or original
+
+    def _generate(self, use_prompt: str) -> str:
+        return self.generator.generate(use_prompt, on_token=self._tokens())
+
+    @staticmethod
+    def _note_consensus(stage: str, tally: Optional[Dict[str, Any]]) -> None:
+        tallies = _consensus.get()
+        if tallies is not None and tally is not None:
+            tallies[stage] = tally
+
+    async def _judge(
+        self, answer_a: str, answer_b: str, stream: bool = False
+    ) -> Tuple[Optional[str], str, Optional[Dict[str, Any]]]:
+        """(winner, verdict, self-consistency tally or None) for one pair."""
+        comp = self.comp
+        tokens = self._tokens() if stream else None
+        if _consensus.get() is None:
+            verdict = (await asyncio.to_thread(
+                comp.compare, answer_a, answer_b, on_token=tokens
+            )).strip()
+            return parse_winner(verdict), verdict, None
+
+        async def draw(i: int) -> str:
+            return (await asyncio.to_thread(
+                comp.compare, answer_a, answer_b, on_token=tokens if i == 0 else None, sample=i
+            )).strip()
+
+        replies, con = await sample("comparator", draw, winner_votes)
+        verdict = replies[con.representative() or 0]
+        return parse_winner(verdict), verdict, con.to_dict()
+
+    async def _compare(self, answer_a: str, answer_b: str) -> str:
+        if len(answer_b) > 10:
+            _, verdict, tally = await self._judge(answer_a, answer_b, stream=True)
+            self._note_consensus("comparison", tally)
+            return verdict
+        return "Comparison skipped – new answer not meaningful."
+
+    # ── fan-out: answer every candidate, rank with a tournament ─────────
+    async def _answers(self, improved: List[str]) -> List[str]:
+        # all candidates at once (no token streaming: it would interleave)
+        return list(await asyncio.gather(
+            *(asyncio.to_thread(self.generator.generate, p) for p in improved)
+        ))
+
+    async def _rank(
+        self, answer_a: str, improved: List[str], answers: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Order Answer A and every candidate answer best-first. Returns the
+        ranking plus each judged pair's verdict, keyed (i, j) with i < j,
+        where index 0 is Answer A and i ≥ 1 is improved[i - 1].
+        """
+        texts = [answer_a, *answers]
+        verdicts: Dict[Tuple[int, int], Tuple[Optional[str], str]] = {}
+        tallies: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+        async def better(x: int, y: int) -> bool:
+            # a non-answer never wins, and costs no comparator call
+            if len(texts[y].strip()) <= 10 or len(texts[x].strip()) <= 10:
+                return len(texts[x].strip()) > 10 >= len(texts[y].strip())
+            i, j = min(x, y), max(x, y)
+            if (i, j) not in verdicts:
+                winner, verdict, tally = await self._judge(texts[i], texts[j])
+                verdicts[(i, j)] = (winner, verdict)
+                if tally is not None:
+                    tallies[(i, j)] = tally
+            winner = verdicts[(i, j)][0]
+            return winner == ("A" if x == i else "B")
+
+        order = await merge_rank(range(len(texts)), better)
+        return {
+            "order": order,
+            "verdicts": verdicts,
+            "consensus": tallies,
+            "ranking": [
+                {
+                    "rank": r,
+                    "prompt": None if i == 0 else improved[i - 1],
+                    "answer": texts[i],
+                    "source": "original" if i == 0 else f"improved[{i - 1}]",
+                }
+                for r, i in enumerate(order, 1)
+            ],
+        }
+
+    def _choose_ranked(
+        self, prompt: str, improved: List[str], chosen_prompt: Optional[str], ranked: Dict[str, Any]
+    ) -> str:
+        if chosen_prompt and chosen_prompt in improved:
+            return chosen_prompt
+        best = next((i for i in ranked["order"] if i > 0), None)
+        return improved[best - 1] if best else prompt
+
+    def _ranked_answer(self, improved: List[str], answers: List[str], use_prompt: str) -> str:
+        return answers[improved.index(use_prompt)] if use_prompt in improved else ""
+
+    async def _ranked_comparison(
+        self, answer_a: str, answer_b: str, improved: List[str], use_prompt: str,
+        ranked: Dict[str, Any],
+    ) -> str:
+        # reuse the tournament's A-vs-winner verdict when it was played
+        if use_prompt in improved:
+            pair = (0, improved.index(use_prompt) + 1)
+            verdict = ranked["verdicts"].get(pair)
+            if verdict is not None:
+                self._note_consensus("comparison", ranked["consensus"].get(pair))
+                return verdict[1]
+        return await self._compare(answer_a, answer_b)
+
+    @staticmethod
+    def _gate(critic: str, chosen_prompt: Optional[str]) -> bool:
+        # True → run the rewrite chain; an explicit prompt choice always does
+        return bool(chosen_prompt) or not get_gate_policy().passes(ScoreRecord.parse(critic))
+
+    def _build_pipeline(
+        self, fan_out: bool = False, candidates: int = 2, gating: bool = False
+    ) -> StageScheduler:
+        # stage fns take their deps as keyword args (names must match);
+        # Critic only needs Answer A, so it overlaps the whole rewrite chain
+        fix = functools.partial(self._fix, candidates=candidates)
+        # with gating, everything after the Critic is skipped (or cancelled,
+        # if already running) when the Critic finds Answer A good enough
+        chain = functools.partial(Stage, gate="gate") if gating else Stage
+        stages = [Stage("critic", self._critique, deps=("answer_a",))]
+        if gating:
+            stages.append(Stage("gate", self._gate, deps=("critic", "chosen_prompt"), blocking=False))
+        if not fan_out:
+            return StageScheduler(stages + [
+                chain("improved", fix, deps=("prompt",), skipped=[]),
+                chain("use_prompt", self._choose_prompt,
+                      deps=("prompt", "improved", "chosen_prompt"), blocking=False),
+                chain("answer_b", self._generate, deps=("use_prompt",), skipped=""),
+                chain("comparison", self._compare, deps=("answer_a", "answer_b"),
+                      skipped=_GATED_COMPARISON),
+            ])
+        return StageScheduler(stages + [
+            chain("improved", fix, deps=("prompt",), skipped=[]),
+            chain("answers", self._answers, deps=("improved",), skipped=[]),
+            chain("ranked", self._rank, deps=("answer_a", "improved", "answers")),
+            chain("use_prompt", self._choose_ranked,
+                  deps=("prompt", "improved", "chosen_prompt", "ranked"), blocking=False),
+            chain("answer_b", self._ranked_answer,
+                  deps=("improved", "answers", "use_prompt"), blocking=False, skipped=""),
+            chain("comparison", self._ranked_comparison,
+                  deps=("answer_a", "answer_b", "improved", "use_prompt", "ranked"),
+                  skipped=_GATED_COMPARISON),
+        ])
+
+    def stage_names(self, fan_out: bool = False, gating: Optional[bool] = None) -> List[str]:
+        """Stages a run will report through on_stage_done, in DAG order."""
+        gating = GATING_ENABLED if gating is None else gating
+        return list(self._build_pipeline(fan_out, gating=gating).stages)
+
+    async def aevaluate_prompt_response(
         self,
         prompt: str,
         answer_a: str,
         chosen_prompt: Optional[str] = None,   # optional override
+        use_cache: bool = True,
+        on_token: Optional[Callable[[str, str], None]] = None,
+        on_stage_done: Optional[Callable[[str, Any], None]] = None,
+        fan_out: bool = False,
+        candidates: int = 2,
+        gating: Optional[bool] = None,
+        record_id: Any = None,
+        self_consistency: Optional[bool] = None,
     ) -> Dict[str, Any]:
         """
-        Full pipeline:
-        1. Critic evaluates Answer A
+        Full pipeline as a DAG:
+        1. Critic evaluates Answer A   (runs concurrently with 2–5; an answer
+           over the Critic's token budget is rated chunk by chunk)
         2. Fixer rewrites prompt
         3. Pick first bullet (or chosen_prompt override)
         4. Generator produces Answer B
         5. Comparator judges A vs B
-        Returns a dictionary for display / JSON export.
+        Returns a dictionary for display / JSON export; its "spans" list
+        holds per-stage wall time, tokens, cost and models (see metrics.py).
+        Each agent runs on its self.stage_models assignment, "auto" ones
+        re-chosen per run by model_policy.ModelPolicy.
+        use_cache=False forces fresh LLM calls for this run.
+        on_token(stage, chunk) receives streamed agent output (called from
+        worker threads); on_stage_done(stage, value) fires on the loop.
+        fan_out=True asks the Fixer for `candidates` prompts, answers all
+        of them concurrently and ranks them with Answer A in a merge-sort
+        tournament; the best prompt is used and "ranking" is added.
+        gating (default: config.GATING_ENABLED) skips steps 2–5 when the
+        Critic's levels pass gating.GatePolicy; "stages_run" and
+        "stages_skipped" record what happened.
+        self_consistency (default: config.SELF_CONSISTENCY) has the Critic
+        and Comparator vote over adaptively drawn samples (consensus.py);
+        their majority is used and "consensus" holds each stage's samples,
+        agreement and votes. Chunked and batch-shared critiques sample once.
+        The result is also appended to self.history (tagged `record_id`).
         """
+        gating = GATING_ENABLED if gating is None else gating
+        if self_consistency is None:
+            self_consistency = SELF_CONSISTENCY
+        await self._abuild_agents()
+        self._refresh_models()
+        bypass = contextlib.nullcontext() if use_cache else LLMCache.bypass()
+        sink = _token_sink.set(on_token)
+        tallies = _consensus.set({} if self_consistency else None)
+        spans: List[Dict[str, Any]] = []
+        skipped: List[str] = []
+        t0 = time.perf_counter()
+        try:
+            with bypass:
+                pipeline = self._build_pipeline(fan_out, candidates, gating)
+                out = await pipeline.run(
+                    on_stage_done=on_stage_done,
+                    stage_context=functools.partial(metrics.stage_span, spans=spans),
+                    speculate=GATE_SPECULATIVE,
+                    skipped=skipped,
+                    prompt=prompt, answer_a=answer_a, chosen_prompt=chosen_prompt,
+                )
+            consensus = _consensus.get()
+        finally:
+            _token_sink.reset(sink)
+            _consensus.reset(tallies)
+        metrics.RUN_SECONDS.observe(time.perf_counter() - t0)
+        result = {
+            "original_prompt": prompt,
+            "original_response": answer_a,
+            "critic_analysis": out["critic"],
+            "improved_prompts": out["improved"],
+            "chosen_prompt": out["use_prompt"],
+            "new_response": out["answer_b"],
+            "comparison_analysis": out["comparison"],
+            # Critic levels as 0–2 and the Comparator's winner, parsed once
+            "scores": ScoreRecord.parse(out["critic"], out["comparison"]).to_dict(),
+            "stages_run": [name for name in pipeline.stages if name not in skipped],
+            "stages_skipped": skipped,
+            "spans": spans,
+        }
+        if fan_out:
+            ranked = out["ranked"] or {"ranking": [], "verdicts": {}}
+            result["ranking"] = ranked["ranking"]
+            result["comparisons"] = len(ranked["verdicts"])
+        if consensus is not None:
+            result["consensus"] = consensus
+        if self.history is not None:
+            self.history.append(result, model=model_of(self.llm_config), record_id=record_id)
+        return result
 
-        # 1️⃣ Critic
-        critic_text = self.critic.evaluate(answer_a).strip()
+    def evaluate_prompt_response(
+        self,
+        prompt: str,
+        answer_a: str,
+        chosen_prompt: Optional[str] = None,   # optional override
+        use_cache: bool = True,
+        fan_out: bool = False,
+        candidates: int = 2,
+        gating: Optional[bool] = None,
+        self_consistency: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Blocking wrapper around `aevaluate_prompt_response`."""
+        return run_sync(self.aevaluate_prompt_response(
+            prompt, answer_a, chosen_prompt, use_cache,
+            fan_out=fan_out, candidates=candidates, gating=gating,
+            self_consistency=self_consistency,
+        ))
 
-        # 2️⃣ Fixer
-        improved = self.fixer.fix(prompt)          # list[str]
+    async def astream_evaluation(
+        self,
+        prompt: str,
+        answer_a: str,
+        chosen_prompt: Optional[str] = None,
+        use_cache: bool = True,
+        fan_out: bool = False,
+        candidates: int = 2,
+        gating: Optional[bool] = None,
+        self_consistency: Optional[bool] = None,
+    ) -> AsyncIterator[EvalEvent]:
+        """
+        Run the pipeline and yield EvalEvents as they happen: streamed
+        tokens per stage, each stage's value, then the final result dict.
+        """
+        loop = asyncio.get_running_loop()
+        events: "asyncio.Queue[EvalEvent]" = asyncio.Queue()
 
-        # choose prompt for Answer B
-        if chosen_prompt and chosen_prompt in improved:
-            use_prompt = chosen_prompt
-        else:
-            use_prompt = (improved or [prompt])[0]   # first bullet or original
+        def on_token(stage: str, chunk: str) -> None:       # worker threads
+            loop.call_soon_threadsafe(events.put_nowait, EvalEvent("token", stage, chunk))
 
-        # 3️⃣ Generator → Answer B
-        raw = self.generator.generate_reply(
-            [{"role": "user", "content": use_prompt}]
-        )
-        answer_b = raw if isinstance(raw, str) else raw.get("content", "")
-        answer_b = (answer_b or "").strip()
-
-        # 4️⃣ Comparator
-        comp_text = (
-            self.comp.compare(answer_a, answer_b).strip()
-            if len(answer_b) > 10
-            else "Comparison skipped – new answer not meaningful."
+        def on_stage_done(stage: str, value: Any) -> None:  # event loop
+            events.put_nowait(EvalEvent("stage", stage, value))
+
+        run = asyncio.ensure_future(self.aevaluate_prompt_response(
+            prompt, answer_a, chosen_prompt, use_cache,
+            on_token=on_token, on_stage_done=on_stage_done,
+            fan_out=fan_out, candidates=candidates, gating=gating,
+            self_consistency=self_consistency,
+        ))
+        try:
+            while not run.done():
+                nxt = asyncio.ensure_future(events.get())
+                await asyncio.wait({nxt, run}, return_when=asyncio.FIRST_COMPLETED)
+                if nxt.done():
+                    yield nxt.result()
+                else:
+                    nxt.cancel()
+            while not events.empty():
+                yield events.get_nowait()
+            yield EvalEvent("result", None, run.result())
+        finally:
+            run.cancel()
+
+    def stream_evaluation(
+        self,
+        prompt: str,
+        answer_a: str,
+        chosen_prompt: Optional[str] = None,
+        use_cache: bool = True,
+        fan_out: bool = False,
+        candidates: int = 2,
+        gating: Optional[bool] = None,
+        self_consistency: Optional[bool] = None,
+    ) -> Iterator[EvalEvent]:
+        """Blocking iterator over `astream_evaluation` (e.g. for Streamlit)."""
+        return iter_sync(self.astream_evaluation(
+            prompt, answer_a, chosen_prompt, use_cache,
+            fan_out=fan_out, candidates=candidates, gating=gating,
+            self_consistency=self_consistency,
+        ))
+
+    # ────────────────────────────────────────────────────────────────── #
+    @staticmethod
+    def _record_answer(rec: Dict[str, Any]) -> str:
+        return rec.get("answer_a", rec.get("original_response", ""))
+
+    async def _evaluate_record(
+        self, idx: int, rec: Dict[str, Any],
+        shared: Optional[Tuple[_SharedCritique, int]] = None,
+    ) -> Dict[str, Any]:
+        rid = rec.get("id", idx)
+        _shared_critique.set(shared)    # this record's task context only
+        try:
+            res = await self.aevaluate_prompt_response(
+                rec["prompt"],
+                self._record_answer(rec),
+                rec.get("chosen_prompt"),
+                record_id=rid,
+            )
+        except Exception as exc:   # one bad record must not sink the batch
+            return {"id": rid, "error": f"{type(exc).__name__}: {exc}"}
+        return {"id": rid, **res}
+
+    async def aevaluate_batch(
+        self,
+        records: Iterable[Dict[str, Any]],
+        concurrency: int = 4,
+        critic_batch: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Evaluate {"id", "prompt", "answer_a", "chosen_prompt"?} records with
+        at most `concurrency` pipelines in flight. Records are pulled lazily
+        and results are yielded in completion order, each carrying its "id"
+        (the record index if absent). Failed records yield {"id", "error"}.
+        Records are read `critic_batch` at a time (default
+        config.CRITIC_BATCH_SIZE; 1 = off) and their answers rated in one
+        batched Critic request, made when the first of them needs it.
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        await self._abuild_agents()
+        size = CRITIC_BATCH_SIZE if critic_batch is None else critic_batch
+        it = self._with_shared_critiques(records, size) if size > 1 else (
+            (i, rec, None) for i, rec in enumerate(records)
         )
+        pending: set = set()
+        try:
+            while True:
+                while len(pending) < concurrency:
+                    nxt = next(it, None)
+                    if nxt is None:
+                        break
+                    pending.add(asyncio.ensure_future(self._evaluate_record(*nxt)))
+                if not pending:
+                    return
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
 
-        # 5️⃣ pack results
-        return {
-            "original_prompt": prompt,
-            "original_response": answer_a,
-            "critic_analysis": critic_text,
-            "improved_prompts": improved,
-            "chosen_prompt": use_prompt,
-            "new_response": answer_b,
-            "comparison_analysis": comp_text,
-        }
+    def _with_shared_critiques(
+        self, records: Iterable[Dict[str, Any]], size: int
+    ) -> Iterator[Tuple[int, Dict[str, Any], Optional[Tuple[_SharedCritique, int]]]]:
+        # (index, record, shared critique slot) – answers over the Critic's
+        # budget keep the chunked single-answer path
+        numbered = enumerate(records)
+        budget = self.critic.answer_budget()
+        while True:
+            chunk = list(itertools.islice(numbered, size))
+            if not chunk:
+                return
+            fits = [
+                i for i, rec in chunk
+                if estimate_tokens(self._record_answer(rec)) <= budget
+            ]
+            shared = None
+            if len(fits) > 1:
+                answers = [self._record_answer(rec) for i, rec in chunk if i in fits]
+                shared = _SharedCritique(
+                    functools.partial(self.critic.evaluate_many, max_items=size), answers
+                )
+            for i, rec in chunk:
+                yield i, rec, (shared, fits.index(i)) if shared and i in fits else None
+
+    def evaluate_batch(
+        self,
+        records: Iterable[Dict[str, Any]],
+        concurrency: int = 4,
+        critic_batch: Optional[int] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Blocking iterator over `aevaluate_batch` results."""
+        # each pipeline keeps up to two agent calls in flight
+        return iter_sync(
+            self.aevaluate_batch(records, concurrency, critic_batch), workers=2 * concurrency
+        )
 
     # allow sidebar model switching
-    def update_llm_config(self, cfg: Dict[str, Any]) -> None:
-        self.llm_config = cfg
-        for agent in (self.critic, self.fixer, self.comp, self.generator):
-            agent.llm_config = cfg
+    def update_llm_config(
+        self, cfg: Dict[str, Any], stage_models: Optional[Dict[str, str]] = None
+    ) -> None:
+        # the pooled client is fetched (or built) once, then all four agents
+        # are repointed together (agents with their own model keep it);
+        # calls already in flight keep the old one
+        with self._config_lock:
+            self.llm_config = cfg
+            if stage_models is not None:
+                self.stage_models = {**self.stage_models, **stage_models}
+            for agent in self._agents.values():   # unbuilt ones pick up cfg later
+                agent.set_llm_config(self._stage_config(agent.role))
+        self._warm()
+
+
+# ── process-wide evaluators ────────────────────────────────────────────────
+_evaluators: Dict[str, PromptEvaluator] = {}
+_evaluators_lock = threading.Lock()
+
+
+def get_evaluator(
+    llm_config: Optional[Dict[str, Any]] = None,
+    stage_models: Optional[Dict[str, str]] = None,
+) -> PromptEvaluator:
+    """
+    Shared PromptEvaluator for `llm_config` (default: config.get_llm_config())
+    and per-agent `stage_models`, built once per distinct pair and reused by
+    every caller in the process – e.g. all Streamlit sessions on the same
+    backend.
+    """
+    cfg = llm_config if llm_config is not None else get_llm_config()
+    # hashed, so api keys never sit around as dict keys
+    key = hashlib.sha256(
+        json.dumps([cfg, stage_models or {}], sort_keys=True, default=str).encode()
+    ).hexdigest()
+    with _evaluators_lock:
+        ev = _evaluators.get(key)
+        if ev is None:
+            ev = _evaluators[key] = PromptEvaluator(llm_config=cfg, stage_models=stage_models)
+        return ev
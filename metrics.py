@@ -0,0 +1,277 @@
+"""
+metrics.py – per-stage spans and process-wide metrics.
+
+• `stage_span(name, spans)` times one pipeline stage; agent calls made
+  inside it add their tokens / cost (from the config's `price` pair,
+  USD per 1k prompt / completion tokens) to that span.
+• `REGISTRY` aggregates counters and histograms across runs and renders
+  them as Prometheus text or JSON.
+• `set_profiler(hook)` wraps every stage in `hook(stage)`, a context
+  manager factory (pyinstrument, OpenTelemetry, a custom timer, …).
+"""
+import contextlib
+import contextvars
+import json
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# seconds; LLM calls are slow, so the buckets reach well past a minute
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in items
+    )
+    return "{" + body + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str) -> None:
+        self.name, self.help = name, help
+        self.values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, val in sorted(self.values.items()):
+                lines.append(f"{self.name}{_fmt_labels(key)} {val:g}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"labels": dict(k), "value": v} for k, v in sorted(self.values.items())]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name, self.help = name, help
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket..., +Inf count], sum
+        self.values: Dict[LabelKey, Tuple[List[int], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self.values[key] = (counts, total + value)
+
+    def prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cum = 0
+                for bound, n in zip(self.buckets, counts):
+                    cum += n
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', f'{bound:g}')])} {cum}")
+                cum += counts[-1]
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, [('le', '+Inf')])} {cum}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {total:g}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {cum}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        out = []
+        with self._lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                n = sum(counts)
+                out.append({
+                    "labels": dict(key),
+                    "count": n,
+                    "sum": total,
+                    "mean": total / n if n else 0.0,
+                    "buckets": dict(zip([*map(str, self.buckets), "+Inf"], counts)),
+                })
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric: Any) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._add(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, buckets))
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for m in metrics for line in m.prometheus()) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {m.name: m.snapshot() for m in metrics}
+
+    def dump_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.snapshot(), indent=2)
+        if path:
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write(text)
+        return text
+
+
+REGISTRY = MetricsRegistry()
+RUN_SECONDS = REGISTRY.histogram("evaluator_run_seconds", "Wall time of a full evaluation.")
+STAGE_SECONDS = REGISTRY.histogram("evaluator_stage_seconds", "Wall time per pipeline stage.")
+STAGE_COST = REGISTRY.counter("evaluator_stage_cost_usd_total", "Provider spend per pipeline stage.")
+CALL_SECONDS = REGISTRY.histogram("evaluator_llm_call_seconds", "Latency of one provider call.")
+CALLS = REGISTRY.counter("evaluator_llm_calls_total", "Agent LLM calls (cached = served from cache).")
+TOKENS = REGISTRY.counter("evaluator_llm_tokens_total", "Prompt / completion tokens sent to providers.")
+COST = REGISTRY.counter("evaluator_llm_cost_usd_total", "Provider spend computed from config `price`.")
+EARLY_STOPS = REGISTRY.counter(
+    "evaluator_llm_early_stops_total", "Replies cut off once their expected structure was complete."
+)
+BUDGET_UNUSED = REGISTRY.counter(
+    "evaluator_llm_budget_unused_tokens_total",
+    "Headroom left below max_tokens by early-stopped replies (not tokens known to be avoided).",
+)
+
+
+# ── spans ───────────────────────────────────────────────────────────────
+class Span:
+    __slots__ = ("stage", "start", "seconds", "calls", "cache_hits",
+                 "prompt_tokens", "completion_tokens", "cost", "models",
+                 "early_stops", "budget_unused", "_lock")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+        self.start = time.time()
+        self.seconds = 0.0
+        self.calls = self.cache_hits = 0
+        self.prompt_tokens = self.completion_tokens = 0
+        self.cost = 0.0
+        self.models: List[str] = []
+        self.early_stops = self.budget_unused = 0
+        self._lock = threading.Lock()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "start": self.start,
+            "seconds": round(self.seconds, 4),
+            "calls": self.calls,
+            "cache_hits": self.cache_hits,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost": round(self.cost, 6),
+            "models": self.models,
+            "early_stops": self.early_stops,
+            "budget_unused": self.budget_unused,
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+_profiler: Optional[Callable[[str], ContextManager[Any]]] = None
+
+
+def set_profiler(hook: Optional[Callable[[str], ContextManager[Any]]]) -> None:
+    """Wrap every stage in `hook(stage_name)`; None removes the hook."""
+    global _profiler
+    _profiler = hook
+
+
+@contextlib.contextmanager
+def stage_span(stage: str, spans: Optional[List[Dict[str, Any]]] = None) -> Iterator[Span]:
+    span = Span(stage)
+    token = _current_span.set(span)
+    t0 = time.perf_counter()
+    try:
+        with (_profiler(stage) if _profiler is not None else contextlib.nullcontext()):
+            yield span
+    finally:
+        span.seconds = time.perf_counter() - t0
+        _current_span.reset(token)
+        STAGE_SECONDS.observe(span.seconds, stage=stage)
+        if span.cost:
+            STAGE_COST.inc(span.cost, stage=stage)
+        if spans is not None:
+            spans.append(span.to_dict())
+
+
+def call_cost(price: Any, prompt_tokens: int, completion_tokens: int) -> float:
+    """USD from a config `price` pair (per 1k prompt / completion tokens)."""
+    if not price:
+        return 0.0
+    if isinstance(price, (int, float)):
+        price = (price, price)
+    return prompt_tokens / 1000.0 * price[0] + completion_tokens / 1000.0 * price[1]
+
+
+def record_llm_call(
+    model: str,
+    seconds: float = 0.0,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    price: Any = None,
+    cached: bool = False,
+    early_stop: bool = False,
+    budget_unused: int = 0,
+) -> None:
+    """
+    Account one agent call to the current span and the registry.
+    `early_stop` marks a reply cut off once complete; `budget_unused` is
+    what was left of its max_tokens budget (an upper bound on what the
+    stop avoided: the model may have ended there anyway).
+    """
+    cost = 0.0 if cached else call_cost(price, prompt_tokens, completion_tokens)
+    CALLS.inc(model=model, cached=cached)
+    if not cached:
+        CALL_SECONDS.observe(seconds, model=model)
+        TOKENS.inc(prompt_tokens, model=model, kind="prompt")
+        TOKENS.inc(completion_tokens, model=model, kind="completion")
+        COST.inc(cost, model=model)
+    if early_stop:
+        EARLY_STOPS.inc(model=model)
+        BUDGET_UNUSED.inc(budget_unused, model=model)
+
+    span = _current_span.get()
+    if span is None:
+        return
+    with span._lock:
+        span.calls += 1
+        if model not in span.models:
+            span.models.append(model)
+        if cached:
+            span.cache_hits += 1
+        else:
+            span.prompt_tokens += prompt_tokens
+            span.completion_tokens += completion_tokens
+            span.cost += cost
+        if early_stop:
+            span.early_stops += 1
+            span.budget_unused += budget_unused
@@ -0,0 +1,389 @@
+"""
+mock_llm_server.py – local OpenAI-compatible stub for offline runs.
+
+Serves POST /v1/chat/completions (plain and SSE streaming) with canned
+replies in the shape each agent expects, so the whole pipeline runs
+with no network. Latency is simulated per token, with optional jitter,
+and a share of requests can be failed with 429 / 5xx to exercise the
+rate limiter and router. `ramble` appends filler after each reply, the
+way verbose models run on past the requested structure; `max_tokens`
+and `stop` in the request are honoured.
+
+It also mimics Ollama's model residency: with `load_latency`, a request
+for a model that is not loaded first waits that long, and the model then
+stays resident for its keep-alive (`default_keep_alive` for chat calls).
+The native POST /api/generate (empty prompt = load / keep_alive 0 =
+unload) and GET /api/ps endpoints are served at the server root.
+
+    python mock_llm_server.py --port 8000 --token-latency 0.01 --error-rate 0.05
+
+then point OLLAMA_BASE_URL at http://127.0.0.1:8000/v1. From Python:
+
+    with MockLLMServer(token_latency=0.005) as srv:
+        cfg = srv.llm_config()
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def canned_reply(messages: List[Dict[str, Any]]) -> str:
+    """A well-formed reply for whichever agent sent `messages`."""
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    ids = re.findall(r"^<answer id=(\d+)>$", user, re.M)
+    if ids:                                                 # CriticAgent, batched
+        one = canned_reply([{"role": "user", "content": "ANSWER: -"}])
+        return "\n\n".join(f"ANSWER {k}\n{one}" for k in ids)
+    if "ANSWER:" in user:                                   # CriticAgent
+        return (
+            "Correctness: High – the answer is factually accurate\n"
+            "Hallucination: Low – no invented details\n"
+            "Tone: High – neutral and clear\n"
+            "Relevance: High – addresses the question directly"
+        )
+    m = re.search(r"PROMPT:\s*(.+?)\s*(?:\n\n|$)", user, re.S)
+    if m:                                                   # PromptFixerAgent
+        prompt = " ".join(m.group(1).split())
+        n = re.search(r"exactly (\d+) bullet", user)
+        styles = [
+            "Answer precisely in two or three sentences.",
+            "Include one concrete example.",
+            "Focus on the most common use case.",
+            "Explain it for a beginner.",
+            "Mention one pitfall to avoid.",
+        ]
+        count = int(n.group(1)) if n else 2
+        return "\n".join(f"• {prompt} {styles[i % len(styles)]}" for i in range(count))
+    if user.startswith("A:") and "\n\nB:" in user:          # ComparatorAgent
+        return "Winner: B\nB is more specific and gives a concrete example, while A is terse."
+    return (                                                # GeneratorAgent / anything else
+        "Here is a clear and concise answer. It covers the main point, adds one "
+        "concrete example, and avoids unnecessary detail."
+    )
+
+
+def _duration(value: Any) -> Optional[float]:
+    """Ollama keep_alive ("30m", "1h", "45s", seconds, -1) → seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    m = re.fullmatch(r"(-?[\d.]+)\s*([smh]?)", str(value).strip())
+    if not m:
+        return None
+    return float(m.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[m.group(2)]
+
+
+class MockLLMServer:
+    """
+    Threaded stub server. `token_latency` seconds per generated token
+    (plus `first_token_latency` once), scaled per request by a random
+    factor in [1 - jitter, 1 + jitter]. `error_rate` of requests fail
+    with `error_status` (429s carry a Retry-After of `retry_after`).
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token_latency: float = 0.01,
+        first_token_latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 429,
+        retry_after: float = 0.1,
+        seed: Optional[int] = None,
+        ramble: int = 0,
+        load_latency: float = 0.0,
+        default_keep_alive: float = 300.0,
+    ) -> None:
+        self.token_latency = token_latency
+        self.first_token_latency = first_token_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.ramble = ramble                      # filler words after each reply
+        self.load_latency = load_latency          # seconds to load a cold model
+        self.default_keep_alive = default_keep_alive
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = self.errors = self.tokens_sent = self.loads = 0
+        self._resident: Dict[str, float] = {}    # model → unload time (inf = never)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    # ── lifecycle ───────────────────────────────────────────────────────
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def llm_config(self, model: str = "mock", price=(0.0, 0.0)) -> Dict[str, Any]:
+        """llm_config pointing at this server (same shape as config.py)."""
+        return {
+            "temperature": 0.0,
+            "timeout": 60,
+            "config_list": [{
+                "model": model,
+                "api_key": "mock",
+                "base_url": self.base_url,
+                "price": list(price),
+            }],
+        }
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="mock-llm", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "MockLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests, "errors": self.errors,
+                "tokens_sent": self.tokens_sent, "loads": self.loads,
+            }
+
+    # ── model residency (Ollama) ────────────────────────────────────────
+    def evict(self, model: Optional[str] = None) -> None:
+        """Unload `model` (every model if None), as memory pressure would."""
+        with self._lock:
+            if model is None:
+                self._resident.clear()
+            else:
+                self._resident.pop(model, None)
+
+    def _use_model(self, model: str, keep_alive: Optional[float]) -> float:
+        """Load `model` if needed (returns the load seconds) and reset its expiry."""
+        keep_alive = self.default_keep_alive if keep_alive is None else keep_alive
+        now = time.time()
+        with self._lock:
+            cold = self._resident.get(model, 0.0) <= now
+            if cold:
+                self.loads += 1
+        if cold:
+            time.sleep(self.load_latency)
+        with self._lock:
+            if keep_alive == 0:
+                self._resident.pop(model, None)
+            else:
+                self._resident[model] = float("inf") if keep_alive < 0 else time.time() + keep_alive
+        return self.load_latency if cold else 0.0
+
+    def _ps(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "name": model, "model": model, "size_vram": 4 << 30,
+                    "expires_at": (
+                        "2318-01-01T00:00:00Z" if until == float("inf")
+                        else time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(until))
+                    ),
+                }
+                for model, until in self._resident.items() if until > now
+            ]
+
+    # ── request handling ────────────────────────────────────────────────
+    def _draw(self) -> Tuple[bool, float]:
+        with self._lock:
+            self.requests += 1
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+            scale = 1.0 + self._rng.uniform(-self.jitter, self.jitter) if self.jitter else 1.0
+        return fail, max(0.0, scale)
+
+    def _sent(self, tokens: int) -> None:
+        with self._lock:
+            self.tokens_sent += tokens
+
+    def _reply(self, body: Dict[str, Any]) -> Tuple[str, str]:
+        """(text, finish_reason) after ramble, `stop` and `max_tokens`."""
+        text = canned_reply(body.get("messages") or [])
+        if self.ramble:
+            text += "\n\n" + " ".join(["Additionally,"] + ["more"] * (self.ramble - 1))
+        stops = body.get("stop") or []
+        for stop in [stops] if isinstance(stops, str) else stops:
+            if stop and stop in text:
+                text = text[:text.index(stop)]
+        words = text.split(" ")
+        cap = body.get("max_completion_tokens") or body.get("max_tokens")
+        if cap and len(words) > cap:
+            return " ".join(words[:cap]), "length"
+        return text, "stop"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"          # keep-alive, like real providers
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def handle(self) -> None:
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass                               # client dropped a keep-alive socket
+
+            def _json(self, status: int, obj: Any, headers: Optional[Dict[str, str]] = None) -> None:
+                data = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, data: bytes) -> None:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/").endswith("/models"):
+                    self._json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+                elif self.path.rstrip("/") in ("/health", "/v1/health"):
+                    self._json(200, {"status": "ok", **server.stats()})
+                elif self.path.rstrip("/") == "/api/ps":
+                    self._json(200, {"models": server._ps()})
+                else:
+                    self._json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self) -> None:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if self.path.rstrip("/") == "/api/generate" and not body.get("prompt"):
+                    model = body.get("model", "mock")
+                    keep_alive = _duration(body.get("keep_alive"))
+                    loaded = server._use_model(model, keep_alive)
+                    self._json(200, {
+                        "model": model, "response": "", "done": True,
+                        "done_reason": "unload" if keep_alive == 0 else "load",
+                        "load_duration": int(loaded * 1e9),
+                    })
+                    return
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._json(404, {"error": {"message": "not found"}})
+                    return
+
+                fail, scale = server._draw()
+                if fail:
+                    time.sleep(server.first_token_latency * scale)
+                    headers = {}
+                    if server.error_status == 429:
+                        headers["Retry-After"] = str(server.retry_after)
+                    self._json(server.error_status, {
+                        "error": {"message": "injected failure", "type": "mock_error"}
+                    }, headers)
+                    return
+
+                server._use_model(body.get("model", "mock"), None)
+                messages = body.get("messages") or []
+                text, finish = server._reply(body)
+                words = text.split(" ")
+                usage = {
+                    "prompt_tokens": sum(len(m.get("content") or "") for m in messages) // 4,
+                    "completion_tokens": len(words),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+                model = body.get("model", "mock")
+                base = {"id": "mock-1", "created": int(time.time()), "model": model}
+
+                if not body.get("stream"):
+                    time.sleep((server.first_token_latency + server.token_latency * len(words)) * scale)
+                    server._sent(len(words))
+                    self._json(200, {
+                        **base,
+                        "object": "chat.completion",
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": finish,
+                        }],
+                        "usage": usage,
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def event(delta: Dict[str, Any], finish: Optional[str] = None, **extra: Any) -> None:
+                    chunk = {
+                        **base,
+                        "object": "chat.completion.chunk",
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+                        **extra,
+                    }
+                    self._chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+
+                time.sleep(server.first_token_latency * scale)
+                try:
+                    for i, word in enumerate(words):
+                        time.sleep(server.token_latency * scale)
+                        event({"content": word if i == 0 else " " + word})
+                        server._sent(1)
+                    include_usage = (body.get("stream_options") or {}).get("include_usage")
+                    event({}, finish, **({"usage": usage} if include_usage else {}))
+                    self._chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass                               # client hung up mid-stream
+
+        return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Local OpenAI-compatible stub server.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8000)
+    ap.add_argument("--token-latency", type=float, default=0.01, help="seconds per token")
+    ap.add_argument("--first-token-latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0, help="± fraction of latency")
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=429)
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--ramble", type=int, default=0, help="filler words after each reply")
+    ap.add_argument("--load-latency", type=float, default=0.0, help="seconds to load a cold model")
+    args = ap.parse_args()
+
+    srv = MockLLMServer(
+        args.host, args.port, args.token_latency, args.first_token_latency,
+        args.jitter, args.error_rate, args.error_status, seed=args.seed, ramble=args.ramble,
+        load_latency=args.load_latency,
+    )
+    print(f"mock LLM server on {srv.base_url}")
+    try:
+        srv._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+model_policy.py – which model each agent ("stage") runs on.
+
+Every agent has an assignment (config.STAGE_MODELS): the selected backend,
+a fixed catalog model, or "auto". For "auto", `ModelPolicy.choose` walks
+the backend's providers' catalog models smallest-first (size tier, then
+price) and returns the first whose measured p95 latency and mean cost per
+call for that stage meet the stage's targets (config.STAGE_TARGETS).
+A model not yet measured for the stage counts as meeting them, so it gets
+tried; when none does, the backend itself is used. With a routed backend
+(several endpoints), "auto" keeps one endpoint per provider – its smallest
+model meeting the targets – so the router still picks and fails over.
+
+Measurements come from the agents: every provider call reports its stage,
+endpoint, wall time and cost through `record`.
+"""
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import (
+    ROUTER_WINDOW, STAGE_TARGETS, available_models, llm_config_dict, model_config,
+)
+from router import _percentile
+
+AUTO = "auto"
+_Key = Tuple[str, str, str]          # stage, base_url, model
+
+
+class _Samples:
+    def __init__(self, window: int) -> None:
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.costs: Deque[float] = deque(maxlen=window)
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        q = 0.95 if len(self.latencies) >= 5 else 0.5
+        return _percentile(sorted(self.latencies), q)
+
+    def mean_cost(self) -> Optional[float]:
+        return sum(self.costs) / len(self.costs) if self.costs else None
+
+
+class ModelPolicy:
+    def __init__(
+        self,
+        targets: Optional[Dict[str, Dict[str, Optional[float]]]] = None,
+        window: int = ROUTER_WINDOW,
+    ) -> None:
+        self.targets = targets if targets is not None else STAGE_TARGETS
+        self.window = window
+        self._samples: Dict[_Key, _Samples] = {}
+        self._lock = threading.Lock()
+
+    # ── measurements ────────────────────────────────────────────────────
+    def record(self, stage: str, entry: Dict[str, Any], seconds: float, cost: float) -> None:
+        key = (stage, entry.get("base_url") or "", entry.get("model") or "")
+        with self._lock:
+            s = self._samples.get(key)
+            if s is None:
+                s = self._samples[key] = _Samples(self.window)
+            s.latencies.append(seconds)
+            s.costs.append(cost)
+
+    def _meets(self, stage: str, entry: Dict[str, Any]) -> bool:
+        target = self.targets.get(stage) or {}
+        with self._lock:
+            s = self._samples.get((stage, entry.get("base_url") or "", entry.get("model") or ""))
+            p95 = s.p95() if s is not None else None
+            cost = s.mean_cost() if s is not None else None
+        if target.get("latency") is not None and p95 is not None and p95 > target["latency"]:
+            return False
+        if target.get("cost") is not None and cost is not None and cost > target["cost"]:
+            return False
+        return True
+
+    # ── selection ───────────────────────────────────────────────────────
+    @staticmethod
+    def candidates(backend: Any) -> List[str]:
+        """Catalog ids on the backend's providers, smallest first."""
+        providers = {
+            e.get("base_url") for e in llm_config_dict(backend).get("config_list") or []
+        }
+        models = available_models()
+        ids = [mid for mid, m in models.items() if m["entry"]["base_url"] in providers]
+        return sorted(ids, key=lambda mid: (models[mid]["tier"], sum(models[mid]["entry"]["price"])))
+
+    def _smallest(self, stage: str, entry: Dict[str, Any]) -> Dict[str, Any]:
+        # the provider's smallest catalog model meeting the targets, else `entry`
+        models = available_models()
+        for mid in self.candidates({"config_list": [entry]}):
+            if self._meets(stage, models[mid]["entry"]):
+                return models[mid]["entry"]
+        return entry
+
+    def choose(self, stage: str, backend: Any) -> Optional[str]:
+        """Smallest catalog id meeting the stage's targets, else None."""
+        models = available_models()
+        for mid in self.candidates(backend):
+            if self._meets(stage, models[mid]["entry"]):
+                return mid
+        return None
+
+    def resolve(self, stage: str, assignment: str, backend: Any) -> Any:
+        """llm_config for a stage given its assignment; unknown ids fall back to the backend."""
+        if assignment == AUTO:
+            cfg = llm_config_dict(backend)
+            entries = cfg.get("config_list") or []
+            if len(entries) > 1:
+                return {**cfg, "config_list": [self._smallest(stage, e) for e in entries]}
+            assignment = self.choose(stage, backend) or ""
+        if assignment:
+            try:
+                return model_config(assignment)
+            except KeyError:
+                pass
+        return backend
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """'stage base#model' → p95 seconds, mean cost per call, samples."""
+        with self._lock:
+            return {
+                f"{stage} {base}#{model}": {
+                    "p95": round(s.p95() or 0.0, 4),
+                    "mean_cost": round(s.mean_cost() or 0.0, 6),
+                    "samples": len(s.latencies),
+                }
+                for (stage, base, model), s in self._samples.items()
+            }
+
+
+_default: Optional[ModelPolicy] = None
+_default_lock = threading.Lock()
+
+
+def get_model_policy() -> ModelPolicy:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ModelPolicy()
+        return _default
@@ -0,0 +1,190 @@
+"""
+ollama_warmup.py – keep local Ollama models loaded between calls.
+
+Ollama loads a model on its first request and unloads it after a few idle
+minutes, so the first call after a pause pays a multi-second load.
+`OllamaWarmer` preloads the models an evaluator uses (an /api/generate
+request with no prompt) with OLLAMA_KEEP_ALIVE, then re-sends it every
+OLLAMA_KEEPALIVE_INTERVAL seconds from a daemon thread. That matters
+because OpenAI-compatible calls reset a model's expiry to the server
+default; the refresh puts the longer one back, and reloads a model that
+was evicted anyway. `status()` reports each model as loading, loaded
+(with its expiry), evicted or error, checked against the /api/ps reply
+that the refresh thread fetched last. Because of that, status() makes no
+request of its own.
+
+Only the standard library is used, so `import main` stays cheap.
+"""
+import json
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, Iterable, List, Optional
+
+from config import (
+    DEFAULT_BASE_URL, OLLAMA_KEEP_ALIVE, OLLAMA_KEEPALIVE_INTERVAL, OLLAMA_WARMUP,
+    llm_config_dict,
+)
+
+
+def _root(base_url: str) -> str:
+    # native API lives beside the OpenAI-compatible /v1
+    base = base_url.rstrip("/")
+    return base[:-3] if base.endswith("/v1") else base
+
+
+def is_ollama(entry: Dict[str, Any]) -> bool:
+    return entry.get("api_key") == "ollama" or entry.get("base_url") == DEFAULT_BASE_URL
+
+
+class OllamaWarmer:
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        keep_alive: str = OLLAMA_KEEP_ALIVE,
+        interval: float = OLLAMA_KEEPALIVE_INTERVAL,
+        timeout: float = 600.0,
+    ) -> None:
+        self.root = _root(base_url)
+        self.keep_alive = keep_alive
+        self.interval = interval
+        self.timeout = timeout
+        # model → {"state", "load_seconds", "refreshed", "error"}
+        self._models: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._ready = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._running: Optional[Dict[str, Any]] = None   # last /api/ps, None = unknown
+
+    # ── public ──────────────────────────────────────────────────────────
+    def add(self, models: Iterable[str]) -> None:
+        """Start keeping `models` loaded; new ones are preloaded right away."""
+        with self._lock:
+            new = [m for m in models if m and m not in self._models]
+            for model in new:
+                self._models[model] = {
+                    "state": "loading", "load_seconds": None, "refreshed": None, "error": None,
+                }
+            if new and self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="ollama-warmup", daemon=True
+                )
+                self._thread.start()
+        if new:
+            self._wake.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until no model is still loading (False on timeout)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._ready:
+            while any(m["state"] == "loading" for m in self._models.values()):
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._ready.wait(left)
+        return True
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """model → state, expires_at, size_vram, load_seconds, refreshed, error."""
+        out = {}
+        with self._lock:
+            running = self._running
+            for model, info in self._models.items():
+                row = dict(info)
+                ps = None
+                if running is not None:
+                    ps = running.get(model) or running.get(f"{model}:latest")
+                    if ps is None and info["state"] == "loaded":
+                        row["state"] = "evicted"
+                row["expires_at"] = ps.get("expires_at") if ps else None
+                row["size_vram"] = ps.get("size_vram") if ps else None
+                out[model] = row
+        return out
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    # ── background refresh ──────────────────────────────────────────────
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.clear()
+            with self._lock:
+                models = list(self._models)
+            for model in models:
+                if self._stop.is_set():
+                    return
+                self._refresh(model)
+            self._poll()
+            self._wake.wait(self.interval)
+
+    def _poll(self) -> None:
+        try:
+            running = {m["name"]: m for m in self._get("/api/ps", timeout=2.0).get("models", [])}
+        except Exception:
+            running = None                 # server unreachable: report what we know
+        with self._lock:
+            self._running = running
+
+    def _refresh(self, model: str) -> None:
+        t0 = time.monotonic()
+        try:
+            reply = self._post("/api/generate", {"model": model, "keep_alive": self.keep_alive})
+        except Exception as exc:
+            update = {"state": "error", "error": f"{type(exc).__name__}: {exc}"}
+        else:
+            update = {"state": "loaded", "error": None, "refreshed": time.time()}
+            loaded = (reply.get("load_duration") or 0) / 1e9
+            if loaded > 0.001:                 # 0 when it was already resident
+                update["load_seconds"] = round(loaded, 3)
+            elif self._models[model]["load_seconds"] is None:
+                update["load_seconds"] = round(time.monotonic() - t0, 3)
+        with self._ready:
+            self._models[model].update(update)
+            self._ready.notify_all()
+
+    # ── HTTP ────────────────────────────────────────────────────────────
+    def _post(self, path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        req = urllib.request.Request(
+            self.root + path, data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return json.loads(resp.read() or b"{}")
+
+    def _get(self, path: str, timeout: float) -> Dict[str, Any]:
+        with urllib.request.urlopen(self.root + path, timeout=timeout) as resp:
+            return json.loads(resp.read() or b"{}")
+
+
+# ── process-wide warmers, one per Ollama server ─────────────────────────────
+_warmers: Dict[str, OllamaWarmer] = {}
+_warmers_lock = threading.Lock()
+
+
+def get_ollama_warmer(base_url: str = DEFAULT_BASE_URL) -> OllamaWarmer:
+    root = _root(base_url)
+    with _warmers_lock:
+        warmer = _warmers.get(root)
+        if warmer is None:
+            warmer = _warmers[root] = OllamaWarmer(base_url)
+        return warmer
+
+
+def warm_configs(*llm_configs: Any) -> List[OllamaWarmer]:
+    """Preload every Ollama model in the configs (no-op with OLLAMA_WARMUP=0)."""
+    if not OLLAMA_WARMUP:
+        return []
+    by_url: Dict[str, List[str]] = {}
+    for cfg in llm_configs:
+        for entry in llm_config_dict(cfg).get("config_list") or []:
+            if is_ollama(entry):
+                by_url.setdefault(entry.get("base_url") or DEFAULT_BASE_URL, []).append(entry["model"])
+    warmers = []
+    for base_url, models in by_url.items():
+        warmer = get_ollama_warmer(base_url)
+        warmer.add(models)
+        warmers.append(warmer)
+    return warmers
@@ -0,0 +1,242 @@
+"""
+pipeline.py – tiny async stage scheduler used by PromptEvaluator.
+Every stage starts as soon as the values it depends on are ready, so
+independent agent calls (e.g. Critic vs. Fixer → Generator) overlap.
+A stage may be gated: when its gate stage returns a falsy value it is
+skipped, and, if it already started speculatively, cancelled.
+"""
+import asyncio
+import contextlib
+import contextvars
+import inspect
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Any, AsyncIterator, Callable, ContextManager, Coroutine, Dict, Iterable,
+    Iterator, List, Optional, Set, Tuple,
+)
+
+# name of the stage whose code is running; visible to agent helpers,
+# including in the worker thread of a blocking stage
+current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_stage", default=None
+)
+# set for a gated stage once its gate says skip; agent calls made by the
+# stage see it and abort (before sending, or mid-stream)
+stage_cancelled: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    "stage_cancelled", default=None
+)
+
+
+class StageCancelled(Exception):
+    """An agent call gave up because its stage was skipped."""
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One node of the DAG. `fn` is called with the values named in `deps`
+    (pipeline inputs or earlier stage results) as keyword arguments.
+    Blocking functions are pushed to a worker thread. With `gate`, the
+    stage is skipped – its value becomes `skipped` – when the gate
+    stage's value is falsy.
+    """
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+    blocking: bool = True
+    gate: Optional[str] = None
+    skipped: Any = None
+
+
+class StageScheduler:
+    def __init__(self, stages: Iterable[Stage]) -> None:
+        self.stages: Dict[str, Stage] = {}
+        for st in stages:
+            if st.name in self.stages:
+                raise ValueError(f"duplicate stage '{st.name}'")
+            self.stages[st.name] = st
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        state: Dict[str, int] = {}          # 1 = visiting, 2 = done
+
+        def visit(name: str) -> None:
+            if state.get(name) == 2 or name not in self.stages:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"stage cycle through '{name}'")
+            state[name] = 1
+            for dep in self.stages[name].deps:
+                visit(dep)
+            state[name] = 2
+
+        for name in self.stages:
+            visit(name)
+
+    # ────────────────────────────────────────────────────────────────── #
+    async def run(
+        self,
+        on_stage_done: Optional[Callable[[str, Any], None]] = None,
+        stage_context: Optional[Callable[[str], ContextManager[Any]]] = None,
+        speculate: bool = True,
+        skipped: Optional[List[str]] = None,
+        **inputs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Execute all stages and return {name: value} for inputs + stages.
+        `on_stage_done(name, value)` fires on the loop as each stage ends.
+        `stage_context(name)` wraps each stage once its deps are ready
+        (timing spans, profilers); context vars it sets reach the worker.
+        The first failing stage cancels everything still in flight.
+        Gated stages start before their gate when `speculate` (and are
+        cancelled if it says skip), else they wait for it. The names of
+        skipped stages are appended to `skipped`.
+        """
+        missing = {
+            d for st in self.stages.values() for d in st.deps
+            if d not in self.stages and d not in inputs
+        }
+        if missing:
+            raise ValueError(f"unresolved stage inputs: {sorted(missing)}")
+
+        results: Dict[str, Any] = dict(inputs)
+        tasks: Dict[str, asyncio.Task] = {}
+        # made up front: a gate can close before a gated stage's task has
+        # even started (e.g. a Critic whose value was already there)
+        cancelled = {
+            st.name: threading.Event() for st in self.stages.values() if st.gate is not None
+        }
+        skip: Set[str] = set()
+        active: Set[str] = set()             # gated stages that got past their start
+
+        def _skip(gate: str) -> None:
+            for st in self.stages.values():
+                if st.gate == gate and st.name not in results:
+                    skip.add(st.name)
+                    cancelled[st.name].set()
+                    if st.name in active:
+                        tasks[st.name].cancel()
+
+        def _skipped(st: Stage) -> Any:
+            results[st.name] = st.skipped
+            if skipped is not None:
+                skipped.append(st.name)
+            if on_stage_done is not None:
+                on_stage_done(st.name, st.skipped)
+            return st.skipped
+
+        async def _run(st: Stage) -> Any:
+            if st.gate is not None:
+                stage_cancelled.set(cancelled[st.name])
+                active.add(st.name)
+            try:
+                # shielded: cancelling this stage must not cancel what it waits on
+                if st.gate is not None and not speculate:
+                    await asyncio.shield(tasks[st.gate])
+                for dep in st.deps:
+                    if dep in tasks:
+                        await asyncio.shield(tasks[dep])
+                if st.name in skip:
+                    return _skipped(st)
+                kwargs = {d: results[d] for d in st.deps}
+                current_stage.set(st.name)       # task-local context copy
+                ctx = stage_context(st.name) if stage_context else contextlib.nullcontext()
+                with ctx:
+                    if inspect.iscoroutinefunction(st.fn):
+                        value = await st.fn(**kwargs)
+                    elif st.blocking:
+                        value = await asyncio.to_thread(st.fn, **kwargs)
+                    else:
+                        value = st.fn(**kwargs)
+            except asyncio.CancelledError:
+                if st.name not in skip:
+                    raise
+                return _skipped(st)
+            if st.name in skip:                  # finished just as its gate closed
+                return _skipped(st)
+            results[st.name] = value
+            if on_stage_done is not None:
+                on_stage_done(st.name, value)
+            if not value and any(s.gate == st.name for s in self.stages.values()):
+                _skip(st.name)
+            return value
+
+        for st in self.stages.values():
+            tasks[st.name] = asyncio.ensure_future(_run(st))
+
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for t in tasks.values():
+                t.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        return results
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Run a coroutine from sync code, even if a loop is already running."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # called from inside an event loop (Jupyter, async servers) → helper thread
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        return ex.submit(asyncio.run, coro).result()
+
+
+def iter_sync(agen: AsyncIterator[Any], workers: Optional[int] = None) -> Iterator[Any]:
+    """
+    Drive an async iterator on a private loop in a helper thread and yield
+    its items synchronously. Closing the returned generator cancels the
+    producer. `workers` sizes that loop's thread pool for blocking stages.
+    """
+    out: "queue.Queue[Tuple[bool, Any]]" = queue.Queue()
+    loop = asyncio.new_event_loop()
+    if workers:
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=workers))
+
+    async def pump() -> None:
+        try:
+            async for item in agen:
+                out.put((True, item))
+        except BaseException as exc:      # incl. cancellation
+            out.put((False, exc))
+        else:
+            out.put((False, None))
+        finally:
+            aclose = getattr(agen, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    task = loop.create_task(pump())
+
+    def runner() -> None:
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(task)
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
+
+    thread = threading.Thread(target=runner, name="iter_sync", daemon=True)
+    thread.start()
+    try:
+        while True:
+            ok, value = out.get()
+            if ok:
+                yield value
+            elif value is None:
+                return
+            else:
+                raise value
+    finally:
+        if thread.is_alive():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:          # loop already closed: producer done
+                pass
+            thread.join()
@@ -0,0 +1,276 @@
+"""
+prompt_index.py – near-duplicate prompt index for reusing Fixer rewrites.
+
+Prompts are normalised (case, whitespace, punctuation), split into word
+unigram + bigram shingles and MinHashed. LSH banding finds candidate
+neighbours; their signatures are compared in one vectorised NumPy pass
+and the best match at or above `threshold` (estimated Jaccard) wins.
+
+Memory is bounded by `max_entries` (least recently used entries go
+first) and the index is saved to a single .npz file – no pickles. Each
+save first folds in what other processes (worker.py) saved to the same
+file since, under a file lock, so the last writer doesn't drop their
+rewrites.
+"""
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+try:                                          # POSIX; elsewhere saves aren't locked
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from config import (
+    PROMPT_INDEX_ENABLED, PROMPT_INDEX_MAX_ENTRIES, PROMPT_INDEX_PATH,
+    PROMPT_INDEX_THRESHOLD,
+)
+
+_MERSENNE = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_HASH_VERSION = 2                             # saved signatures from another scheme are dropped
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def normalize(prompt: str) -> List[str]:
+    return _WORD.findall(prompt.lower())
+
+
+def shingles(prompt: str) -> Set[str]:
+    words = normalize(prompt)
+    # unigrams keep short prompts (3–6 words) comparable; bigrams add order
+    return set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+
+class PromptIndex:
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        threshold: float = 0.7,
+        max_entries: int = 5000,
+        num_perm: int = 128,
+        bands: int = 32,
+        seed: int = 1,
+        autosave_every: int = 20,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.autosave_every = autosave_every
+
+        rng = np.random.RandomState(seed)          # fixed → signatures survive restarts
+        # below 2^32, like the shingle hashes, so a·h + b fits in uint64
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+        self._sigs = np.zeros((max_entries, num_perm), dtype=np.uint32)
+        self._used = np.zeros(max_entries, dtype=np.float64)   # last access, 0 = free slot
+        self._entries: List[Optional[Dict[str, Any]]] = [None] * max_entries
+        self._slots: Dict[str, int] = {}                      # normalised prompt → row
+        self._buckets: Dict[Tuple[int, bytes], Set[int]] = {}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._seen: Optional[int] = None                      # file mtime we last read / wrote
+        self.lookups = self.hits = self.writes = self.evictions = 0
+
+        if path and os.path.exists(path):
+            self._load()
+
+    # ── MinHash / LSH ───────────────────────────────────────────────────
+    def signature(self, prompt: str) -> np.ndarray:
+        grams = shingles(prompt) or {""}
+        hv = np.array(
+            [int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "little")
+             for g in grams],
+            dtype=np.uint64,
+        )
+        # (a·h + b) mod p, one row per permutation, min over shingles
+        perm = (np.outer(hv, self._a) + self._b) % _MERSENNE & _MAX_HASH
+        return perm.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, sig: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(i, sig[i * self.rows:(i + 1) * self.rows].tobytes()) for i in range(self.bands)]
+
+    # ── public API ──────────────────────────────────────────────────────
+    def lookup(self, prompt: str) -> Optional[Tuple[List[str], float, str]]:
+        """
+        (rewrites, similarity, stored prompt) of the closest stored prompt,
+        if close enough. Call `hit()` when the rewrites are actually used.
+        """
+        sig = self.signature(prompt)
+        with self._lock:
+            self.lookups += 1
+            cands: Set[int] = set()
+            for key in self._band_keys(sig):
+                cands |= self._buckets.get(key, set())
+            if not cands:
+                return None
+            rows = np.fromiter(cands, dtype=np.int64)
+            sims = (self._sigs[rows] == sig).mean(axis=1)
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            row = int(rows[best])
+            self._used[row] = time.time()
+            entry = self._entries[row]
+            return list(entry["rewrites"]), float(sims[best]), entry["prompt"]
+
+    def hit(self) -> None:
+        with self._lock:
+            self.hits += 1
+
+    def add(self, prompt: str, rewrites: List[str]) -> None:
+        if not rewrites:
+            return
+        norm = " ".join(normalize(prompt))
+        sig = self.signature(prompt)
+        with self._lock:
+            self._put({"prompt": norm, "rewrites": list(rewrites)}, sig, time.time())
+            self.writes += 1
+            self._dirty += 1
+            save = self.path and self._dirty >= self.autosave_every
+        if save:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "entries": len(self._slots),
+                "capacity": self.max_entries,
+                "bytes": int(self._sigs.nbytes + self._used.nbytes),
+            }
+
+    # ── storage / eviction (callers hold self._lock) ────────────────────
+    def _put(self, entry: Dict[str, Any], sig: np.ndarray, used: float) -> None:
+        row = self._slots.get(entry["prompt"])
+        if row is not None:
+            self._unbucket(row)
+        else:
+            row = self._free_row()
+        self._sigs[row] = sig
+        self._used[row] = used
+        self._entries[row] = entry
+        self._slots[entry["prompt"]] = row
+        for key in self._band_keys(sig):
+            self._buckets.setdefault(key, set()).add(row)
+
+    def _free_row(self) -> int:
+        if len(self._slots) < self.max_entries:
+            return int(np.argmin(self._used))         # a free slot has last-use 0
+        row = int(np.argmin(self._used))              # least recently used
+        self._unbucket(row)
+        del self._slots[self._entries[row]["prompt"]]
+        self._entries[row] = None
+        self.evictions += 1
+        return row
+
+    def _unbucket(self, row: int) -> None:
+        for key in self._band_keys(self._sigs[row]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(row)
+                if not bucket:
+                    del self._buckets[key]
+
+    # ── persistence ─────────────────────────────────────────────────────
+    def save(self) -> None:
+        if not self.path:
+            return
+        with _file_lock(self.path):
+            if _mtime(self.path) not in (None, self._seen):
+                self._load()                          # another process saved since
+            with self._lock:
+                rows = np.array(sorted(self._slots.values()), dtype=np.int64)
+                meta = json.dumps({
+                    "num_perm": self.num_perm,
+                    "hash": _HASH_VERSION,
+                    "entries": [self._entries[r] for r in rows],
+                })
+                sigs, used = self._sigs[rows].copy(), self._used[rows].copy()
+                self._dirty = 0
+            tmp = f"{self.path}.{os.getpid()}.tmp.npz"
+            np.savez_compressed(tmp, sigs=sigs, used=used, meta=np.array(meta))
+            os.replace(tmp, self.path)                # never leave a torn file
+            self._seen = _mtime(self.path)
+
+    def _load(self) -> None:
+        """Merge the saved entries in; the more recently used copy of a prompt wins."""
+        with np.load(self.path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("num_perm") != self.num_perm or meta.get("hash") != _HASH_VERSION:
+                return                                # incompatible → start fresh
+            sigs, used = data["sigs"], data["used"]
+        with self._lock:
+            # oldest first, so that over capacity the most recent are kept
+            for i in np.argsort(used):
+                entry = meta["entries"][i]
+                row = self._slots.get(entry["prompt"])
+                if row is None:
+                    if len(self._slots) >= self.max_entries and used[i] <= self._used.min():
+                        continue                      # older than anything kept
+                elif self._used[row] >= used[i]:
+                    continue
+                self._put(entry, sigs[i], float(used[i]))
+        self._seen = _mtime(self.path)
+
+    def close(self) -> None:
+        if self._dirty:
+            self.save()
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+@contextlib.contextmanager
+def _file_lock(path: str) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+_default: Optional[PromptIndex] = None
+_default_lock = threading.Lock()
+
+
+def get_prompt_index() -> Optional[PromptIndex]:
+    """Process-wide index, or None when PROMPT_INDEX=0."""
+    global _default
+    if not PROMPT_INDEX_ENABLED:
+        return None
+    with _default_lock:
+        if _default is None:
+            _default = PromptIndex(
+                PROMPT_INDEX_PATH,
+                threshold=PROMPT_INDEX_THRESHOLD,
+                max_entries=PROMPT_INDEX_MAX_ENTRIES,
+            )
+            atexit.register(_default.close)   # flush writes since the last autosave
+        return _default
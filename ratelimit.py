@@ -0,0 +1,271 @@
+"""
+ratelimit.py – client-side throttling for provider calls.
+
+Each (base_url, model) gets a ProviderLimiter with
+• token buckets for requests/min and tokens/min (paced, not bursty),
+• AIMD concurrency: +1/limit per success, ×0.5 on a 429, ×0.9 when
+  latency exceeds the target,
+• retries for 429 / 5xx / connection errors, honouring Retry-After
+  with jitter and pausing every caller of that provider meanwhile.
+Calls are blocking; agents run them on worker threads.
+"""
+import email.utils
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from config import RATE_LIMITS, RATE_LIMIT_DEFAULTS, llm_config_dict
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` per second up to `burst`. Reservations
+    may overdraw the bucket; the caller then sleeps off the debt, which
+    keeps waiters in FIFO order.
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, per_minute / 10)
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self, n: float = 1.0) -> float:
+        """Take `n` tokens; returns how long the caller must wait first."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= n
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def drain(self) -> None:
+        """Provider said 'slow down' → forget any accumulated burst."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0.0)
+
+
+class AIMDLimit:
+    """Concurrency limit that grows additively and shrinks multiplicatively."""
+
+    def __init__(
+        self,
+        initial: float = 4,
+        minimum: float = 1,
+        maximum: float = 64,
+        latency_target: Optional[float] = None,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, outcome: str, latency: float = 0.0) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if outcome == "throttled":
+                self.limit = max(self.minimum, self.limit * 0.5)
+            elif outcome == "ok":
+                if self.latency_target and latency > self.latency_target:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+# ── error classification ────────────────────────────────────────────────
+def _status(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def classify(exc: BaseException) -> Optional[str]:
+    """'throttled', 'transient' or None (not retryable)."""
+    status = _status(exc)
+    if status == 429 or "RateLimit" in type(exc).__name__:
+        return "throttled"
+    if (status is not None and status >= 500) or type(exc).__name__ in (
+        "APIConnectionError", "APITimeoutError", "ConnectError", "ReadTimeout",
+    ):
+        return "transient"
+    return None
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds from Retry-After / retry-after-ms headers, if present."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    ms = headers.get("retry-after-ms")
+    if ms:
+        try:
+            return float(ms) / 1000.0
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:   # HTTP-date form
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class ProviderLimiter:
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        concurrency: float = 4,
+        max_concurrency: float = 64,
+        latency_target: Optional[float] = None,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        completion_tokens: int = 256,        # reserved when a call sets no max_tokens
+    ) -> None:
+        self.name = name
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AIMDLimit(concurrency, 1, max_concurrency, latency_target)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.completion_tokens = completion_tokens
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.calls = self.throttled = self.retries = 0
+
+    def _backoff(self, attempt: int, exc: BaseException) -> float:
+        hinted = retry_after(exc)
+        if hinted is not None:
+            return hinted * (1.0 + random.uniform(0.0, 0.2))
+        # "full jitter" exponential backoff
+        return random.uniform(0.0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _pace(self, prompt_tokens: int, completion_tokens: Optional[int] = None) -> None:
+        wait = max(0.0, self._blocked_until - time.monotonic())
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(
+                prompt_tokens + (completion_tokens or self.completion_tokens)
+            ))
+        if wait > 0:
+            time.sleep(wait)
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        prompt_tokens: int = 0,
+        retries: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+    ) -> T:
+        """
+        Run `fn` under this provider's budgets, retrying throttled and
+        transient failures up to `retries` times (default: max_retries).
+        `completion_tokens` is the reply's token budget (the request's
+        max_tokens); without one the limiter's default is reserved.
+        """
+        max_retries = self.max_retries if retries is None else retries
+        attempt = 0
+        while True:
+            self._pace(prompt_tokens, completion_tokens)
+            self.concurrency.acquire()
+            t0 = time.monotonic()
+            try:
+                result = fn()
+            except Exception as exc:
+                kind = classify(exc)
+                self.concurrency.release(kind or "error")
+                if kind is None:
+                    raise
+                delay = self._backoff(attempt, exc)
+                if kind == "throttled":
+                    with self._lock:
+                        self.throttled += 1
+                        # everyone on this provider waits out the Retry-After
+                        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                    for bucket in (self.requests, self.tokens):
+                        if bucket is not None:
+                            bucket.drain()
+                if attempt >= max_retries:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                self.concurrency.release("error")
+                raise
+            self.concurrency.release("ok", time.monotonic() - t0)
+            with self._lock:
+                self.calls += 1
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "retries": self.retries,
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+        }
+
+
+class RateLimiterRegistry:
+    """ProviderLimiters keyed by (base_url, model), built from config.py."""
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self.limits = RATE_LIMITS if limits is None else limits
+        self._limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+        self._lock = threading.Lock()
+
+    def for_config(self, llm_config: Any) -> ProviderLimiter:
+        entry = (llm_config_dict(llm_config).get("config_list") or [{}])[0]
+        key = (entry.get("base_url") or "", entry.get("model") or "")
+        with self._lock:
+            lim = self._limiters.get(key)
+            if lim is None:
+                opts = {**RATE_LIMIT_DEFAULTS, **self.limits.get(key[0], {})}
+                lim = ProviderLimiter(f"{key[0]}#{key[1]}", **opts)
+                self._limiters[key] = lim
+            return lim
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {lim.name: lim.stats() for lim in self._limiters.values()}
+
+
+_default: Optional[RateLimiterRegistry] = None
+_default_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiterRegistry:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = RateLimiterRegistry()
+        return _default
@@ -0,0 +1,140 @@
+"""
+router.py – latency-aware routing and failover across a config_list.
+
+For an llm_config with several endpoints, `order()` returns single-endpoint
+configs best-first: healthy endpoints by rolling p95 latency (p50 while
+there are few samples; unseen endpoints first, so they get measured),
+then degraded ones as a last resort. An endpoint whose error rate crosses
+the threshold, or that fails several times in a row, is ejected for a
+cooldown and then probed again.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import ROUTER_COOLDOWN, ROUTER_MAX_ERROR_RATE, ROUTER_WINDOW, llm_config_dict
+
+EndpointKey = Tuple[str, str]
+
+
+def _percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, int(round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+class EndpointStats:
+    def __init__(self, window: int) -> None:
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    @property
+    def error_rate(self) -> float:
+        return 1.0 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def p(self, q: float) -> float:
+        return _percentile(sorted(self.latencies), q)
+
+    def score(self) -> float:
+        if not self.latencies:
+            return 0.0                     # unmeasured → try it
+        return self.p(0.95) if len(self.latencies) >= 5 else self.p(0.5)
+
+
+class EndpointRouter:
+    def __init__(
+        self,
+        window: int = ROUTER_WINDOW,
+        max_error_rate: float = ROUTER_MAX_ERROR_RATE,
+        eject_after: int = 3,
+        cooldown: float = ROUTER_COOLDOWN,
+    ) -> None:
+        self.window = window
+        self.max_error_rate = max_error_rate
+        self.eject_after = eject_after
+        self.cooldown = cooldown
+        self._stats: Dict[EndpointKey, EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(entry: Dict[str, Any]) -> EndpointKey:
+        return entry.get("base_url") or "", entry.get("model") or ""
+
+    def _get(self, key: EndpointKey) -> EndpointStats:
+        st = self._stats.get(key)
+        if st is None:
+            st = self._stats[key] = EndpointStats(self.window)
+        return st
+
+    def _healthy(self, st: EndpointStats, now: float) -> bool:
+        if st.ejected_until > now:
+            return False
+        # only judge the error rate once there is something to judge
+        return len(st.outcomes) < 5 or st.error_rate <= self.max_error_rate
+
+    def order(self, llm_config: Any) -> List[Dict[str, Any]]:
+        """Single-endpoint llm_configs to try, best first."""
+        cfg = llm_config_dict(llm_config)
+        entries = cfg.get("config_list") or []
+        if len(entries) <= 1:
+            return [cfg]
+        now = time.monotonic()
+        with self._lock:
+            ranked = sorted(
+                entries,
+                key=lambda e: (
+                    not self._healthy(self._get(self.key(e)), now),
+                    self._get(self.key(e)).score(),
+                ),
+            )
+        return [{**cfg, "config_list": [e]} for e in ranked]
+
+    def record(self, llm_config: Any, latency: float, ok: bool) -> None:
+        entry = (llm_config_dict(llm_config).get("config_list") or [{}])[0]
+        with self._lock:
+            st = self._get(self.key(entry))
+            st.outcomes.append(ok)
+            if ok:
+                st.latencies.append(latency)
+                st.consecutive_failures = 0
+                st.ejected_until = 0.0
+                return
+            st.consecutive_failures += 1
+            if (
+                st.consecutive_failures >= self.eject_after
+                or (len(st.outcomes) >= 5 and st.error_rate > self.max_error_rate)
+            ):
+                st.ejected_until = time.monotonic() + self.cooldown
+                # the probe after cooldown starts from a clean slate
+                st.outcomes.clear()
+                st.consecutive_failures = 0
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                f"{base}#{model}": {
+                    "p50": round(st.p(0.5), 4),
+                    "p95": round(st.p(0.95), 4),
+                    "error_rate": round(st.error_rate, 3),
+                    "samples": len(st.latencies),
+                    "healthy": self._healthy(st, now),
+                }
+                for (base, model), st in self._stats.items()
+            }
+
+
+_default: Optional[EndpointRouter] = None
+_default_lock = threading.Lock()
+
+
+def get_router() -> EndpointRouter:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = EndpointRouter()
+        return _default
@@ -0,0 +1,107 @@
+"""
+scores.py – typed score records parsed from Critic / Comparator text.
+
+`ScoreRecord` is a slotted record with the four Critic levels encoded
+as small ints (Low=0, Medium=1, High=2, MISSING=-1 when a line did not
+parse) and the Comparator's winner ('A', 'B' or None). aggregate.py
+turns many of them into NumPy columns.
+
+No autogen import here, so analysis scripts stay fast to start.
+"""
+import re
+from typing import Any, Dict, Optional, Tuple
+
+LEVELS = ("Low", "Medium", "High")
+CRITERIA = ("Correctness", "Hallucination", "Tone", "Relevance")
+MISSING = -1
+
+_LINE = re.compile(
+    r"^\W*(correctness|hallucination|tone|relevance)\W*\s*(low|medium|high)\b\W*(.*)$",
+    re.I | re.M,
+)
+# "Winner: A", "**Winner:** B", "winner - a" …
+_WINNER = re.compile(r"winner\W{0,4}\s*(A|B)\b", re.I)
+_BETTER = re.compile(r"\b(?:answer\s+)?(A|B)\s+is\s+(?:the\s+)?better\b", re.I)
+
+
+def parse_critique(text: str) -> Dict[str, Tuple[int, str]]:
+    """criterion → (level 0–2, reason) for the lines that parse."""
+    out: Dict[str, Tuple[int, str]] = {}
+    for m in _LINE.finditer(text):
+        name = m.group(1).capitalize()
+        if name not in out:
+            reason = m.group(3).lstrip("–—-: ").strip()
+            out[name] = (LEVELS.index(m.group(2).capitalize()), reason)
+    return out
+
+
+def format_critique(levels: Dict[str, Tuple[int, str]]) -> str:
+    """The Critic's line format, for the criteria present in `levels`."""
+    return "\n".join(
+        f"{name}: {LEVELS[levels[name][0]]} – {levels[name][1]}"
+        for name in CRITERIA if name in levels
+    )
+
+
+def parse_winner(verdict: str) -> Optional[str]:
+    """'A', 'B' or None when the verdict names no clear winner."""
+    m = _WINNER.search(verdict) or _BETTER.search(verdict)
+    return m.group(1).upper() if m else None
+
+
+class ScoreRecord:
+    __slots__ = ("id", "correctness", "hallucination", "tone", "relevance", "winner")
+
+    def __init__(
+        self,
+        id: Any = None,
+        correctness: int = MISSING,
+        hallucination: int = MISSING,
+        tone: int = MISSING,
+        relevance: int = MISSING,
+        winner: Optional[str] = None,
+    ) -> None:
+        self.id = id
+        self.correctness = correctness
+        self.hallucination = hallucination
+        self.tone = tone
+        self.relevance = relevance
+        self.winner = winner
+
+    @classmethod
+    def parse(cls, critique: str, verdict: str = "", id: Any = None) -> "ScoreRecord":
+        levels = parse_critique(critique)
+        return cls(
+            id,
+            *(levels.get(name, (MISSING, ""))[0] for name in CRITERIA),
+            winner=parse_winner(verdict) if verdict else None,
+        )
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> "ScoreRecord":
+        """From an `evaluate_prompt_response` result (or a batch row)."""
+        if result.get("scores"):       # already parsed when the run finished
+            return cls.from_dict({**result["scores"], "id": result.get("id")})
+        return cls.parse(
+            result.get("critic_analysis") or "",
+            result.get("comparison_analysis") or "",
+            id=result.get("id"),
+        )
+
+    def levels(self) -> Tuple[int, int, int, int]:
+        return (self.correctness, self.hallucination, self.tone, self.relevance)
+
+    def to_dict(self) -> Dict[str, Any]:
+        # no "id" key for records that have none (e.g. inside a result)
+        return {
+            name: getattr(self, name) for name in self.__slots__
+            if name != "id" or self.id is not None
+        }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ScoreRecord":
+        return cls(**{k: d[k] for k in cls.__slots__ if k in d})
+
+    def __repr__(self) -> str:
+        body = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__)
+        return f"ScoreRecord({body})"
@@ -0,0 +1,434 @@
+"""
+server.py – HTTP API for the evaluator (stdlib asyncio, no framework).
+
+    POST /evaluate   {"prompt", "answer_a", "chosen_prompt"?, "model"?,
+                      "use_cache"?, "fan_out"?, "candidates"?,
+                      "gating"?, "self_consistency"?}  → result JSON
+    POST /stream     same body → text/event-stream of token / stage / result
+    POST /batch      {"records": [...], "concurrency"?}  → NDJSON, one result
+                     per record in completion order (failures carry "error")
+    GET  /health     status, in-flight pipelines, coalescing counters
+    GET  /metrics    Prometheus text (?format=json for JSON)
+
+Identical concurrent requests (same prompt, answer, chosen_prompt, options
+and model config) are coalesced: they follow one pipeline run instead of
+each paying for its own LLM calls. At most `max_concurrency` pipelines run
+at once; the rest wait.
+
+    python server.py --port 8080 --max-concurrency 8
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import metrics
+from config import (
+    SERVER_HOST, SERVER_MAX_BODY, SERVER_MAX_CONCURRENCY, SERVER_PORT,
+    SUPPORTED_MODELS, get_llm_config, update_config_for_model,
+)
+from main import EvalEvent, get_evaluator
+from model_policy import get_model_policy
+from prompt_index import get_prompt_index
+
+REQUESTS = metrics.REGISTRY.counter("evaluator_http_requests_total", "HTTP requests by path and status.")
+COALESCED = metrics.REGISTRY.counter(
+    "evaluator_singleflight_shared_total", "Requests served by an already running identical pipeline."
+)
+
+_REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error",
+}
+_ROUTES = ("/evaluate", "/stream", "/batch", "/health", "/metrics")
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _jsonable(obj: Any) -> Any:
+    # stage values may hold tuple-keyed dicts (tournament verdicts)
+    if isinstance(obj, dict):
+        return {k if isinstance(k, str) else str(k): _jsonable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_jsonable(v) for v in obj]
+    return obj
+
+
+# ── singleflight ────────────────────────────────────────────────────────────
+class Flight:
+    """
+    One pipeline run shared by every request with the same key. Events are
+    kept so late joiners replay from the start; the run is cancelled once
+    its last follower goes away.
+    """
+
+    def __init__(self) -> None:
+        self.events: List[EvalEvent] = []
+        self.done = False
+        self.followers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def push(self, event: EvalEvent, final: bool = False) -> None:
+        async with self._changed:
+            self.events.append(event)
+            self.done = self.done or final
+            self._changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[EvalEvent]:
+        i = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: i < len(self.events) or self.done)
+                new, finished = self.events[i:], self.done
+            for ev in new:
+                yield ev
+            i += len(new)
+            if finished and i >= len(self.events):
+                return
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._flights: Dict[str, Flight] = {}
+        self.started = self.shared = 0
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        blob = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    async def follow(
+        self, key: str, run: Callable[[], AsyncIterator[EvalEvent]]
+    ) -> AsyncIterator[EvalEvent]:
+        """Events of the flight for `key`, starting it with `run()` if needed."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = self._flights[key] = Flight()
+            flight.task = asyncio.ensure_future(self._drive(key, flight, run))
+            self.started += 1
+        else:
+            self.shared += 1
+            COALESCED.inc()
+        flight.followers += 1
+        try:
+            async for ev in flight.follow():
+                yield ev
+        finally:
+            flight.followers -= 1
+            if flight.followers == 0 and not flight.done and flight.task is not None:
+                flight.task.cancel()             # nobody is listening any more
+                # gone now, not when _drive next runs: a request arriving in
+                # between would join the cancelled run
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    async def _drive(
+        self, key: str, flight: Flight, run: Callable[[], AsyncIterator[EvalEvent]]
+    ) -> None:
+        try:
+            async for ev in run():
+                await flight.push(ev, final=ev.kind == "result")
+        except asyncio.CancelledError:
+            await flight.push(EvalEvent("error", None, "cancelled"), final=True)
+            raise
+        except Exception as exc:
+            await flight.push(EvalEvent("error", None, f"{type(exc).__name__}: {exc}"), final=True)
+        finally:
+            # later identical requests start a fresh run (and may hit the cache)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+
+# ── service ────────────────────────────────────────────────────────────────
+class EvaluationServer:
+    def __init__(
+        self,
+        host: str = SERVER_HOST,
+        port: int = SERVER_PORT,
+        max_concurrency: int = SERVER_MAX_CONCURRENCY,
+    ) -> None:
+        self.host, self.port = host, port
+        self.max_concurrency = max_concurrency
+        self.flights = SingleFlight()
+        self.running = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._evaluator: Any = None          # default one, built by start()
+
+    # ── pipeline runs ───────────────────────────────────────────────────
+    @staticmethod
+    def _options(body: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        if not isinstance(body.get("prompt"), str) or not isinstance(body.get("answer_a"), str):
+            raise HTTPError(400, "'prompt' and 'answer_a' must be strings")
+        model = body.get("model")
+        if model is not None and model not in SUPPORTED_MODELS:
+            raise HTTPError(400, f"unknown model; pick one of {SUPPORTED_MODELS}")
+        cfg = update_config_for_model(model) if model else get_llm_config()
+        try:
+            candidates = int(body.get("candidates", 2))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "'candidates' must be an integer")
+        opts = {
+            "prompt": body["prompt"],
+            "answer_a": body["answer_a"],
+            "chosen_prompt": body.get("chosen_prompt"),
+            "use_cache": bool(body.get("use_cache", True)),
+            "fan_out": bool(body.get("fan_out", False)),
+            "candidates": candidates,
+            # null → config.GATING_ENABLED
+            "gating": None if body.get("gating") is None else bool(body["gating"]),
+            # null → config.SELF_CONSISTENCY
+            "self_consistency": (
+                None if body.get("self_consistency") is None else bool(body["self_consistency"])
+            ),
+        }
+        return cfg, opts
+
+    def _events(self, kind: str, cfg: Dict[str, Any], opts: Dict[str, Any]) -> AsyncIterator[EvalEvent]:
+        async def run() -> AsyncIterator[EvalEvent]:
+            async with self._slots:
+                self.running += 1
+                try:
+                    ev = get_evaluator(cfg)
+                    if kind == "stream":
+                        async for e in ev.astream_evaluation(**opts):
+                            yield e
+                    else:
+                        yield EvalEvent("result", None, await ev.aevaluate_prompt_response(**opts))
+                finally:
+                    self.running -= 1
+
+        # streamed and plain runs differ in provider calls, so never share
+        return self.flights.follow(self.flights.key(kind, cfg, opts), run)
+
+    async def evaluate(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        cfg, opts = self._options(body)
+        async with contextlib.aclosing(self._events("evaluate", cfg, opts)) as events:
+            async for ev in events:
+                if ev.kind == "result":
+                    return ev.data
+                if ev.kind == "error":
+                    raise RuntimeError(ev.data)
+        raise RuntimeError("pipeline ended without a result")
+
+    # ── HTTP plumbing ───────────────────────────────────────────────────
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, List[str]], Any]:
+        line = (await reader.readline()).decode("latin-1").strip()
+        try:
+            method, target, _ = line.split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "malformed request line")
+        headers: Dict[str, str] = {}
+        while True:
+            h = (await reader.readline()).decode("latin-1")
+            if h in ("\r\n", "\n", ""):
+                break
+            name, _, value = h.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HTTPError(400, "Content-Length must be an integer")
+        if length < 0:
+            raise HTTPError(400, "Content-Length must not be negative")
+        if length > SERVER_MAX_BODY:
+            raise HTTPError(413, f"body larger than {SERVER_MAX_BODY} bytes")
+        body = None
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HTTPError(400, "body is not valid JSON")
+        url = urlsplit(target)
+        return method.upper(), url.path.rstrip("/") or "/", parse_qs(url.query), body
+
+    @staticmethod
+    async def _head(writer: asyncio.StreamWriter, status: int, content_type: str,
+                    length: Optional[int] = None) -> None:
+        lines = [
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            "Connection: close",
+        ]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await writer.drain()
+
+    async def _send(self, writer: asyncio.StreamWriter, status: int, payload: Any,
+                    content_type: str = "application/json") -> None:
+        data = payload if isinstance(payload, bytes) else json.dumps(_jsonable(payload)).encode()
+        await self._head(writer, status, content_type, len(data))
+        writer.write(data)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        path, status = "?", 500
+        try:
+            try:
+                method, path, query, body = await self._read_request(reader)
+                status = await self._route(writer, method, path, query, body)
+            except HTTPError as exc:
+                status = exc.status
+                await self._send(writer, status, {"error": str(exc)})
+            except (ConnectionError, asyncio.IncompleteReadError):
+                status = 499                      # client went away
+            except Exception as exc:
+                status = 500
+                await self._send(writer, status, {"error": f"{type(exc).__name__}: {exc}"})
+        except ConnectionError:
+            pass
+        finally:
+            REQUESTS.inc(path=path if path in _ROUTES else "other", status=status)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _route(self, writer: asyncio.StreamWriter, method: str, path: str,
+                     query: Dict[str, List[str]], body: Any) -> int:
+        if path == "/health":
+            await self._send(writer, 200, self.health())
+            return 200
+        if path == "/metrics":
+            if query.get("format") == ["json"]:
+                await self._send(writer, 200, metrics.REGISTRY.snapshot())
+            else:
+                await self._send(writer, 200, metrics.REGISTRY.prometheus().encode(),
+                                 "text/plain; version=0.0.4")
+            return 200
+        if path not in _ROUTES:
+            raise HTTPError(404, f"no route for {path}")
+        if method != "POST":
+            raise HTTPError(405, f"{path} only accepts POST")
+        if not isinstance(body, dict):
+            raise HTTPError(400, "expected a JSON object body")
+
+        if path == "/evaluate":
+            await self._send(writer, 200, await self.evaluate(body))
+        elif path == "/stream":
+            await self._stream(writer, body)
+        else:
+            await self._batch(writer, body)
+        return 200
+
+    async def _stream(self, writer: asyncio.StreamWriter, body: Dict[str, Any]) -> None:
+        cfg, opts = self._options(body)              # validate before the 200
+        await self._head(writer, 200, "text/event-stream")
+        # aclosing: a vanished client releases its follower slot right away
+        async with contextlib.aclosing(self._events("stream", cfg, opts)) as events:
+            async for ev in events:
+                data = json.dumps(_jsonable({"stage": ev.stage, "data": ev.data}))
+                writer.write(f"event: {ev.kind}\ndata: {data}\n\n".encode())
+                await writer.drain()                 # raises once the client is gone
+
+    async def _batch(self, writer: asyncio.StreamWriter, body: Dict[str, Any]) -> None:
+        records = body.get("records")
+        if not isinstance(records, list):
+            raise HTTPError(400, "'records' must be a list")
+        try:
+            concurrency = int(body.get("concurrency", 4))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "'concurrency' must be an integer")
+        limit = asyncio.Semaphore(max(1, concurrency))
+
+        async def one(idx: int, rec: Any) -> Dict[str, Any]:
+            rid = rec.get("id", idx) if isinstance(rec, dict) else idx
+            async with limit:
+                try:
+                    if not isinstance(rec, dict):
+                        raise HTTPError(400, "record is not an object")
+                    rec = {"answer_a": rec.get("original_response"), **rec}
+                    return {"id": rid, **await self.evaluate(rec)}
+                except Exception as exc:         # one bad record must not sink the batch
+                    return {"id": rid, "error": f"{type(exc).__name__}: {exc}"}
+
+        await self._head(writer, 200, "application/x-ndjson")
+        tasks = [asyncio.ensure_future(one(i, r)) for i, r in enumerate(records)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                writer.write((json.dumps(_jsonable(await fut)) + "\n").encode())
+                await writer.drain()
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    def health(self) -> Dict[str, Any]:
+        index = get_prompt_index()
+        return {
+            "status": "ok",
+            "max_concurrency": self.max_concurrency,
+            "running": self.running,
+            "in_flight": self.flights.in_flight,
+            "flights_started": self.flights.started,
+            "flights_shared": self.flights.shared,
+            "prompt_index": index.stats() if index is not None else None,
+            "stage_models": get_model_policy().stats(),
+            # no request: the warmer's refresh thread polls Ollama
+            "ollama": self._evaluator.ollama_status() if self._evaluator is not None else {},
+        }
+
+    # ── lifecycle ───────────────────────────────────────────────────────
+    async def start(self) -> None:
+        loop = asyncio.get_running_loop()
+        # each pipeline keeps up to two blocking agent calls in flight
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=2 * self.max_concurrency))
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        # build the default evaluator's agents (and import autogen) up front,
+        # off the loop, so the first request doesn't stall every other one;
+        # likewise wait for local Ollama models to finish loading
+        ev = self._evaluator = await asyncio.to_thread(get_evaluator)
+        await asyncio.to_thread(lambda: ev.agents)
+        for warmer in ev.ollama:
+            await asyncio.to_thread(warmer.wait_ready)
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="HTTP API for the prompt evaluator.")
+    ap.add_argument("--host", default=SERVER_HOST)
+    ap.add_argument("--port", type=int, default=SERVER_PORT)
+    ap.add_argument("--max-concurrency", type=int, default=SERVER_MAX_CONCURRENCY)
+    args = ap.parse_args()
+
+    srv = EvaluationServer(args.host, args.port, args.max_concurrency)
+
+    async def run() -> None:
+        await srv.start()
+        print(f"evaluator API on http://{srv.host}:{srv.port}")
+        await srv.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+from cache import LLMCache
+
+
+def test_bounds_hold_with_running_totals(tmp_path):
+    cache = LLMCache(str(tmp_path / "c.sqlite"), max_entries=50, max_bytes=3000)
+    for i in range(200):
+        cache.set(f"k{i}", "x" * (i % 100))
+    cache.set("k199", "y" * 10)                 # a replace changes the size, not the count
+    stats = cache.stats()
+    assert stats["entries"] <= 50 and stats["bytes"] <= 3000
+    assert (cache._count, cache._bytes) == (stats["entries"], stats["bytes"])
+    assert cache.get("k199") == "y" * 10        # the newest entries survive
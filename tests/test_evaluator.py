@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+from cache import LLMCache
+from main import PromptEvaluator
+from mock_llm_server import MockLLMServer
+
+
+def test_first_run_builds_the_agents_off_the_loop(tmp_path):
+    with MockLLMServer(token_latency=0.0) as server:
+        ev = PromptEvaluator(
+            cache=LLMCache(str(tmp_path / "cache.sqlite")),
+            llm_config=server.llm_config(), prompt_index=None, history=None, warm=False,
+        )
+        built = []
+        agent = ev._agent
+
+        def record(attr):
+            if attr not in ev._agents:
+                built.append(threading.current_thread())
+            return agent(attr)
+
+        ev._agent = record
+
+        async def run():
+            loop_thread = threading.current_thread()
+            res = await ev.aevaluate_prompt_response("Explain DNS", "It resolves names.")
+            return loop_thread, res
+
+        loop_thread, res = asyncio.run(run())
+    assert res["comparison_analysis"]
+    assert len(built) == 4 and loop_thread not in built
@@ -0,0 +1,28 @@
+from history import HistoryStore
+
+
+def test_rows_record_the_models_stages_actually_used(tmp_path):
+    store = HistoryStore(str(tmp_path / "h.sqlite"))
+    result = {
+        "original_prompt": "Explain DNS",
+        "critic_analysis": "Correctness: High",
+        "comparison_analysis": "Winner: B",
+        "spans": [
+            {"stage": "critic", "models": ["llama3.2:1b"], "seconds": 0.1},
+            {"stage": "improved", "models": ["llama3.2:1b"], "seconds": 0.1},
+            {"stage": "use_prompt", "models": [], "seconds": 0.0},
+            {"stage": "answer_b", "models": ["llama3:70b"], "seconds": 0.5},
+            {"stage": "comparison", "models": ["llama3:70b"], "seconds": 0.2},
+        ],
+    }
+    store.append(result, model="backend-default")
+    store.append({**result, "spans": []}, model="backend-default")   # e.g. no spans at all
+    assert store.flush(timeout=10)
+    gated, full = store.page(2)
+    assert full["model"] == "llama3:70b"
+    assert full["stage_models"] == {
+        "critic": "llama3.2:1b", "improved": "llama3.2:1b",
+        "answer_b": "llama3:70b", "comparison": "llama3:70b",
+    }
+    assert gated["model"] == "backend-default" and gated["stage_models"] is None
+    store.close()
@@ -0,0 +1,25 @@
+from jobqueue import JobQueue
+
+
+def test_stale_lease_cannot_finish_after_release_or_retry(tmp_path):
+    queue = JobQueue(str(tmp_path / "q.sqlite"), max_attempts=1)
+    queue.enqueue([{"id": "a"}])
+
+    # a released job is leased again on the same attempt number
+    (first,) = queue.lease("w", 1)
+    assert queue.release("w", [first]) == 1
+    (second,) = queue.lease("w", 1)
+    assert second.attempt == first.attempt
+    assert second.token > first.token
+    assert not queue.complete(first, "w", {"id": "a"})
+
+    # retry_failed resets the attempt count, but not the token
+    assert queue.fail(second, "w", "boom") == "failed"
+    assert queue.retry_failed() == 1
+    (third,) = queue.lease("w", 1)
+    assert third.attempt == second.attempt
+    assert third.token > second.token
+    assert queue.fail(second, "w", "late") is None
+    assert queue.complete(third, "w", {"id": "a"})
+    assert queue.stats()["results"] == 1
+    queue.close()
@@ -0,0 +1,28 @@
+import asyncio
+
+from pipeline import Stage, StageScheduler
+
+
+def test_gate_closing_before_gated_stages_start():
+    # the critic returns without yielding (as a pre-resolved batched
+    # critique does), so the gate closes before the gated tasks ever run
+    async def critic(answer_a):
+        return "good"
+
+    calls = []
+
+    def fix(prompt):
+        calls.append(prompt)
+        return ["better prompt"]
+
+    pipeline = StageScheduler([
+        Stage("critic", critic, deps=("answer_a",)),
+        Stage("gate", lambda critic: False, deps=("critic",), blocking=False),
+        Stage("improved", fix, deps=("prompt",), gate="gate", skipped=[]),
+    ])
+    skipped = []
+    out = asyncio.run(pipeline.run(skipped=skipped, prompt="p", answer_a="a"))
+    assert out["critic"] == "good"
+    assert out["improved"] == []
+    assert skipped == ["improved"]
+    assert calls == []
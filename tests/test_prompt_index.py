@@ -0,0 +1,45 @@
+from agents.fixer import PromptFixerAgent
+from prompt_index import PromptIndex
+
+PYTHON = "Explain how Python list comprehensions work with examples please"
+JAVA = "Explain how Java list comprehensions work with examples please"
+
+
+def _fixer(index, reply):
+    fixer = PromptFixerAgent(
+        {"config_list": [{"model": "mock", "base_url": "http://127.0.0.1:9/v1", "api_key": "x"}]}
+    )
+    fixer.cache = fixer.limiter = fixer.router = None
+    fixer.index = index
+    fixer.ask = lambda *args, **kwargs: reply
+    return fixer
+
+
+def test_near_duplicate_on_another_subject_is_not_reused():
+    # the two prompts' true Jaccard is 0.7, right at the default threshold,
+    # so the estimate may land on either side; make it a match for sure
+    index = PromptIndex(threshold=0.6)
+    index.add(PYTHON, [
+        "Explain how Python list comprehensions work, with three short examples",
+        "Show Python list comprehension examples and explain each one",
+    ])
+    # close enough for the index ...
+    assert index.lookup(JAVA) is not None
+
+    # ... but the Fixer asks the model instead of returning Python rewrites
+    reply = "• Explain how Java streams replace list comprehensions, with examples\n" \
+            "• Show Java examples of list-comprehension-style code\n"
+    out = _fixer(index, reply).fix(JAVA)
+    assert out and all("Java" in b and "Python" not in b for b in out)
+    assert index.stats()["hits"] == 0
+
+
+def test_reused_rewrites_count_as_hits():
+    index = PromptIndex()
+    index.add(PYTHON, [
+        "Explain how Python list comprehensions work, with three short examples",
+        "Show Python list comprehension examples and explain each one",
+    ])
+    out = _fixer(index, "").fix(PYTHON.lower() + "!")
+    assert len(out) == 2
+    assert index.stats()["hits"] == 1
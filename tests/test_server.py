@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from main import EvalEvent
+from server import EvaluationServer, HTTPError, SingleFlight
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5"])
+def test_bad_content_length_is_a_400(length):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"POST /evaluate HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}")
+        reader.feed_eof()
+        return await EvaluationServer()._read_request(reader)
+
+    with pytest.raises(HTTPError) as exc:
+        asyncio.run(read())
+    assert exc.value.status == 400
+
+
+def test_request_after_last_follower_left_starts_a_new_run():
+    async def run():
+        yield EvalEvent("stage", "critic", "rating")
+        await asyncio.sleep(0.01)
+        yield EvalEvent("result", None, {"ok": True})
+
+    async def scenario():
+        flights = SingleFlight()
+        first = flights.follow("k", run)
+        assert (await first.__anext__()).kind == "stage"
+        await first.aclose()                    # the only follower leaves
+        return [ev async for ev in flights.follow("k", run)]
+
+    events = asyncio.run(scenario())
+    assert [ev.kind for ev in events] == ["stage", "result"]
+
+
+@pytest.mark.parametrize("concurrency", ["abc", None])
+def test_bad_batch_concurrency_is_a_400(concurrency):
+    body = {"records": [], "concurrency": concurrency}
+    with pytest.raises(HTTPError) as exc:
+        asyncio.run(EvaluationServer()._batch(None, body))
+    assert exc.value.status == 400
@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from tournament import merge_rank
+
+
+def _rank(items, better):
+    calls = []
+
+    async def judge(x, y):
+        calls.append((x, y))
+        await asyncio.sleep(0)
+        return better(x, y)
+
+    return asyncio.run(merge_rank(items, judge)), calls
+
+
+@pytest.mark.parametrize("items", [[3, 1, 4, 1, 5, 9, 2, 6], [7, 2, 9, 4, 1], [2, 1]])
+def test_ranks_best_first_within_n_log_n_judgments(items):
+    ranked, calls = _rank(items, lambda x, y: x > y)
+    assert ranked == sorted(items, reverse=True)
+    n = len(items)
+    assert len(calls) <= n * (n - 1).bit_length()
+
+
+def test_single_and_empty_need_no_judgments():
+    assert _rank([42], lambda x, y: True) == ([42], [])
+    assert _rank([], lambda x, y: True) == ([], [])
+
+
+def test_ties_keep_the_earlier_item_first():
+    items = [("a", 1), ("b", 2), ("c", 1), ("d", 2), ("e", 1)]   # odd n
+    ranked, _ = _rank(items, lambda x, y: x[1] > y[1])
+    assert [name for name, _ in ranked] == ["b", "d", "a", "c", "e"]
@@ -0,0 +1,36 @@
+import asyncio
+
+from jobqueue import Lease
+from worker import Worker
+
+
+class _Queue:
+    lease_seconds = 60
+
+    def fail(self, lease, worker, error):
+        return None                             # the lease is gone already
+
+    def complete(self, lease, worker, result):
+        return False
+
+
+class _Evaluator:
+    async def aevaluate_prompt_response(self, *args, **kwargs):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            # e.g. a pipeline that turns the cancellation into an error
+            raise RuntimeError("stage cancelled")
+
+
+def test_a_lost_lease_is_counted_once():
+    async def scenario():
+        worker = Worker(_Queue(), _Evaluator(), worker_id="w")
+        lease = Lease(1, "a", {"id": "a", "prompt": "p", "answer_a": "x"}, 1, 7)
+        worker._tasks[1] = task = asyncio.ensure_future(worker._process(lease))
+        await asyncio.sleep(0)
+        worker._abandon(1)                      # the heartbeat found the lease lost
+        await asyncio.gather(task, return_exceptions=True)
+        return worker.stats
+
+    assert asyncio.run(scenario())["lost"] == 1
@@ -0,0 +1,42 @@
+"""
+tournament.py – comparison-efficient ranking on top of a pairwise judge.
+
+`merge_rank` is a merge sort driven by an async `better(x, y)`; it needs
+at most n·⌈log2 n⌉ judgments instead of the n·(n-1)/2 of a round robin,
+and ranks independent halves concurrently so judge calls overlap.
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+async def merge_rank(
+    items: Sequence[T],
+    better: Callable[[T, T], Awaitable[bool]],
+) -> List[T]:
+    """
+    Return `items` best-first. `better(x, y)` is True when x should rank
+    above y. Ties (False both ways) keep the earlier item first.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return items
+    mid = len(items) // 2
+    left, right = await asyncio.gather(
+        merge_rank(items[:mid], better), merge_rank(items[mid:], better)
+    )
+
+    merged: List[T] = []
+    i = j = 0
+    while i < len(left) and j < len(right):
+        # right only jumps ahead when it actually wins → stable
+        if await better(right[j], left[i]):
+            merged.append(right[j])
+            j += 1
+        else:
+            merged.append(left[i])
+            i += 1
+    merged.extend(left[i:])
+    merged.extend(right[j:])
+    return merged
@@ -0,0 +1,297 @@
+"""
+worker.py – sharded, multi-process evaluation over a durable job queue.
+
+One process is bounded by one event loop and GIL (JSON, parsing, client
+overhead) once many pipelines are in flight. Here N worker processes,
+on one host or several sharing the queue file, lease jobs from
+jobqueue.JobQueue. Each process keeps up to `concurrency` evaluations in
+flight. A crashed worker's jobs are retried once their leases lapse, and
+a result is stored exactly once.
+
+    python worker.py enqueue data.jsonl            # records → .queue.sqlite
+    python worker.py run -w 4 -c 8 --drain         # 4 processes until the queue is empty
+    python worker.py status
+    python worker.py export -o results.jsonl       # same rows as batch.py
+    python worker.py retry                         # failed jobs → queued again
+
+Provider rate limits are per process, so each of the N processes gets
+1/N of them (RATE_LIMIT_SHARE); with several hosts, give each host its
+share too, e.g. RATE_LIMIT_SHARE=0.5 on each of two.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from config import QUEUE_PATH, QUEUE_POLL_INTERVAL, RATE_LIMIT_SHARE
+from history import get_history_store, model_of
+from jobqueue import JobQueue, Lease
+
+
+class Worker:
+    """
+    Leases jobs, evaluates them and stores the results. A heartbeat
+    thread keeps its leases alive; a job whose lease was lost anyway
+    (e.g. the process stalled past the lease) is abandoned, since the
+    worker that took it over owns the result now.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        evaluator: Any,
+        worker_id: Optional[str] = None,
+        concurrency: int = 4,
+        poll_interval: float = QUEUE_POLL_INTERVAL,
+        history: Any = None,
+    ) -> None:
+        if concurrency < 1:
+            raise ValueError("concurrency must be >= 1")
+        self.queue = queue
+        self.evaluator = evaluator
+        self.id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        # results go to history once stored, so a retried or abandoned
+        # attempt doesn't leave a row of its own (give the evaluator none)
+        self.history = history
+        self.stats = {"done": 0, "failed": 0, "retried": 0, "lost": 0}
+        self._held: Dict[int, Lease] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._abandoned: Set[int] = set()        # cancelled because the lease was lost
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    async def run(self, drain: bool = False) -> Dict[str, int]:
+        """Work until stopped (or, with `drain`, until no job is left)."""
+        loop = asyncio.get_running_loop()
+        beat = threading.Thread(target=self._heartbeat, args=(loop,), name="heartbeat", daemon=True)
+        beat.start()
+        try:
+            while not self._stop.is_set():
+                free = self.concurrency - len(self._tasks)
+                if free:
+                    for lease in await asyncio.to_thread(self.queue.lease, self.id, free):
+                        with self._lock:
+                            self._held[lease.job_id] = lease
+                        self._tasks[lease.job_id] = asyncio.ensure_future(self._process(lease))
+                if not self._tasks:
+                    if drain and not await asyncio.to_thread(self.queue.unfinished):
+                        break
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                await asyncio.wait(
+                    self._tasks.values(), timeout=self.poll_interval,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+        finally:
+            self._stop.set()
+            with self._lock:
+                unfinished = list(self._held.values())
+            for task in self._tasks.values():
+                task.cancel()
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            # a clean stop hands its jobs straight back instead of letting
+            # their leases run out
+            self.queue.release(self.id, unfinished)
+        return dict(self.stats)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    async def _process(self, lease: Lease) -> None:
+        rec = lease.record
+        lost = False
+        try:
+            try:
+                res = await self.evaluator.aevaluate_prompt_response(
+                    rec["prompt"],
+                    rec.get("answer_a", rec.get("original_response", "")),
+                    rec.get("chosen_prompt"),
+                    record_id=lease.key,
+                )
+            except Exception as exc:   # retried (or failed for good) via the queue
+                outcome = await asyncio.to_thread(
+                    self.queue.fail, lease, self.id, f"{type(exc).__name__}: {exc}"
+                )
+                if outcome is not None:
+                    self.stats["retried" if outcome == "queued" else "failed"] += 1
+                    print(f"[worker {self.id}] id={lease.key} attempt {lease.attempt} "
+                          f"failed ({outcome}): {exc}", file=sys.stderr)
+                else:
+                    lost = True
+                return
+            if await asyncio.to_thread(self.queue.complete, lease, self.id, {"id": rec["id"], **res}):
+                self.stats["done"] += 1
+                if self.history is not None:
+                    self.history.append(
+                        res, model=model_of(self.evaluator.llm_config), record_id=lease.key
+                    )
+            else:
+                lost = True
+        finally:
+            self._tasks.pop(lease.job_id, None)
+            with self._lock:
+                self._held.pop(lease.job_id, None)
+            # found lost here or by the heartbeat (or both): counted once
+            if lost or lease.job_id in self._abandoned:
+                self.stats["lost"] += 1
+            self._abandoned.discard(lease.job_id)
+
+    def _heartbeat(self, loop: asyncio.AbstractEventLoop) -> None:
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            with self._lock:
+                held = list(self._held.values())
+            if not held:
+                continue
+            try:
+                lost = self.queue.heartbeat(self.id, held)
+            except Exception as exc:   # e.g. the file is locked; try again next beat
+                print(f"[worker {self.id}] heartbeat failed: {exc}", file=sys.stderr)
+                continue
+            for job_id in lost:
+                loop.call_soon_threadsafe(self._abandon, job_id)
+
+    def _abandon(self, job_id: int) -> None:
+        task = self._tasks.get(job_id)
+        if task is not None:
+            self._abandoned.add(job_id)
+            task.cancel()
+
+
+# ── processes ──────────────────────────────────────────────────────────────
+def _worker_main(
+    path: str, concurrency: int, model: Optional[str], drain: bool, warm: bool
+) -> None:
+    from main import PromptEvaluator
+    from config import update_config_for_model
+    from pipeline import run_sync
+
+    # the prompt index merges with the other workers' on save (prompt_index.py);
+    # one process keeps the Ollama models loaded for all of them
+    evaluator = PromptEvaluator(history=None, warm=warm)
+    if model:
+        evaluator.update_llm_config(update_config_for_model(model))
+    history = get_history_store()
+    queue = JobQueue(path)
+    worker = Worker(queue, evaluator, concurrency=concurrency, history=history)
+    try:
+        stats = run_sync(worker.run(drain=drain))
+    except KeyboardInterrupt:
+        return
+    finally:
+        if history is not None:
+            history.flush()
+        queue.close()
+    print(f"[worker {worker.id}] {json.dumps(stats)}", file=sys.stderr)
+
+
+def run_workers(
+    path: str,
+    workers: int = 2,
+    concurrency: int = 4,
+    model: Optional[str] = None,
+    drain: bool = False,
+    max_restarts: Optional[int] = None,
+) -> int:
+    """
+    Start `workers` processes and restart any that crash (up to
+    `max_restarts`, default 3 per worker). Returns the number that failed
+    for good.
+    """
+    # set before the children import config
+    os.environ["RATE_LIMIT_SHARE"] = str(RATE_LIMIT_SHARE / workers)
+    ctx = multiprocessing.get_context("spawn")   # no inherited loops / locks / sockets
+    restarts = 3 * workers if max_restarts is None else max_restarts
+
+    def start(slot: int) -> multiprocessing.Process:
+        proc = ctx.Process(
+            target=_worker_main, args=(path, concurrency, model, drain, slot == 0),
+            name=f"worker-{slot}",
+        )
+        proc.start()
+        return proc
+
+    procs = {slot: start(slot) for slot in range(workers)}
+    failed = 0
+    try:
+        while procs:
+            time.sleep(0.5)
+            for slot, proc in list(procs.items()):
+                if proc.exitcode is None:
+                    continue
+                del procs[slot]
+                if proc.exitcode == 0:
+                    continue
+                print(f"[worker] {proc.name} (pid {proc.pid}) exited with {proc.exitcode}",
+                      file=sys.stderr)
+                if restarts > 0:
+                    # its jobs are picked up again once their leases lapse
+                    restarts -= 1
+                    procs[slot] = start(slot)
+                else:
+                    failed += 1
+    except KeyboardInterrupt:
+        # the children got the SIGINT too and are handing back their jobs
+        for proc in procs.values():
+            proc.join(timeout=30)
+            if proc.exitcode is None:
+                proc.terminate()
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Multi-process evaluation over a durable job queue.")
+    ap.add_argument("command", choices=("enqueue", "run", "status", "export", "retry"))
+    ap.add_argument("input", nargs="?", help="input JSONL (enqueue)")
+    ap.add_argument("--queue", default=QUEUE_PATH, help=f"queue file (default {QUEUE_PATH})")
+    ap.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 2,
+                    help="worker processes (run; default: CPU count)")
+    ap.add_argument("-c", "--concurrency", type=int, default=4,
+                    help="evaluations in flight per worker (run; default 4)")
+    ap.add_argument("--model", help="one of config.SUPPORTED_MODELS (run)")
+    ap.add_argument("--drain", action="store_true",
+                    help="exit once every job is done or failed (run)")
+    ap.add_argument("-o", "--output", help="results JSONL (export; default: stdout)")
+    args = ap.parse_args(argv)
+
+    if args.command == "run":
+        return 1 if run_workers(
+            args.queue, args.workers, args.concurrency, args.model, args.drain
+        ) else 0
+
+    queue = JobQueue(args.queue)
+    try:
+        if args.command == "enqueue":
+            if not args.input:
+                ap.error("enqueue needs an input JSONL")
+            from batch import iter_jsonl
+
+            print(f"[worker] {queue.enqueue(iter_jsonl(args.input))} new jobs", file=sys.stderr)
+        elif args.command == "status":
+            print(json.dumps(queue.stats()))
+            for row in queue.failures():
+                print(json.dumps(row))
+        elif args.command == "retry":
+            print(f"[worker] {queue.retry_failed()} failed jobs queued again", file=sys.stderr)
+        else:
+            out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                n = queue.export(out)
+            finally:
+                if out is not sys.stdout:
+                    out.close()
+            print(f"[worker] exported {n} results", file=sys.stderr)
+    finally:
+        queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())